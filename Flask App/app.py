@@ -1,36 +1,122 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import (Flask, Response, g, render_template, request, jsonify, session, redirect, send_file,
+                   stream_with_context, url_for)
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-import openai
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from functools import lru_cache
 import json
-from openai import OpenAI
-from ics import Calendar, Event as ICSEvent
-import pytz
-import re
+from gcal_batch import push_events, summarize
+from gcal_service import CalendarServiceFactory, credentials_from_dict
+from llm_cache import CACHE_PATH as LLM_CACHE_PATH, LLMCache
+from conflicts import ConflictIndex
+from duration_estimator import DurationEstimator
+from freebusy import MAX_CANDIDATES, FreeBusyIndex
+from slot_planner import DAY_END, DAY_START, HORIZON_DAYS, STRATEGIES, place_sessions
+from sqlalchemy import and_, inspect, or_, text, event as orm_event
+from sqlalchemy.engine import Engine
+from gcal_sync import CalendarSync, assign_push_ids, record_push, row_body
+from bulk_events import MAX_BULK_ITEMS, apply_bulk
+from ics_import import import_events
+from ics_store import ArtifactStore
+from token_store import TOKEN_STORE_PATH, TokenStore
+from upstream import CircuitOpen, from_env as upstream_from_env
+from job_queue import JOB_WORKERS, QUEUE_PATH, STATUSES, JobQueue, QueueFull, WorkerPool
+from metrics import (CONTENT_TYPE, REQUEST_SECONDS, Gauge, finish_breakdown, format_breakdown, is_slow, record,
+                     registry, span, start_breakdown, timed_job)
+from schedule_parser import PLAN_JSON_PROMPT, PLAN_TEXT_PROMPT, Plan, PlanParser, json_mode, parse_plan, response_format_kwargs
+from schedule_stream import content_deltas, iter_lines
+import recurrence
+import event_search
+import event_versions
+import click
+import io
+import time
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///mayday.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mayday.db')
+# SQLite files of the stores below, opened on first use rather than on import
+app.config['LLM_CACHE_PATH'] = LLM_CACHE_PATH
+app.config['TOKEN_STORE_PATH'] = TOKEN_STORE_PATH
+app.config['JOB_QUEUE_PATH'] = QUEUE_PATH
 db = SQLAlchemy(app)
 
-# Load OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Deadlines, retries and circuit breakers for calls to OpenAI and Google
+openai_upstream = upstream_from_env('openai')
+google_upstream = upstream_from_env('google')
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# AI scheduling settings
+AI_MODEL = "gpt-3.5-turbo"
+AI_TEMPERATURE = 1.0
+# Structured output by default; LLM_RESPONSE_FORMAT=text asks for the 'Duration:'/'Sessions:' lines
+AI_SYSTEM_PROMPT = PLAN_JSON_PROMPT if json_mode() else PLAN_TEXT_PROMPT
+
+MAX_AI_SESSIONS = 14
+
+@lru_cache(maxsize=None)
+def llm_cache():
+    """Cache of parsed AI plans, keyed on the normalized description."""
+    return LLMCache(app.config['LLM_CACHE_PATH'])
+
+# Per-process cache of Google Calendar services
+calendar_services = CalendarServiceFactory()
+
+@lru_cache(maxsize=None)
+def token_store():
+    """Google OAuth tokens, kept server-side and refreshed ahead of expiry."""
+    return TokenStore(app.config['TOKEN_STORE_PATH'])
+
+# Generated ICS files, per user and content-addressed
+ics_store = ArtifactStore()
+
+# Server-Sent Events for job progress. A stream ends after SSE_WINDOW
+# seconds and the browser reconnects with Last-Event-ID, so a slow job
+# never holds a worker for long; SSE_RECONNECT is the browser's wait (ms)
+SSE_POLL_INTERVAL = 0.5
+SSE_KEEPALIVE = 15
+SSE_WINDOW = 20
+SSE_RECONNECT = 500
+
+# Homepage pagination
+EVENTS_PAGE_SIZE = 50
+MAX_EVENTS_PAGE_SIZE = 500
+
+# Search results per page
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Rows fetched per round trip when exporting
+EXPORT_BATCH_SIZE = 1000
+
+# Common slot search across users
+COMMON_SLOTS_DAYS = 14
+MAX_GROUP_SIZE = 1000
+# Users per IN (...) when loading a group's events
+GROUP_QUERY_CHUNK = 500
 
 # Google Calendar API settings
 SCOPES = ['https://www.googleapis.com/auth/calendar']
-CLIENT_CONFIG = json.loads(os.getenv("GOOGLE_CLIENT_CONFIG"))
+
+@lru_cache(maxsize=None)
+def openai_client():
+    """The OpenAI client, built on first use since importing openai takes about half a second."""
+    from openai import OpenAI
+    # Retries are left to openai_upstream
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+@lru_cache(maxsize=None)
+def google_client_config():
+    """GOOGLE_CLIENT_CONFIG parsed, or None if it is unset or not valid JSON."""
+    try:
+        return json.loads(os.getenv("GOOGLE_CLIENT_CONFIG") or 'null')
+    except ValueError as e:
+        print(f"Error: GOOGLE_CLIENT_CONFIG is not valid JSON: {str(e)}")
+        return None
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -43,6 +129,251 @@ class Event(db.Model):
     title = db.Column(db.String(100), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
+    # Id of the mirrored Google Calendar event, if any
+    google_id = db.Column(db.String(255))
+    # Random id the row is pushed to Google under, kept until the push succeeds
+    push_id = db.Column(db.String(64))
+    # UID of the VEVENT this was imported from, if any
+    ical_uid = db.Column(db.String(255))
+    # A recurring event is one row: start/end_time hold the first occurrence
+    rrule = db.Column(db.String(255))
+    exdates = db.Column(db.Text)
+    # End of the last occurrence, NULL while the series is unbounded
+    recurrence_end = db.Column(db.DateTime)
+    # Sessions of the AI plan this was scheduled from, NULL for one-off events
+    plan_sessions = db.Column(db.Integer)
+
+    # Serves per-user range scans ordered by start_time
+    __table_args__ = (db.Index('ix_event_user_start', 'user_id', 'start_time'),
+                      db.Index('ix_event_user_google', 'user_id', 'google_id'),
+                      db.Index('ix_event_user_ical_uid', 'user_id', 'ical_uid'),
+                      db.Index('ix_event_user_rrule', 'user_id', 'rrule'))
+
+    def to_dict(self):
+        return {'id': self.id,
+                'title': self.title,
+                'start_time': self.start_time.isoformat(),
+                'end_time': self.end_time.isoformat()}
+
+    def set_recurrence(self, rule, exdates=None):
+        """Make this row a series (or a single event again if rule is None)."""
+        self.rrule = recurrence.validate_rule(rule, self.start_time) if rule else None
+        self.exdates = exdates if rule else None
+        self.recurrence_end = (recurrence.series_end(self.rrule, self.start_time, self.end_time - self.start_time)
+                               if rule else None)
+
+class CalendarSyncState(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    sync_token = db.Column(db.String(255))
+    synced_at = db.Column(db.DateTime)
+
+class FreeBusyShare(db.Model):
+    # The owner lets whoever signs in as viewer_email see their free/busy, never their events.
+    # Kept by email so sharing with someone doesn't tell whether they have an account
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    viewer_email = db.Column(db.String(120), primary_key=True)
+
+    __table_args__ = (db.Index('ix_freebusy_share_viewer', 'viewer_email', 'owner_id'),)
+
+# Two-way sync with the user's Google calendar
+calendar_sync = CalendarSync(db, Event, CalendarSyncState, upstream=google_upstream)
+
+def upgrade_schema():
+    """Create missing tables, columns and indexes on an existing database."""
+    db.create_all()
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        with db.engine.begin() as connection:
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(db.engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        # create_all() skips indexes on tables that already exist
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    with db.engine.begin() as connection:
+        event_search.install(connection, Event.__tablename__)
+        event_versions.install(connection, Event.__tablename__)
+
+@orm_event.listens_for(Event.__table__, 'after_create')
+def create_event_search(target, connection, **kw):
+    # New databases get the search index and change counters with the event table
+    event_search.install(connection, target.name)
+    event_versions.install(connection, target.name)
+
+def user_version(user_id):
+    # Caches below are checked against this, so writes by other processes are seen
+    return event_versions.version(db.session, user_id)
+
+def load_user_intervals(user_id):
+    # Series are expanded per window instead, see busy_intervals()
+    return (db.session.query(Event.id, Event.start_time, Event.end_time)
+            .filter(Event.user_id == user_id, Event.rrule.is_(None)).all())
+
+# Per-user interval index used for conflict checks
+conflict_index = ConflictIndex(load_user_intervals, version=user_version)
+
+def load_event_durations(user_id):
+    return (db.session.query(Event.title, Event.start_time, Event.end_time, Event.plan_sessions)
+            .filter(Event.user_id == user_id).all())
+
+# Durations learnt from each user's events, tried before asking the LLM
+duration_estimator = DurationEstimator(load_event_durations, version=user_version)
+
+def load_group_busy(user_ids, start_time, end_time):
+    """Return (user_id, start, end) for the users' events and occurrences overlapping the window."""
+    rows = []
+    for position in range(0, len(user_ids), GROUP_QUERY_CHUNK):
+        chunk = user_ids[position:position + GROUP_QUERY_CHUNK]
+        rows.extend(db.session.query(Event.user_id, Event.start_time, Event.end_time)
+                    .filter(Event.user_id.in_(chunk), Event.rrule.is_(None),
+                            Event.start_time < end_time, Event.end_time > start_time))
+        series = Event.query.filter(Event.user_id.in_(chunk), Event.rrule.isnot(None), Event.start_time < end_time,
+                                    or_(Event.recurrence_end.is_(None), Event.recurrence_end > start_time))
+        for event in series:
+            rows.extend((event.user_id, begin, end) for begin, end, _ in
+                        recurrence.overlapping(event, start_time, end_time))
+    return rows
+
+# Free/busy bitmaps for finding slots common to several users
+freebusy_index = FreeBusyIndex(load_group_busy,
+                               versions=lambda user_ids: event_versions.versions(db.session, user_ids))
+
+@orm_event.listens_for(Event, 'after_insert')
+def index_inserted_event(mapper, connection, target):
+    # The version this write left behind, so caches can tell whether it is the only one they missed
+    version = event_versions.version(connection, target.user_id)
+    if target.rrule is None:
+        conflict_index.added(target.user_id, target.id, target.start_time, target.end_time, version)
+        freebusy_index.added(target.user_id, target.start_time, target.end_time, version)
+    else:
+        freebusy_index.invalidate(target.user_id)
+    duration_estimator.added(target.user_id, target.title, target.start_time, target.end_time,
+                             target.plan_sessions, version)
+    ics_store.invalidate(target.user_id)
+
+@orm_event.listens_for(Event, 'after_delete')
+def unindex_deleted_event(mapper, connection, target):
+    version = event_versions.version(connection, target.user_id)
+    if target.rrule is None:
+        conflict_index.removed(target.user_id, target.id, target.start_time, target.end_time, version)
+        freebusy_index.removed(target.user_id, target.start_time, target.end_time, version)
+    else:
+        freebusy_index.invalidate(target.user_id)
+    duration_estimator.removed(target.user_id, target.title, target.start_time, target.end_time,
+                               target.plan_sessions, version)
+    ics_store.invalidate(target.user_id)
+
+def invalidate_user_caches(user_id):
+    """Drop everything cached from the user's events, to be rebuilt on next use.
+
+    For writes the mapper events can't apply in place: updates, and bulk
+    statements that skip them. The version check would catch those on the
+    next read as well; dropping the caches now frees their memory at once.
+    """
+    conflict_index.invalidate(user_id)
+    freebusy_index.invalidate(user_id)
+    duration_estimator.invalidate(user_id)
+    ics_store.invalidate(user_id)
+
+@orm_event.listens_for(Event, 'after_update')
+def reindex_updated_event(mapper, connection, target):
+    invalidate_user_caches(target.user_id)
+
+# Time spent in SQL statements; statements run by a commit count towards db_commit too
+@orm_event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+@orm_event.listens_for(Engine, 'after_cursor_execute')
+def record_statement_time(conn, cursor, statement, parameters, context, executemany):
+    record('sql', time.perf_counter() - conn.info['statement_started'].pop())
+
+@orm_event.listens_for(db.session, 'before_commit')
+def start_commit_timer(session):
+    session.info['commit_started'] = time.perf_counter()
+
+@orm_event.listens_for(db.session, 'after_commit')
+def record_commit_time(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        record('db_commit', time.perf_counter() - started)
+
+@orm_event.listens_for(db.session, 'after_rollback')
+def drop_commit_timer(session):
+    session.info.pop('commit_started', None)
+
+def recurring_events(user_id, window_start, window_end=None):
+    """Return the user's series that may have occurrences in the window."""
+    query = Event.query.filter(Event.user_id == user_id, Event.rrule.isnot(None),
+                               or_(Event.recurrence_end.is_(None), Event.recurrence_end > window_start))
+    if window_end is not None:
+        query = query.filter(Event.start_time < window_end)
+    return query.all()
+
+def busy_intervals(user_id, start_time, end_time):
+    """Return (start, end, id) for single events and occurrences overlapping the window."""
+    busy = conflict_index.overlaps(user_id, start_time, end_time)
+    for series in recurring_events(user_id, start_time, end_time):
+        busy.extend(recurrence.overlapping(series, start_time, end_time))
+    return sorted(busy)
+
+def find_conflicts(user_id, start_time, end_time):
+    """Return the user's events and occurrences overlapping [start_time, end_time)."""
+    conflicts = []
+    ids = [event_id for _, _, event_id in conflict_index.overlaps(user_id, start_time, end_time)]
+    if ids:
+        conflicts.extend(Event.query.filter(Event.id.in_(ids)))
+    for series in recurring_events(user_id, start_time, end_time):
+        conflicts.extend(recurrence.Occurrence(series, begin)
+                         for begin, _, _ in recurrence.overlapping(series, start_time, end_time))
+    return sorted(conflicts, key=lambda event: event.start_time)
+
+def series_conflicts(user_id, start_time, end_time, rule=None):
+    """find_conflicts() for every occurrence of a new, bounded series."""
+    if rule is None:
+        return find_conflicts(user_id, start_time, end_time)
+    duration = end_time - start_time
+    conflicts = []
+    for begin in recurrence.expand(rule, start_time, None, start_time, None, recurrence.MAX_OCCURRENCES):
+        conflicts.extend(find_conflicts(user_id, begin, begin + duration))
+    return conflicts
+
+def form_recurrence(form, start_time):
+    """Build an RRULE from the repeat/count fields of the scheduling form."""
+    repeat = form.get('repeat', '')
+    if not repeat:
+        return None
+    count = max(1, min(int(form.get('count') or 1), recurrence.MAX_OCCURRENCES))
+    rules = {'daily': 'FREQ=DAILY', 'weekdays': 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR', 'weekly': 'FREQ=WEEKLY'}
+    if repeat not in rules:
+        raise ValueError(f'Unknown repeat option {repeat}')
+    return recurrence.validate_rule(f'{rules[repeat]};COUNT={count}', start_time)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.breakdown_token = start_breakdown()
+
+@app.after_request
+def record_request_time(response):
+    # Streamed bodies are timed until the response starts
+    seconds = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.observe(seconds, request.method, route, response.status_code)
+    breakdown = finish_breakdown(g.pop('breakdown_token'))
+    if is_slow(seconds):
+        print(f"Slow request: {request.method} {request.path} {response.status_code} "
+              f"in {seconds * 1e3:.0f}ms ({format_breakdown(breakdown)})")
+    return response
+
+@app.teardown_request
+def drop_request_timer(exception):
+    # after_request is skipped when an error escapes the app
+    token = g.pop('breakdown_token', None)
+    if token is not None:
+        finish_breakdown(token)
 
 @app.route('/')
 def index():
@@ -79,12 +410,189 @@ def register():
         return redirect(url_for('login'))
     return render_template('register.html')
 
+def events_page(user_id, after, after_id=0, until=None, limit=EVENTS_PAGE_SIZE):
+    """Return (events, next_cursor) for events after the (start_time, id) cursor.
+
+    Keyset pagination on the (user_id, start_time) index keeps every page
+    equally cheap however many events the user has. Recurring events are
+    expanded only up to where the page ends, so a long series costs no more
+    than the occurrences that are actually shown.
+    """
+    # The plain >= bound lets SQLite turn the cursor into an index range
+    query = Event.query.filter(Event.user_id == user_id,
+                               Event.rrule.is_(None),
+                               Event.start_time >= after,
+                               or_(Event.start_time > after,
+                                   and_(Event.start_time == after, Event.id > after_id)))
+    if until is not None:
+        query = query.filter(Event.start_time < until)
+    events = query.order_by(Event.start_time, Event.id).limit(limit + 1).all()
+    
+    # Occurrences after the last fetched single event can't make this page
+    window_end = until
+    if len(events) > limit:
+        last = events[-1].start_time + timedelta(microseconds=1)
+        window_end = last if until is None else min(until, last)
+    for series in recurring_events(user_id, after, window_end):
+        # One extra, as an occurrence at the cursor's start_time may be skipped
+        events.extend(occurrence for occurrence in recurrence.occurrences(series, after, window_end, limit + 2)
+                      if (occurrence.start_time, occurrence.id) > (after, after_id))
+    events.sort(key=lambda event: (event.start_time, event.id))
+    
+    if len(events) <= limit:
+        return events, None
+    events = events[:limit]
+    return events, {'after': events[-1].start_time.isoformat(), 'after_id': events[-1].id}
+
 @app.route('/homepage')
 def homepage():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    events = Event.query.filter_by(user_id=session['user_id']).all()
-    return render_template('homepage.html', events=events)
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    events, next_cursor = events_page(session['user_id'], today)
+    return render_template('homepage.html', events=events, next_cursor=next_cursor)
+
+@app.route('/api/events')
+def list_events():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    try:
+        after = datetime.fromisoformat(request.args['after'])
+        after_id = int(request.args.get('after_id', 0))
+        until = datetime.fromisoformat(request.args['until']) if 'until' in request.args else None
+        limit = min(int(request.args.get('limit', EVENTS_PAGE_SIZE)), MAX_EVENTS_PAGE_SIZE)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Invalid range'}), 400
+    events, next_cursor = events_page(session['user_id'], after, after_id, until, limit)
+    return jsonify({'events': [event.to_dict() for event in events], 'next': next_cursor})
+
+@app.route('/api/events/bulk', methods=['POST'])
+def bulk_events():
+    """Create, update and delete many events in one transaction.
+
+    The body is {"create": [...], "update": [...], "delete": [ids]}, plus
+    "atomic": true to write nothing if any item is invalid. Each item gets
+    a result in request order. New events reach Google with /api/sync;
+    events mirrored from Google can't be updated or deleted here.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    sections = {name: body.get(name, []) for name in ('create', 'update', 'delete')}
+    if not all(isinstance(items, list) for items in sections.values()):
+        return jsonify({'error': 'create, update and delete must be lists'}), 400
+    if sum(len(items) for items in sections.values()) > MAX_BULK_ITEMS:
+        return jsonify({'error': f'At most {MAX_BULK_ITEMS} items per request'}), 400
+    atomic = body.get('atomic', False)
+    if not isinstance(atomic, bool):
+        return jsonify({'error': 'atomic must be true or false'}), 400
+    
+    user_id = session['user_id']
+    try:
+        results, stats = apply_bulk(db, Event, user_id, sections['create'], sections['update'],
+                                    sections['delete'], atomic)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({'error': 'Could not save events'}), 500
+    invalidate_user_caches(user_id)
+    record('bulk_events', stats.pop('seconds'))
+    status = 400 if atomic and stats['failed'] else 200
+    return jsonify({**stats, 'results': results}), status
+
+@app.route('/api/search')
+def search_events():
+    """Search the user's event titles, best matches first.
+
+    Every word of ?q= matches as a prefix ("calc ex" finds "Calculus
+    exam"); events matching every word whole come first, marked exact.
+    ?start= and ?end= keep events overlapping that range; a
+    recurring event is returned once, as its series. Pages by ?offset=.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    try:
+        query = request.args['q']
+        start = datetime.fromisoformat(request.args['start']) if 'start' in request.args else None
+        end = datetime.fromisoformat(request.args['end']) if 'end' in request.args else None
+        limit = min(int(request.args.get('limit', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Invalid search'}), 400
+    with span('search'):
+        results = event_search.search(db, Event, session['user_id'], query, start, end, limit + 1, offset)
+    next_page = {'offset': offset + limit} if len(results) > limit else None
+    return jsonify({'events': [dict(event.to_dict(), exact=exact, recurring=event.rrule is not None)
+                               for event, exact in results[:limit]],
+                    'next': next_page})
+
+@app.route('/api/common_slots')
+def common_slots():
+    """Find windows when the current user and the users in ?emails= are free.
+
+    require=all (default) wants everyone free, require=any anyone, and a
+    number at least that many. Only users who shared their free/busy with
+    the caller (see /api/freebusy_shares) take part; the other emails come
+    back as unavailable. Only free/busy is revealed, never events.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    emails = [email.strip() for email in request.args.get('emails', '').split(',') if email.strip()]
+    try:
+        start = (datetime.fromisoformat(request.args['start']) if 'start' in request.args
+                 else datetime.now(timezone.utc).replace(tzinfo=None))
+        end = (datetime.fromisoformat(request.args['end']) if 'end' in request.args
+               else start + timedelta(days=COMMON_SLOTS_DAYS))
+        duration = timedelta(minutes=int(request.args.get('duration', 30)))
+        require = request.args.get('require', 'all')
+        if require not in ('all', 'any') and int(require) < 1:
+            raise ValueError(require)
+        day_start = datetime.strptime(request.args.get('day_start', DAY_START.strftime('%H:%M')), '%H:%M').time()
+        day_end = datetime.strptime(request.args.get('day_end', DAY_END.strftime('%H:%M')), '%H:%M').time()
+        limit = min(int(request.args.get('limit', 20)), MAX_CANDIDATES)
+    except ValueError:
+        return jsonify({'error': 'Invalid parameters'}), 400
+    if len(emails) >= MAX_GROUP_SIZE:
+        return jsonify({'error': f'At most {MAX_GROUP_SIZE} users per search'}), 400
+    
+    # Only users sharing their free/busy with the caller count; the rest are
+    # reported alike, whether they have an account or not. A session without
+    # a user row (the dummy login) has no email anyone could share with.
+    viewer = db.session.get(User, session['user_id'])
+    users = {}
+    for position in range(0, len(emails) if viewer is not None else 0, GROUP_QUERY_CHUNK):
+        users.update(db.session.query(User.email, User.id)
+                     .join(FreeBusyShare, FreeBusyShare.owner_id == User.id)
+                     .filter(FreeBusyShare.viewer_email == viewer.email,
+                             User.email.in_(emails[position:position + GROUP_QUERY_CHUNK])))
+    user_ids = [session['user_id']] + [users[email] for email in emails if email in users]
+    slots = freebusy_index.common_slots(user_ids, start, end, duration, require, day_start, day_end, limit)
+    return jsonify({'users': len(set(user_ids)),
+                    'unavailable': [email for email in emails if email not in users],
+                    'slot_minutes': freebusy_index.slot_minutes,
+                    'slots': [{'start': begin.isoformat(), 'end': finish.isoformat(), 'free': free}
+                              for begin, finish, free in slots]})
+
+@app.route('/api/freebusy_shares', methods=['GET', 'POST', 'DELETE'])
+def freebusy_shares():
+    """List, add (POST {"email": ...}) or remove (DELETE ?email=) who may see the user's free/busy."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    user_id = session['user_id']
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        email = body.get('email') if isinstance(body, dict) else None
+        if not isinstance(email, str) or not email.strip():
+            return jsonify({'error': 'Expected {"email": ...}'}), 400
+        if db.session.get(FreeBusyShare, (user_id, email.strip())) is None:
+            db.session.add(FreeBusyShare(owner_id=user_id, viewer_email=email.strip()))
+            db.session.commit()
+    elif request.method == 'DELETE':
+        FreeBusyShare.query.filter_by(owner_id=user_id, viewer_email=request.args.get('email', '').strip()).delete()
+        db.session.commit()
+    shares = FreeBusyShare.query.filter_by(owner_id=user_id).order_by(FreeBusyShare.viewer_email)
+    return jsonify({'emails': [share.viewer_email for share in shares]})
 
 @app.route('/add_event', methods=['GET', 'POST'])
 def add_event():
@@ -94,97 +602,303 @@ def add_event():
         title = request.form['title']
         start_time = datetime.fromisoformat(request.form['start_time'])
         end_time = datetime.fromisoformat(request.form['end_time'])
+        try:
+            rule = form_recurrence(request.form, start_time)
+        except ValueError:
+            return render_template('manual_schedule.html', form=request.form, action='add_event',
+                                   error="Invalid repeat settings.")
+        conflicts = series_conflicts(session['user_id'], start_time, end_time, rule)
+        if conflicts and request.form.get('allow_conflicts') != '1':
+            # The form posts back here, so "Add it anyway" still pushes to Google
+            return render_template('manual_schedule.html', form=request.form, conflicts=conflicts, action='add_event',
+                                   error="This event overlaps with existing events.")
         new_event = Event(user_id=session['user_id'], title=title, start_time=start_time, end_time=end_time)
+        new_event.set_recurrence(rule)
         db.session.add(new_event)
         db.session.commit()
         
         # Add event to Google Calendar
-        if 'credentials' in session:
-            credentials = Credentials(**session['credentials'])
-            service = build('calendar', 'v3', credentials=credentials)
-            event = {
-                'summary': title,
-                'start': {'dateTime': start_time.isoformat(), 'timeZone': 'UTC'},
-                'end': {'dateTime': end_time.isoformat(), 'timeZone': 'UTC'},
-            }
-            service.events().insert(calendarId='primary', body=event).execute()
+        push_to_google_calendar([new_event], google_calendar_service())
         
         return redirect(url_for('homepage'))
     return render_template('add_event.html')
 
+def request_ai_plan(description):
+    """Ask the LLM for the session duration and count.
+
+    Returns (plan, suggestion) where plan is a schedule_parser.Plan, or
+    None if the suggestion can't be parsed. The actual times are chosen
+    locally by slot_planner. The completion is streamed; in the text format
+    reading stops as soon as both lines are in, so any explanation the
+    model adds isn't waited for.
+    """
+    parser = PlanParser(MAX_AI_SESSIONS)
+    lines = []
+    with span('llm'):
+        # Hedging (OPENAI_HEDGE_AFTER) may start a second completion; the slower one is closed
+        stream = openai_upstream.call(
+            openai_client().chat.completions.create,
+            hedge=True,
+            discard=lambda stream: stream.close(),
+            timeout_arg='timeout',
+            model=AI_MODEL,
+            temperature=AI_TEMPERATURE,
+            messages=[
+                {"role": "system", "content": AI_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Suggest a duration and number of sessions for: {description}"}
+            ],
+            stream=True,
+            **response_format_kwargs()
+        )
+        try:
+            for line in iter_lines(content_deltas(stream)):
+                lines.append(line)
+                if parser.feed(line):
+                    break
+        finally:
+            stream.close()
+    suggestion = '\n'.join(lines)
+    return parse_plan(suggestion, MAX_AI_SESSIONS), suggestion
+
+def local_plan(minutes, sessions):
+    """A Plan of sessions lasting minutes each, in hours when they are whole."""
+    if minutes % 60 == 0:
+        return Plan(minutes // 60, 'hour', sessions)
+    return Plan(minutes, 'minute', sessions)
+
+def run_ai_schedule(payload, progress):
+    """Plan, place and save the sessions for one AI scheduling job.
+
+    Runs in a job worker and reports the plan and each placed session
+    through progress() as soon as they are known. Exceptions before anything is saved (an OpenAI
+    error, say) propagate so the queue retries the job; once the events are
+    committed, later failures are reported in the result instead, so a retry
+    never saves them twice.
+    """
+    user_id = payload['user_id']
+    description = payload['description']
+    now = datetime.now(timezone.utc)
+    
+    # The plan holds no timestamps, so cached plans never go stale
+    raw = {}
+    def compute():
+        started = time.perf_counter()
+        plan, raw['suggestion'] = request_ai_plan(description)
+        duration_estimator.llm_answered(time.perf_counter() - started)
+        return plan._asdict() if plan else None
+    bypass = payload.get('bypass_cache', False)
+    # Events the user scheduled before often answer without the LLM, with
+    # as many sessions as the plan they were scheduled from had
+    with span('duration_estimate'):
+        estimate = None if bypass else duration_estimator.estimate(user_id, description)
+    if estimate is not None:
+        cached = local_plan(*estimate)._asdict()
+    else:
+        cached = llm_cache().cached(AI_MODEL, AI_TEMPERATURE, AI_SYSTEM_PROMPT, description, compute, bypass=bypass)
+    if not cached:
+        return {'suggestion': raw.get('suggestion'), 'error': "Couldn't parse the suggested duration."}
+    plan = Plan(**cached)
+    progress('plan', cached)
+    
+    if plan.unit == 'hour':
+        duration_delta = timedelta(hours=plan.duration)
+    else:
+        duration_delta = timedelta(minutes=plan.duration)
+    
+    # Place the sessions into free slots of the user's calendar
+    local_now = now.replace(tzinfo=None)
+    busy = busy_intervals(user_id, local_now, local_now + timedelta(days=HORIZON_DAYS + 1))
+    slots = place_sessions(busy, duration_delta, plan.sessions, local_now, payload.get('strategy', 'earliest'))
+    if not slots:
+        return {'error': "No free slot in the next 30 days."}
+    for start, end in slots:
+        progress('session', {'title': description, 'start_time': start.isoformat(), 'end_time': end.isoformat()})
+    
+    # Sessions at the same time on evenly spaced days become one series
+    new_events = []
+    for title, start, end, rule in recurrence.compact((description, start, end) for start, end in slots):
+        new_event = Event(user_id=user_id, title=title, start_time=start, end_time=end, plan_sessions=plan.sessions)
+        new_event.set_recurrence(rule)
+        new_events.append(new_event)
+    db.session.add_all(new_events)
+    db.session.commit()
+    
+    times = ', '.join(start.strftime('%d/%m/%y %H:%M') for start, _ in slots)
+    result = {'suggestion': f"Suggested time: {times}, Duration: {plan.duration} {plan.unit}s",
+              'event_added': True,
+              'event_ids': [event.id for event in new_events]}
+    try:
+        # Save ICS file, served by download_ics()
+        with span('ics'):
+            result['ics_artifact'] = ics_store.put(user_id, [(event_uid(event), event.title, event.start_time,
+                                                              event.end_time, event.rrule, event.exdates)
+                                                             for event in new_events])
+        result['ics_created'] = True
+        
+        # Add to Google Calendar
+        results = push_to_google_calendar(new_events, google_calendar_service(user_id))
+        result['calendar_added'] = bool(results) and summarize(results)[1] == 0
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error: {str(e)}")
+        result['warning'] = "The events were saved, but could not all be exported."
+    return result
+
+# AI scheduling runs in background workers; see run_ai_schedule()
+JOB_HANDLERS = {'ai_schedule': timed_job('ai_schedule', run_ai_schedule)}
+
+@lru_cache(maxsize=None)
+def job_queue():
+    return JobQueue(app.config['JOB_QUEUE_PATH'])
+
+@lru_cache(maxsize=None)
+def job_workers():
+    """This process's worker threads, started by the first job it enqueues."""
+    return WorkerPool(job_queue(), JOB_HANDLERS, context=app.app_context)
+
+def job_queue_counts():
+    metrics = job_queue().metrics()
+    return {(status,): metrics[status] for status in STATUSES}
+
+registry.register(Gauge('job_queue_jobs', 'Background jobs by status.', ('status',), job_queue_counts))
+registry.register(Gauge('job_queue_oldest_queued_seconds', 'Age of the oldest queued job.', (),
+                        lambda: {(): job_queue().metrics()['oldest_queued_seconds']}))
+
+def upstream_counts():
+    counts = {}
+    for upstream in (openai_upstream, google_upstream):
+        stats = upstream.stats()
+        counts.update({(upstream.name, event): stats[event] for event in stats if event != 'state'})
+    return counts
+
+registry.register(Gauge('upstream_calls_total', 'Calls to OpenAI and Google, by what happened to them.',
+                        ('upstream', 'event'), upstream_counts, kind='counter'))
+registry.register(Gauge('upstream_circuit_open', 'Whether calls to an upstream are being refused (1) or sent (0).',
+                        ('upstream',), lambda: {(upstream.name,): int(upstream.breaker.state == 'open')
+                                                for upstream in (openai_upstream, google_upstream)}))
+
+def duration_estimate_counts():
+    stats = duration_estimator.stats()
+    return {('history',): stats['hits'], ('fallback',): stats['misses']}
+
+registry.register(Gauge('duration_estimates_total',
+                        "AI scheduling durations, by whether the user's history answered or the LLM (or its "
+                        "cache) was asked.", ('source',), duration_estimate_counts, kind='counter'))
+registry.register(Gauge('duration_estimate_seconds_saved_total',
+                        'LLM time saved by durations taken from history, at the mean LLM call time.', (),
+                        lambda: {(): duration_estimator.stats()['seconds_saved']}, kind='counter'))
+
 @app.route('/ai_schedule', methods=['GET', 'POST'])
 def ai_schedule():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     if request.method == 'POST':
-        description = request.form['description']
+        strategy = request.form.get('strategy', 'earliest')
+        if strategy not in STRATEGIES:
+            strategy = 'earliest'
+        payload = {'user_id': session['user_id'],
+                   'description': request.form['description'],
+                   'strategy': strategy,
+                   'bypass_cache': request.form.get('bypass_cache') == '1'}
+        wants_json = request.accept_mimetypes.best == 'application/json'
         try:
-            # Get current date and time
-            now = datetime.now(pytz.UTC)
-            
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a scheduling assistant. Suggest a specific date and time for the following event. The date should be between tomorrow and 30 days from now. Provide a time between 9:00 AM and 9:00 PM. Respond in the format: 'DD/MM/YY HH:MM'. Also suggest a duration for the event."},
-                    {"role": "user", "content": f"Current date and time: {now.strftime('%d/%m/%y %H:%M')}. Suggest a date, time, and duration for: {description}"}
-                ]
-            )
-            suggestion = response.choices[0].message.content
-            
-            # Parse the suggestion
-            match = re.search(r'(\d{2}/\d{2}/\d{2}) (\d{2}:\d{2})', suggestion)
-            duration_match = re.search(r'duration.*?(\d+)\s*(hour|minute)', suggestion, re.IGNORECASE)
-            
-            if match and duration_match:
-                suggested_datetime = datetime.strptime(match.group(1) + ' ' + match.group(2), '%d/%m/%y %H:%M')
-                suggested_datetime = pytz.timezone('UTC').localize(suggested_datetime)
-                
-                duration = int(duration_match.group(1))
-                duration_unit = duration_match.group(2).lower()
-                
-                if duration_unit == 'hour':
-                    duration_delta = timedelta(hours=duration)
-                else:
-                    duration_delta = timedelta(minutes=duration)
-                
-                # Ensure suggested time is in the future
-                if suggested_datetime <= now:
-                    suggested_datetime += timedelta(days=1)
-                
-                # Create ICS event
-                cal = Calendar()
-                event = ICSEvent()
-                event.name = description
-                event.begin = suggested_datetime
-                event.end = suggested_datetime + duration_delta
-                cal.events.add(event)
-                
-                # Save ICS file
-                with open('event.ics', 'w') as f:
-                    f.write(str(cal))
-                
-                # Add to Google Calendar
-                if 'credentials' in session:
-                    credentials = Credentials(**session['credentials'])
-                    service = build('calendar', 'v3', credentials=credentials)
-                    event = {
-                        'summary': description,
-                        'start': {'dateTime': suggested_datetime.isoformat(), 'timeZone': 'UTC'},
-                        'end': {'dateTime': (suggested_datetime + duration_delta).isoformat(), 'timeZone': 'UTC'},
-                    }
-                    service.events().insert(calendarId='primary', body=event).execute()
-                
-                return render_template('ai_schedule.html', 
-                                       suggestion=f"Suggested time: {suggested_datetime.strftime('%d/%m/%y %H:%M')}, Duration: {duration} {duration_unit}s", 
-                                       ics_created=True, 
-                                       calendar_added=True)
-            else:
-                return render_template('ai_schedule.html', suggestion=suggestion, error="Couldn't parse the suggested time or duration.")
-        except Exception as e:
-            print(f"Error: {str(e)}")
-            return render_template('ai_schedule.html', error="An error occurred. Please try again.")
+            job_id = job_queue().enqueue('ai_schedule', payload, user_id=session['user_id'])
+        except QueueFull:
+            error = "You already have several requests in progress. Please wait for them to finish."
+            if wants_json:
+                return jsonify({'error': error}), 429
+            return render_template('ai_schedule.html', error=error), 429
+        job_workers().start()
+        if wants_json:
+            return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id),
+                            'events_url': url_for('job_events', job_id=job_id)}), 202
+        return render_template('ai_schedule.html', job_id=job_id)
     return render_template('ai_schedule.html')
 
+@app.route('/api/jobs/<int:job_id>')
+def job_status(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    job = job_queue().get(job_id)
+    if job is None or job['user_id'] != session['user_id']:
+        return jsonify({'error': 'Job not found'}), 404
+    result = job['result']
+    if result and result.get('ics_artifact'):
+        result['ics_url'] = url_for('download_ics', digest=result['ics_artifact'])
+    return jsonify({'id': job['id'],
+                    'status': job['status'],
+                    'attempts': job['attempts'],
+                    'result': result,
+                    'error': job['error'] if job['status'] == 'failed' else None})
+
+@app.route('/api/jobs/<int:job_id>/events')
+def job_events(job_id):
+    """Stream a job's progress as Server-Sent Events, ending with done or failed.
+
+    Each response covers at most SSE_WINDOW seconds; the browser then
+    reconnects and picks up after the last event it saw.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    job = job_queue().get(job_id)
+    if job is None or job['user_id'] != session['user_id']:
+        return jsonify({'error': 'Job not found'}), 404
+    # EventSource sends Last-Event-ID when it reconnects
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+    except ValueError:
+        return jsonify({'error': 'Invalid event id'}), 400
+    
+    def stream(after):
+        started = last_sent = time.monotonic()
+        yield f'retry: {SSE_RECONNECT}\n\n'
+        while time.monotonic() - started < SSE_WINDOW:
+            # Read the status first, so events published before it finished aren't missed
+            job = job_queue().get(job_id)
+            for seq, kind, data in job_queue().events(job_id, after):
+                after = seq
+                last_sent = time.monotonic()
+                yield f'id: {seq}\nevent: {kind}\ndata: {json.dumps(data)}\n\n'
+            if job['status'] in ('done', 'failed'):
+                final = {'result': job['result'], 'error': job['error'] if job['status'] == 'failed' else None}
+                yield f"event: {job['status']}\ndata: {json.dumps(final)}\n\n"
+                return
+            if time.monotonic() - last_sent > SSE_KEEPALIVE:
+                last_sent = time.monotonic()
+                yield ': keep-alive\n\n'
+            # Woken at once by jobs run in this process, by the timeout for the rest
+            job_queue().wait_for_progress(SSE_POLL_INTERVAL)
+    
+    return Response(stream_with_context(stream(after)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/metrics')
+def job_metrics():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    metrics = job_queue().metrics()
+    metrics['workers'] = len(job_workers().threads)
+    return jsonify(metrics)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request, job and span timings for Prometheus to scrape."""
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+@app.cli.command('worker')
+@click.option('--workers', default=JOB_WORKERS, show_default=True, help='Worker threads to run.')
+def worker_command(workers):
+    """Run job workers in the foreground (e.g. with JOB_WORKERS=0 for the web app)."""
+    pool = WorkerPool(job_queue(), JOB_HANDLERS, workers=workers, context=app.app_context)
+    pool.start()
+    click.echo(f'Running {workers} job workers on {job_queue().path}, Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(60)
+            job_queue().prune()
+    except KeyboardInterrupt:
+        pool.stop()
+
 @app.route('/manual_schedule', methods=['GET', 'POST'])
 def manual_schedule():
     if 'user_id' not in session:
@@ -193,18 +907,122 @@ def manual_schedule():
         title = request.form['title']
         start_time = datetime.fromisoformat(request.form['start_time'])
         end_time = datetime.fromisoformat(request.form['end_time'])
+        try:
+            rule = form_recurrence(request.form, start_time)
+        except ValueError:
+            return render_template('manual_schedule.html', form=request.form, error="Invalid repeat settings.")
+        conflicts = series_conflicts(session['user_id'], start_time, end_time, rule)
+        if conflicts and request.form.get('allow_conflicts') != '1':
+            return render_template('manual_schedule.html', form=request.form, conflicts=conflicts,
+                                   error="This event overlaps with existing events.")
         new_event = Event(user_id=session['user_id'], title=title, start_time=start_time, end_time=end_time)
+        new_event.set_recurrence(rule)
         db.session.add(new_event)
         db.session.commit()
         return redirect(url_for('homepage'))
     return render_template('manual_schedule.html')
 
-@app.route('/authorize')
-def authorize():
+def event_uid(event):
+    # Imported events keep the UID they came with
+    return event.ical_uid or f'mayday-event-{event.id}@mayday'
+
+@app.route('/export.ics')
+def export_ics():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    user_id = session['user_id']
+    
+    def rows():
+        # yield_per streams rows from the cursor instead of loading them all
+        query = (db.session.query(Event.id, Event.ical_uid, Event.title, Event.start_time, Event.end_time,
+                                  Event.rrule, Event.exdates)
+                 .filter(Event.user_id == user_id)
+                 .order_by(Event.start_time)
+                 .execution_options(yield_per=EXPORT_BATCH_SIZE))
+        # Series go out as a single VEVENT with their RRULE, like they are stored
+        for event in query:
+            yield event_uid(event), event.title, event.start_time, event.end_time, event.rrule, event.exdates
+    
+    # Written again only after the user's events change, in this process or another
+    with span('ics'):
+        digest = ics_store.calendar(user_id, rows, user_version(user_id))
+    return send_ics(user_id, digest, 'mayday.ics')
+
+@app.route('/ics/<digest>.ics')
+def download_ics(digest):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    if ics_store.get(session['user_id'], digest) is None:
+        return jsonify({'error': 'Calendar not found'}), 404
+    return send_ics(session['user_id'], digest, 'schedule.ics')
+
+def send_ics(user_id, digest, filename):
+    """Send a stored ICS file, answering If-None-Match/If-Modified-Since with 304."""
+    # The digest names the content, so it is a strong ETag
+    response = send_file(ics_store.path(user_id, digest), mimetype='text/calendar', as_attachment=True,
+                         download_name=filename, etag=digest, conditional=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def import_ics_lines(user_id, lines):
+    stats = import_events(db, Event, user_id, lines)
+    invalidate_user_caches(user_id)
+    return stats
+
+@app.route('/import_ics', methods=['GET', 'POST'])
+def import_ics():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return render_template('import_ics.html', error="Choose an .ics file to import.")
+        # Read the upload line by line rather than all at once
+        lines = io.TextIOWrapper(upload.stream, encoding='utf-8', errors='replace', newline='')
+        try:
+            stats = import_ics_lines(session['user_id'], lines)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error: {str(e)}")
+            return render_template('import_ics.html', error=f"Import failed: {str(e)}")
+        return render_template('import_ics.html', stats=stats)
+    return render_template('import_ics.html')
+
+@app.cli.command('import-ics')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--email', required=True, help='Owner of the imported events.')
+def import_ics_command(path, email):
+    """Import the events in an .ics file for a user."""
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.ClickException(f'No user with email {email}')
+    upgrade_schema()
+    with open(path, encoding='utf-8', errors='replace', newline='') as f:
+        stats = import_ics_lines(user.id, f)
+    click.echo(f"Imported {stats['inserted']} events ({stats['duplicates']} duplicates, "
+               f"{stats['skipped']} skipped) in {stats['seconds']:.2f}s, "
+               f"{stats['events_per_second']:.0f} events/s")
+
+def oauth_flow(state=None):
+    """The OAuth flow for connecting Google Calendar, or None if it isn't configured."""
+    client_config = google_client_config()
+    if not client_config:
+        return None
+    # Deferred like the OpenAI client; google_auth_oauthlib pulls in requests
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_config(
-        client_config=CLIENT_CONFIG,
-        scopes=SCOPES)
+        client_config=client_config,
+        scopes=SCOPES,
+        state=state)
     flow.redirect_uri = url_for('oauth2callback', _external=True)
+    return flow
+
+@app.route('/authorize')
+def authorize():
+    flow = oauth_flow()
+    if flow is None:
+        return jsonify({'error': 'Google Calendar is not configured'}), 503
     authorization_url, state = flow.authorization_url(
         access_type='offline',
         include_granted_scopes='true')
@@ -213,27 +1031,107 @@ def authorize():
 
 @app.route('/oauth2callback')
 def oauth2callback():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
     state = session['state']
-    flow = Flow.from_client_config(
-        client_config=CLIENT_CONFIG,
-        scopes=SCOPES,
-        state=state)
-    flow.redirect_uri = url_for('oauth2callback', _external=True)
+    flow = oauth_flow(state)
+    if flow is None:
+        return jsonify({'error': 'Google Calendar is not configured'}), 503
     authorization_response = request.url
     flow.fetch_token(authorization_response=authorization_response)
-    credentials = flow.credentials
-    session['credentials'] = credentials_to_dict(credentials)
+    token_store().save(session['user_id'], flow.credentials)
+    token_store().start_refresher()
     return redirect(url_for('homepage'))
 
-def credentials_to_dict(credentials):
-    return {'token': credentials.token,
-            'refresh_token': credentials.refresh_token,
-            'token_uri': credentials.token_uri,
-            'client_id': credentials.client_id,
-            'client_secret': credentials.client_secret,
-            'scopes': credentials.scopes}
+def google_calendar_service(user_id=None):
+    """Return the cached Calendar service for a user (by default the logged-in one), or None."""
+    if user_id is None:
+        user_id = session['user_id']
+        if 'credentials' in session:
+            # Sessions from before the token store carried the credentials in the cookie
+            token_store().save(user_id, credentials_from_dict(session.pop('credentials')))
+    credentials = token_store().get(user_id)
+    if credentials is None:
+        return None
+    token_store().start_refresher()
+    return calendar_services.service(user_id, credentials)
 
-if __name__ == '__main__':
+def push_to_google_calendar(events, service):
+    """Batch-insert Event rows into a user's Google Calendar, if connected.
+
+    service is None when the user hasn't connected Google Calendar. Rows
+    that made it get their google_id set so the sync engine treats them as
+    mirrored rather than as new local events.
+    """
+    if service is None:
+        return None
+    assign_push_ids(events)
+    db.session.commit()
+    with span('google_insert'):
+        results = push_events(service, [row_body(event) for event in events], upstream=google_upstream)
+    record_push(events, results)
+    for event, result in zip(events, results):
+        if not result['ok']:
+            print(f"Error: could not add '{event.title}' to Google Calendar: {result['error']}")
+    db.session.commit()
+    return results
+
+@app.route('/api/sync', methods=['POST'])
+def sync_google_calendar():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    service = google_calendar_service()
+    if service is None:
+        return jsonify({'error': 'Google Calendar is not connected'}), 400
+    try:
+        stats = calendar_sync.sync(service, session['user_id'])
+    except CircuitOpen:
+        db.session.rollback()
+        return jsonify({'error': 'Google Calendar is unavailable. Please try again later.'}), 503
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error: {str(e)}")
+        return jsonify({'error': 'Sync failed. Please try again.'}), 502
+    return jsonify(stats)
+
+@app.route('/readyz')
+def readiness():
+    """Whether this worker can take traffic, for the orchestrator to poll.
+
+    Checks the database, the job queue and the secret key; Google being
+    unconfigured is reported but doesn't make the worker unready. Nothing
+    here loads the OpenAI or Google clients.
+    """
+    checks = {}
+    try:
+        db.session.execute(text('SELECT 1'))
+        checks['database'] = 'ok'
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        checks['database'] = 'unavailable'
+    try:
+        job_queue().metrics()
+        checks['job_queue'] = 'ok'
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        checks['job_queue'] = 'unavailable'
+    checks['secret_key'] = 'ok' if app.config.get('SECRET_KEY') else 'missing'
+    checks['google'] = 'ok' if google_client_config() else 'not configured'
+    ready = all(checks[name] == 'ok' for name in ('database', 'job_queue', 'secret_key'))
+    return jsonify({'ready': ready, 'checks': checks}), 200 if ready else 503
+
+def create_app():
+    """Entry point for WSGI servers, e.g. gunicorn 'app:create_app()'.
+
+    Importing this module defines the app without loading what requests
+    can do without: the OpenAI client, the OAuth flow and the Google API
+    client are imported the first time a request needs them. The schema is
+    brought up to date before the app is returned; with several workers,
+    use gunicorn --preload so that happens once.
+    """
     with app.app_context():
-        db.create_all()
-    app.run(debug=True)
\ No newline at end of file
+        upgrade_schema()
+    return app
+
+if __name__ == '__main__':
+    create_app().run(debug=True)
\ No newline at end of file
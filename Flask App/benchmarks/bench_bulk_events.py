@@ -0,0 +1,89 @@
+"""Benchmark /api/events/bulk against posting the manual schedule form per event.
+
+Creates, updates and then deletes --events timetable entries in one
+request each, through the Flask test client, then posts a sample of the
+same entries one at a time to /manual_schedule (one commit per row) for
+comparison.
+
+Usage: python benchmarks/bench_bulk_events.py [--events 10000] [--form-sample 500] [--repeat 3]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import load_app
+
+
+def timetable(count, start, week=0):
+    """Class entries spread over weekdays, 8:00 to 18:00, as bulk create items."""
+    items = []
+    for number in range(count):
+        day = start + timedelta(days=7 * week + (number // 10) % 5 + 7 * (number // 50))
+        begin = day + timedelta(hours=8 + number % 10)
+        items.append({'title': f'Class {number % 37}, room {number % 12}',
+                      'start_time': begin.isoformat(), 'end_time': (begin + timedelta(minutes=50)).isoformat()})
+    return items
+
+
+def post(client, body):
+    started = time.perf_counter()
+    response = client.post('/api/events/bulk', json=body)
+    seconds = time.perf_counter() - started
+    if response.status_code != 200 or response.json['failed']:
+        raise SystemExit(f'bulk request failed: {response.status_code} {response.get_data(as_text=True)[:200]}')
+    return response.json, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--form-sample', type=int, default=500, help='events posted one at a time')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mayday-bulk-')
+    app = load_app(os.path.join(workdir, 'bench.db'))
+    with app.app.app_context():
+        user = app.User(email='bulk@bench', password='x')
+        app.db.session.add(user)
+        app.db.session.commit()
+        user_id = user.id
+    client = app.app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+    start = datetime(2024, 9, 2)
+
+    print(f"{'operation':>14} {'events':>8} {'best':>8} {'events/s':>10}")
+    for week in range(args.repeat):
+        items = timetable(args.events, start, week)
+        created, create_seconds = post(client, {'create': items})
+        ids = [result['id'] for result in created['results']['create']]
+        _, update_seconds = post(client, {'update': [{'id': event_id, 'title': f'Moved {event_id}'}
+                                                     for event_id in ids]})
+        _, delete_seconds = post(client, {'delete': ids})
+        timings = (('create', create_seconds), ('update', update_seconds), ('delete', delete_seconds))
+        if week == 0:
+            best = dict(timings)
+        best = {name: min(best[name], seconds) for name, seconds in timings}
+    for name, seconds in best.items():
+        print(f'{name:>14} {args.events:>8} {seconds:>7.3f}s {args.events / seconds:>10.0f}')
+
+    if not args.form_sample:
+        return
+    items = timetable(args.form_sample, start, args.repeat)
+    started = time.perf_counter()
+    for item in items:
+        # allow_conflicts skips the re-render; each post is still one commit
+        response = client.post('/manual_schedule', data={**item, 'allow_conflicts': '1'})
+        if response.status_code != 302:
+            raise SystemExit(f'form post failed: {response.status_code}')
+    seconds = time.perf_counter() - started
+    print(f"{'form per row':>14} {args.form_sample:>8} {seconds:>7.3f}s {args.form_sample / seconds:>10.0f}")
+    speedup = (args.events / best['create']) / (args.form_sample / seconds)
+    print(f'bulk create is {speedup:.0f}x the per-row form throughput')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark the history-based duration estimator against asking the LLM.
+
+Each synthetic user has a routine of activities ('Physics revision',
+'Spanish lecture', ...) with a habitual length they keep to most of the
+time (--adherence), and --events of history drawn from it. A stream of AI
+scheduling requests then mixes routine activities, typed any which way,
+with ones the user never scheduled (--novel). For each request the
+estimator is asked first, as run_ai_schedule() does; misses are answered
+by the fake OpenAI server with --openai-latency before its answer.
+
+Reports the hit rate, how often a hit matched the habitual length, the
+estimator's latency (including loading a user's history the first time)
+and the mean time to a duration with and without it.
+
+Usage: python benchmarks/bench_duration_estimator.py [--users 200] [--events 300] [--requests 5000]
+                                                     [--novel 0.2] [--adherence 0.85] [--openai-latency 0.4]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import APP_DIR, load_app
+
+sys.path.insert(0, os.path.join(APP_DIR, 'fakes'))
+from fake_openai import FakeOpenAI
+
+SUBJECTS = ('Physics', 'Calculus', 'Organic chemistry', 'History', 'Spanish', 'Programming', 'Economics',
+            'Piano', 'Biology', 'Statistics', 'Literature', 'Databases')
+KINDS = ('revision', 'lecture', 'lab', 'practice', 'reading', 'tutorial', 'problem set', 'essay')
+NOVEL = ('Tax return', 'Clean the garage', 'Marathon training', 'Dentist', 'Thesis chapter 3', 'Move flat',
+         'Learn knitting', 'Plan birthday party', 'Car service', 'Job interview prep')
+LENGTHS = (30, 45, 60, 90, 120, 180)
+
+
+def routines(rng, users, activities=8):
+    """{user index: {title: habitual minutes}}"""
+    return {user: {f'{rng.choice(SUBJECTS)} {rng.choice(KINDS)}': rng.choice(LENGTHS) for _ in range(activities)}
+            for user in range(users)}
+
+
+def seed(app, routine, events, adherence, rng):
+    with app.app.app_context():
+        accounts = [app.User(email=f'estimate-{user}@bench', password='x') for user in routine]
+        app.db.session.add_all(accounts)
+        app.db.session.commit()
+        rows = []
+        start = datetime(2025, 9, 1, 8)
+        for account, activities in zip(accounts, routine.values()):
+            titles = list(activities)
+            for _ in range(events):
+                title = rng.choice(titles)
+                minutes = activities[title] if rng.random() < adherence else rng.choice(LENGTHS)
+                begin = start + timedelta(hours=rng.randrange(0, 24 * 365))
+                rows.append({'user_id': account.id, 'title': title, 'start_time': begin,
+                             'end_time': begin + timedelta(minutes=minutes)})
+        app.db.session.execute(app.db.insert(app.Event), rows)
+        app.db.session.commit()
+        return [account.id for account in accounts]
+
+
+def typed(rng, title):
+    """The title as someone might type it again."""
+    return rng.choice((title, title.lower(), title.upper(), f'{title}!', f'  {title.lower()} '))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--events', type=int, default=300, help='history per user')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--novel', type=float, default=0.2, help='share of requests for activities never scheduled')
+    parser.add_argument('--adherence', type=float, default=0.85, help='how often an activity takes its usual time')
+    parser.add_argument('--openai-latency', type=float, default=0.4)
+    parser.add_argument('--llm-sample', type=int, default=20, help='misses actually sent to the fake OpenAI')
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    openai_fake = FakeOpenAI(latency=args.openai_latency, seed=args.seed)
+    os.environ['OPENAI_BASE_URL'] = openai_fake.start()
+    app = load_app()
+    routine = routines(rng, args.users)
+    user_ids = seed(app, routine, args.events, args.adherence, rng)
+    estimator = app.duration_estimator
+
+    hits = correct = 0
+    local = []
+    misses = []
+    with app.app.app_context():
+        for _ in range(args.requests):
+            user = rng.randrange(args.users)
+            if rng.random() < args.novel:
+                description, usual = rng.choice(NOVEL), None
+            else:
+                description, usual = rng.choice(list(routine[user].items()))
+            started = time.perf_counter()
+            estimate = estimator.estimate(user_ids[user], typed(rng, description))
+            local.append(time.perf_counter() - started)
+            if estimate is None:
+                misses.append(description)
+                continue
+            hits += 1
+            correct += estimate[0] == usual
+
+        llm = []
+        for description in rng.sample(misses, min(args.llm_sample, len(misses))):
+            started = time.perf_counter()
+            app.request_ai_plan(description)
+            llm.append(time.perf_counter() - started)
+            estimator.llm_answered(llm[-1])
+    openai_fake.stop()
+
+    local.sort()
+    hit_rate = hits / args.requests
+    print(f'{args.users} users x {args.events} events of history, {args.requests} requests '
+          f'({args.novel:.0%} novel, {args.adherence:.0%} adherence)')
+    print(f'answered from history: {hit_rate:.1%} of requests, {correct / max(hits, 1):.1%} of them the usual length')
+    print(f'estimate p50 {statistics.median(local) * 1e6:.0f}us  p99 {local[int(len(local) * 0.99) - 1] * 1e6:.0f}us  '
+          f'max {local[-1] * 1e3:.1f}ms (first call per user loads its history)')
+    if llm:
+        mean_llm = statistics.mean(llm)
+        mean_with = hit_rate * statistics.mean(local) + (1 - hit_rate) * mean_llm
+        print(f'LLM call mean {mean_llm * 1e3:.0f}ms over {len(llm)} misses')
+        print(f'mean time to a duration: {mean_llm * 1e3:.0f}ms LLM only, {mean_with * 1e3:.0f}ms with the estimator '
+              f'({1 - mean_with / mean_llm:.0%} less); {len(misses) * 100 // args.requests}% of requests still '
+              f'reach the LLM')
+    stats = estimator.stats()
+    print(f"counters: hits {stats['hits']}, misses {stats['misses']}, hit rate {stats['hit_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark common-slot search over free/busy bitmaps.
+
+Seeds users with a few events a day over the horizon, then times building
+every user's bitmap from the Event table, incremental updates, and
+/api/common_slots-style searches for groups of growing size, against
+merging the group's Event rows and sweeping them for gaps.
+
+Usage: python benchmarks/bench_freebusy.py [--users 1000] [--days 90] [--per-day 4] [--repeat 5]
+"""
+import argparse
+import random
+from datetime import timedelta
+
+from common import load_app, median_ms, samples, timed
+from freebusy import FreeBusyIndex, utc_today
+from slot_planner import DAY_END, DAY_START, free_slots, merge_busy
+
+
+def seed(app, users, days, per_day, origin, seed=0):
+    rng = random.Random(seed)
+    with app.app.app_context():
+        app.db.session.execute(app.db.insert(app.User),
+                               [{'email': f'user{number}@example.com', 'password': 'x'} for number in range(users)])
+        user_ids = [user_id for user_id, in app.db.session.query(app.User.id).order_by(app.User.id)]
+        rows = []
+        for user_id in user_ids:
+            for day in range(days):
+                for _ in range(per_day):
+                    start = origin + timedelta(days=day, minutes=15 * rng.randint(28, 80))
+                    rows.append({'user_id': user_id, 'title': 'Busy', 'start_time': start,
+                                 'end_time': start + timedelta(minutes=15 * rng.randint(2, 8))})
+            if len(rows) >= 50000:
+                app.db.session.execute(app.db.insert(app.Event), rows)
+                rows = []
+        if rows:
+            app.db.session.execute(app.db.insert(app.Event), rows)
+        app.db.session.commit()
+    return user_ids
+
+
+def sweep(app, user_ids, start, end, duration):
+    """The row-based way: merge the group's busy intervals and walk the gaps."""
+    rows = sorted(app.load_group_busy(user_ids, start, end))
+    busy = merge_busy([(begin, finish) for _, begin, finish in sorted(rows, key=lambda row: row[1])], start, end)
+    return [gap for gap in free_slots(busy, start, end, DAY_START, DAY_END) if gap[1] - gap[0] >= duration]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--per-day', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = load_app()
+    origin = utc_today()
+    user_ids = seed(app, args.users, args.days, args.per_day, origin)
+    print(f'{args.users} users, {args.users * args.days * args.per_day} events over {args.days} days')
+    start, end = origin, origin + timedelta(days=args.days)
+    duration = timedelta(minutes=30)
+
+    with app.app.app_context():
+        index = FreeBusyIndex(app.load_group_busy, horizon_days=args.days)
+        build = timed(lambda: (index.invalidate(), index.ensure(user_ids)), 1)
+        print(f'build all bitmaps: {build * 1e3:.0f}ms '
+              f'({sum(bitmap.nbytes for bitmap in index.bitmaps.values()) / 2 ** 20:.1f} MiB)')
+        update = samples(lambda: index.added(user_ids[0], start + timedelta(hours=30), start + timedelta(hours=31)),
+                         1000)
+        print(f'incremental update: {median_ms(update) * 1e3:.1f}us')
+
+        print(f"{'group':>6} {'bitmaps':>10} {'row sweep':>10} {'windows':>8} {'80% free':>9} {'windows':>8}")
+        for size in sorted({2, 10, 100, args.users}):
+            if size > args.users:
+                continue
+            group = user_ids[:size]
+            found = index.common_slots(group, start, end, duration, 'all', DAY_START, DAY_END, limit=10 ** 6)
+            bitmap_ms = median_ms(samples(lambda: index.common_slots(group, start, end, duration, 'all',
+                                                                     DAY_START, DAY_END), args.repeat))
+            swept = sweep(app, group, start, end, duration)
+            sweep_ms = median_ms(samples(lambda: sweep(app, group, start, end, duration), args.repeat))
+            if len(found) != len(swept):
+                print(f'  mismatch: {len(found)} windows from bitmaps, {len(swept)} from the sweep')
+            # A quorum has no row-based equivalent short of counting overlaps per moment
+            quorum = -(-size * 4 // 5)
+            quorum_found = index.common_slots(group, start, end, duration, quorum, DAY_START, DAY_END, limit=10 ** 6)
+            quorum_ms = median_ms(samples(lambda: index.common_slots(group, start, end, duration, quorum,
+                                                                     DAY_START, DAY_END), args.repeat))
+            print(f'{size:>6} {bitmap_ms:>8.1f}ms {sweep_ms:>8.1f}ms {len(found):>8} '
+                  f'{quorum_ms:>7.1f}ms {len(quorum_found):>8}')
+
+
+if __name__ == '__main__':
+    main()
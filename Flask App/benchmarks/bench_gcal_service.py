@@ -0,0 +1,56 @@
+"""Benchmark per-request Google Calendar overhead, uncached vs cached services.
+
+Runs against the local fake Calendar server, so the numbers are client-side
+overhead only: discovery parsing, service construction and connection setup.
+
+Usage: python benchmarks/bench_gcal_service.py [--requests 200]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+from common import APP_DIR, median_ms, samples
+from gcal_batch import event_body
+from gcal_service import CalendarServiceFactory
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+sys.path.insert(0, os.path.join(APP_DIR, 'fakes'))
+from fake_calendar import FakeCalendar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    fake = FakeCalendar()
+    endpoint = fake.start()
+    credentials = Credentials(token='benchmark')
+    start = datetime(2024, 9, 2, 9, 0)
+    body = event_body('Benchmark', start, start + timedelta(hours=1))
+
+    def uncached():
+        # What every Google write used to do
+        service = build('calendar', 'v3', credentials=credentials,
+                        client_options={'api_endpoint': endpoint + 'calendar/v3/'})
+        service.events().insert(calendarId='primary', body=body).execute()
+
+    factory = CalendarServiceFactory(endpoint=endpoint)
+
+    def cached():
+        service = factory.service(1, credentials)
+        service.events().insert(calendarId='primary', body=body).execute()
+
+    cached()
+    print(f"{'path':>10} {'median':>10} {'total':>10}")
+    for name, function in (('uncached', uncached), ('cached', cached)):
+        durations = samples(function, args.requests)
+        print(f"{name:>10} {median_ms(durations):>8.2f}ms {sum(durations):>9.2f}s")
+    print(f"services built by the factory: {factory.builds}")
+    fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark the paginated homepage against loading every event.
+
+Usage: python benchmarks/bench_homepage.py [--events 1000 10000 100000]
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from common import load_app, median_ms, samples
+
+
+def seed_events(app, user_id, count, now, seed=0):
+    """Bulk-insert count events spread over two years around now."""
+    rng = random.Random(seed)
+    rows = []
+    for number in range(count):
+        start = now + timedelta(minutes=15 * rng.randint(-35040, 35040))
+        rows.append({'user_id': user_id, 'title': f'Event {number}',
+                     'start_time': start, 'end_time': start + timedelta(hours=1)})
+    with app.app.app_context():
+        app.db.session.execute(app.db.insert(app.Event), rows)
+        app.db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = load_app()
+    client = app.app.test_client()
+    now = datetime.now()
+    today = datetime.combine(now.date(), datetime.min.time())
+
+    print(f"{'events':>8} {'homepage':>10} {'next page':>10} {'load all':>10}")
+    for user_id, count in enumerate(args.events, start=1):
+        seed_events(app, user_id, count, now, seed=user_id)
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+
+        homepage = samples(lambda: client.get('/homepage'), args.repeat)
+        with app.app.app_context():
+            _, cursor = app.events_page(user_id, today)
+        next_page = samples(lambda: client.get('/api/events', query_string=cursor), args.repeat)
+
+        def load_all():
+            with app.app.app_context():
+                app.Event.query.filter_by(user_id=user_id).all()
+        load_all_times = samples(load_all, max(1, args.repeat // 5))
+
+        print(f"{count:>8} {median_ms(homepage):>8.2f}ms {median_ms(next_page):>8.2f}ms "
+              f"{median_ms(load_all_times):>8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark ICS export: the streaming serializer vs the ics library.
+
+Times serialization and peak Python memory for the same events, plus the
+full /export.ics route against a seeded database: writing the stored
+calendar after a change, sending it again, and answering If-None-Match.
+
+Usage: python benchmarks/bench_ics_export.py [--events 100000] [--skip-ics]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bench_homepage import seed_events
+from common import load_app
+from ics import Calendar, Event as ICSEvent
+from ics_stream import iter_calendar
+
+
+def synthetic_rows(count, start):
+    for number in range(count):
+        begin = start + timedelta(hours=number)
+        yield f'bench-{number}@mayday', f'Study session {number}, chapter {number % 40}', begin, begin + timedelta(hours=1)
+
+
+def measure(function):
+    """Return (seconds, peak MiB, output size) for function().
+
+    The timed run and the memory run are separate, since tracemalloc slows
+    allocation-heavy code down considerably.
+    """
+    started = time.perf_counter()
+    size = function()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--skip-ics', action='store_true', help="don't run the (slow) ics library")
+    args = parser.parse_args()
+    start = datetime(2024, 9, 2, 9, 0)
+
+    def streaming():
+        return sum(len(chunk) for chunk in iter_calendar(synthetic_rows(args.events, start)))
+
+    def ics_library():
+        cal = Calendar()
+        for uid, summary, begin, end in synthetic_rows(args.events, start):
+            event = ICSEvent(uid=uid, name=summary, begin=begin, end=end)
+            cal.events.add(event)
+        return len(cal.serialize())
+
+    print(f"{'serializer':>12} {'events':>8} {'time':>9} {'peak mem':>10} {'bytes':>12}")
+    runs = [('streaming', streaming)] + ([] if args.skip_ics else [('ics', ics_library)])
+    for name, function in runs:
+        elapsed, peak, size = measure(function)
+        print(f"{name:>12} {args.events:>8} {elapsed:>8.2f}s {peak:>8.1f}MiB {size:>12}")
+
+    app = load_app()
+    seed_events(app, 1, args.events, datetime.now())
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    def export_route(headers=None):
+        response = client.get('/export.ics', headers=headers, buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    def regenerated():
+        # As if the events had just changed
+        app.ics_store.invalidate(1)
+        for name in os.listdir(os.path.join(app.ics_store.root, '1')):
+            os.unlink(os.path.join(app.ics_store.root, '1', name))
+        return export_route()
+
+    etag = client.get('/export.ics').headers['ETag']
+    for name, function in (('regenerated', regenerated), ('stored', export_route),
+                           ('304', lambda: export_route({'If-None-Match': etag}))):
+        elapsed, peak, size = measure(function)
+        print(f"{'/export.ics':>12} {args.events:>8} {elapsed:>8.2f}s {peak:>8.1f}MiB {size:>12}  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark the streaming ICS import.
+
+Writes a synthetic .ics file with the streaming serializer, imports it into
+a fresh database, then imports it again to time the all-duplicates path.
+Peak Python memory is measured in a separate, much slower traced run.
+
+Usage: python benchmarks/bench_ics_import.py [--events 100000] [--chunk-size 2000] [--skip-memory]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from common import load_app
+from ics_import import import_events
+from ics_stream import write_calendar
+
+
+def synthetic_events(count, start):
+    for number in range(count):
+        begin = start + timedelta(hours=number)
+        yield f'import-{number}@bench', f'Imported session {number}, chapter {number % 40}', begin, begin + timedelta(hours=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--skip-memory', action='store_true', help='skip the traced memory run')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mayday-import-')
+    path = os.path.join(workdir, 'bench.ics')
+    write_calendar(path, synthetic_events(args.events, datetime(2024, 9, 2, 9, 0)))
+    size = os.path.getsize(path) / 2 ** 20
+
+    def run(user_id):
+        with app.app.app_context(), open(path, encoding='utf-8', newline='') as f:
+            return import_events(app.db, app.Event, user_id, f, chunk_size=args.chunk_size)
+
+    app = load_app(os.path.join(workdir, 'bench.db'))
+    print(f"{'run':>12} {'events':>8} {'inserted':>9} {'dupes':>8} {'time':>8} {'events/s':>10}")
+    for name, user_id in (('fresh', 1), ('re-import', 1)):
+        stats = run(user_id)
+        print(f"{name:>12} {stats['parsed']:>8} {stats['inserted']:>9} {stats['duplicates']:>8} "
+              f"{stats['seconds']:>7.2f}s {stats['events_per_second']:>10.0f}")
+
+    if args.skip_memory:
+        return
+    tracemalloc.start()
+    started = time.perf_counter()
+    run(2)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'file {size:.1f}MiB, peak Python memory while importing {peak / 2 ** 20:.1f}MiB '
+          f'(traced run {time.perf_counter() - started:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+"""Load-test the app's main routes against fake OpenAI and Google Calendar servers.
+
+Seeds synthetic users and events, serves app.py on a local threaded server
+pointed at the fakes (see fakes/), then drives /homepage, /add_event,
+/ai_schedule and /manual_schedule from concurrent clients and reports
+latency percentiles and throughput per route. /ai_schedule answers 202 at
+once, so the time until its job is done is reported as ai_schedule_job.
+It also microbenchmarks the prototypes' parse_schedule and
+create_ics_file.
+
+Results are written as JSON (--output) so runs can be compared; with
+--baseline the run is compared against an earlier results file and the
+script exits 1 if anything got slower than --tolerance allows.
+
+Usage: python benchmarks/bench_load.py [--users 20] [--events 200] [--requests 200] [--concurrency 8]
+                                       [--openai-latency 0.3] [--token-latency 0.005] [--google-latency 0.05]
+                                       [--output results.json] [--baseline old.json] [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+from common import APP_DIR, load_app
+from google.oauth2.credentials import Credentials
+from schedule_corpus import TASKS, build_corpus
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(APP_DIR, 'fakes'))
+sys.path.insert(0, os.path.join(APP_DIR, '..', 'Prototype_Termial'))
+from fake_calendar import FakeCalendar
+from fake_openai import FakeOpenAI
+
+ROUTES = ('homepage', 'add_event', 'manual_schedule', 'ai_schedule')
+JOB_POLL_INTERVAL = 0.02
+JOB_TIMEOUT = 60
+# Where a higher number is better; everything else compared is a time
+HIGHER_IS_BETTER = ('throughput_rps',)
+COMPARED = ('p50_ms', 'p95_ms', 'throughput_rps', 'p50_us', 'p95_us')
+
+
+def seed(app, users, events, origin, seed=0):
+    """Insert users (all with the password 'benchmark') and their events; returns the user ids."""
+    rng = random.Random(seed)
+    password = generate_password_hash('benchmark')
+    with app.app.app_context():
+        app.db.session.execute(app.db.insert(app.User),
+                               [{'email': f'load{number}@example.com', 'password': password}
+                                for number in range(users)])
+        user_ids = [user_id for user_id, in app.db.session.query(app.User.id).order_by(app.User.id)]
+        rows = []
+        for user_id in user_ids:
+            for _ in range(events):
+                start = origin + timedelta(days=rng.randint(-30, 60), minutes=15 * rng.randint(32, 76))
+                rows.append({'user_id': user_id, 'title': rng.choice(TASKS), 'start_time': start,
+                             'end_time': start + timedelta(minutes=15 * rng.randint(2, 8))})
+        if rows:
+            app.db.session.execute(app.db.insert(app.Event), rows)
+        app.db.session.commit()
+    return user_ids
+
+
+def session_cookies(app, user_ids):
+    """Signed session cookies logging each user in, with Google Calendar connected."""
+    serializer = app.app.session_interface.get_signing_serializer(app.app)
+    name = app.app.config['SESSION_COOKIE_NAME']
+    for user_id in user_ids:
+        app.token_store().save(user_id, Credentials(token='benchmark'))
+    return {user_id: {name: serializer.dumps({'user_id': user_id})} for user_id in user_ids}
+
+
+class Client:
+    """One simulated user: a keep-alive HTTP session and a request per route."""
+
+    def __init__(self, base_url, cookies, rng):
+        self.base_url = base_url
+        self.http = requests.Session()
+        self.http.cookies.update(cookies)
+        self.rng = rng
+
+    def _times(self):
+        start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        start += timedelta(days=self.rng.randint(1, 60), hours=self.rng.randint(0, 10))
+        return start.isoformat(timespec='minutes'), (start + timedelta(hours=1)).isoformat(timespec='minutes')
+
+    def homepage(self):
+        response = self.http.get(self.base_url + '/homepage', allow_redirects=False)
+        return response.status_code, response.status_code == 200
+
+    def add_event(self):
+        start, end = self._times()
+        response = self.http.post(self.base_url + '/add_event', allow_redirects=False,
+                                  data={'title': self.rng.choice(TASKS), 'start_time': start, 'end_time': end,
+                                        'allow_conflicts': '1'})
+        return response.status_code, response.status_code == 302
+
+    def manual_schedule(self):
+        start, end = self._times()
+        response = self.http.post(self.base_url + '/manual_schedule', allow_redirects=False,
+                                  data={'title': self.rng.choice(TASKS), 'start_time': start, 'end_time': end,
+                                        'allow_conflicts': '1'})
+        return response.status_code, response.status_code == 302
+
+    def ai_schedule(self, bypass_cache=True):
+        response = self.http.post(self.base_url + '/ai_schedule', headers={'Accept': 'application/json'},
+                                  data={'description': self.rng.choice(TASKS),
+                                        'bypass_cache': '1' if bypass_cache else '0'})
+        return response.status_code, response.status_code == 202, response
+
+    def wait_for_job(self, status_url):
+        """Poll a job until it finishes; returns whether it succeeded."""
+        deadline = time.monotonic() + JOB_TIMEOUT
+        while time.monotonic() < deadline:
+            job = self.http.get(self.base_url + status_url).json()
+            if job['status'] in ('done', 'failed'):
+                return job['status'] == 'done' and not (job['result'] or {}).get('error')
+            time.sleep(JOB_POLL_INTERVAL)
+        return False
+
+
+def summarize(durations, errors, statuses, seconds):
+    """Latency percentiles (ms) and throughput for one route."""
+    if not durations:
+        return {'requests': 0, 'errors': errors, 'statuses': statuses}
+    ms = sorted(duration * 1e3 for duration in durations)
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    return {'requests': len(ms), 'errors': errors, 'statuses': statuses,
+            'throughput_rps': round(len(ms) / seconds, 2) if seconds else None,
+            'mean_ms': round(statistics.fmean(ms), 3), 'p50_ms': round(cuts[49], 3),
+            'p90_ms': round(cuts[89], 3), 'p95_ms': round(cuts[94], 3), 'p99_ms': round(cuts[98], 3),
+            'max_ms': round(ms[-1], 3)}
+
+
+def run_route(route, clients, requests_total, bypass_cache):
+    """Send requests_total requests to one route from every client at once.
+
+    Each client is one thread and one user, so an AI scheduling client waits
+    for its job before sending the next one and never hits the per-user
+    queue limit.
+    """
+    remaining = [requests_total]
+    lock = threading.Lock()
+    durations, job_durations, statuses = [], [], {}
+    errors = [0, 0]
+
+    def worker(client):
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                if route == 'ai_schedule':
+                    status, ok, response = client.ai_schedule(bypass_cache)
+                else:
+                    status, ok = getattr(client, route)()
+            except requests.RequestException:
+                status, ok = 'exception', False
+            elapsed = time.perf_counter() - started
+            job_ok = None
+            if route == 'ai_schedule' and ok:
+                job_ok = client.wait_for_job(response.json()['status_url'])
+                job_elapsed = time.perf_counter() - started
+            with lock:
+                durations.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                errors[0] += not ok
+                if job_ok is not None:
+                    job_durations.append(job_elapsed)
+                    errors[1] += not job_ok
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    results = {route: summarize(durations, errors[0], statuses, seconds)}
+    if route == 'ai_schedule':
+        results['ai_schedule_job'] = summarize(job_durations, errors[1], {}, seconds)
+    return results
+
+
+def micro(function, repeat):
+    """Per-call time percentiles (µs) of function(), with its printing silenced."""
+    durations = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - started)
+    us = sorted(duration * 1e6 for duration in durations)
+    cuts = statistics.quantiles(us, n=100, method='inclusive') if len(us) > 1 else us * 99
+    return {'calls': len(us), 'mean_us': round(statistics.fmean(us), 2), 'p50_us': round(cuts[49], 2),
+            'p95_us': round(cuts[94], 2)}
+
+
+def run_micro(repeat, seed):
+    import prototype_2
+    import prototype_GC
+
+    corpus = [entry['text'] for entry in build_corpus(seed, 200) if entry['category'].startswith('schedule/')]
+    start_date = datetime(2024, 9, 2).date()
+    results = {}
+    for name, module in (('prototype_2', prototype_2), ('prototype_GC', prototype_GC)):
+        answers = iter(corpus * (repeat // len(corpus) + 1))
+        results[f'{name}.parse_schedule'] = micro(lambda: module.parse_schedule(next(answers), start_date), repeat)
+    events = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for text in corpus:
+            events.extend(prototype_GC.parse_schedule(text, start_date))
+    directory = tempfile.mkdtemp(prefix='mayday-bench-ics-')
+    for count in (10, 100):
+        # Distinct names, so repeats aren't merged into a few series
+        sample = [dict(event, name=f"{event['name']} {number}") for number, event in enumerate(events[:count])]
+        filename = os.path.join(directory, f'schedule-{count}.ics')
+        results[f'create_ics_file[{count}]'] = micro(lambda: prototype_GC.create_ics_file(sample, filename),
+                                                     max(1, repeat // 10))
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'commit': commit}
+
+
+def compare(results, baseline, tolerance):
+    """Print how results moved against baseline; returns the regressions found."""
+    regressions = []
+    print(f"\n{'metric':>42} {'baseline':>10} {'now':>10} {'change':>8}")
+    for section in ('routes', 'micro'):
+        for name, metrics in results[section].items():
+            old = baseline.get(section, {}).get(name, {})
+            for key in COMPARED:
+                if metrics.get(key) is None or not old.get(key):
+                    continue
+                change = metrics[key] / old[key] - 1
+                worse = -change if key in HIGHER_IS_BETTER else change
+                flag = '  REGRESSION' if worse > tolerance else ''
+                if flag:
+                    regressions.append(f'{name}.{key}')
+                print(f"{name + '.' + key:>42} {old[key]:>10.2f} {metrics[key]:>10.2f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--events', type=int, default=200, help='events seeded per user')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    parser.add_argument('--openai-latency', type=float, default=0.3, help='seconds before the first token')
+    parser.add_argument('--token-latency', type=float, default=0.005, help='seconds between streamed tokens')
+    parser.add_argument('--google-latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=4, help='job worker threads')
+    parser.add_argument('--use-cache', action='store_true', help="let AI jobs hit the LLM cache")
+    parser.add_argument('--micro-repeat', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against an earlier results file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before a regression')
+    args = parser.parse_args()
+    routes = [route for route in args.routes.split(',') if route]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown route(s): {', '.join(sorted(unknown))}")
+
+    openai_fake = FakeOpenAI(latency=args.openai_latency, token_latency=args.token_latency, seed=args.seed)
+    calendar_fake = FakeCalendar(latency=args.google_latency)
+    os.environ['OPENAI_BASE_URL'] = openai_fake.start()
+    os.environ['GOOGLE_CALENDAR_ENDPOINT'] = calendar_fake.start()
+    os.environ['JOB_WORKERS'] = str(args.workers)
+    app = load_app()
+
+    # One client (and user) per thread
+    users = max(args.users, args.concurrency)
+    user_ids = seed(app, users, args.events, datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
+                    args.seed)
+    cookies = session_cookies(app, user_ids)
+    # One log line per request would dominate the output
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    print(f'{users} users, {users * args.events} events, {args.concurrency} clients, '
+          f'OpenAI {args.openai_latency * 1e3:.0f}ms + {args.token_latency * 1e3:.1f}ms/token, '
+          f'Google {args.google_latency * 1e3:.0f}ms')
+
+    results = {'benchmark': 'load', 'created': datetime.now().isoformat(timespec='seconds'),
+               'environment': environment(), 'config': vars(args), 'routes': {}, 'micro': {}}
+    print(f"{'route':>16} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50':>9} {'p90':>9} {'p99':>9}")
+    for route in routes:
+        rng = random.Random(args.seed)
+        clients = [Client(base_url, cookies[user_id], random.Random(rng.random()))
+                   for user_id in user_ids[:args.concurrency]]
+        for name, stats in run_route(route, clients, args.requests, not args.use_cache).items():
+            results['routes'][name] = stats
+            if not stats['requests']:
+                print(f"{name:>16} {0:>9} {stats['errors']:>7}")
+                continue
+            print(f"{name:>16} {stats['requests']:>9} {stats['errors']:>7} {stats['throughput_rps']:>8.1f} "
+                  f"{stats['p50_ms']:>7.1f}ms {stats['p90_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms")
+    results['fakes'] = {'openai_requests': openai_fake.requests, 'google_requests': calendar_fake.http_requests}
+    server.shutdown()
+    app.job_workers().stop()
+    openai_fake.stop()
+    calendar_fake.stop()
+
+    results['micro'] = run_micro(args.micro_repeat, args.seed)
+    print(f"\n{'function':>34} {'calls':>7} {'p50':>10} {'p95':>10}")
+    for name, stats in results['micro'].items():
+        print(f"{name:>34} {stats['calls']:>7} {stats['p50_us']:>8.1f}us {stats['p95_us']:>8.1f}us")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'\nResults written to {args.output}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
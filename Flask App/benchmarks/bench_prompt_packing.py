@@ -0,0 +1,107 @@
+"""Benchmark packed scheduling requests against one request per task.
+
+A fake model answers with generated schedules (see schedule_corpus),
+honours max_tokens by truncating, and takes a fixed round trip plus a time
+per prompt and completion token. Reports requests, tokens and wall-clock
+time for both modes, and checks every task still gets a usable schedule.
+
+Usage: python benchmarks/bench_prompt_packing.py [--tasks 20] [--text] [--rtt-ms 300] [--token-us 200]
+"""
+import argparse
+import random
+import re
+import time
+
+import common  # noqa: F401  (puts the app directory on sys.path)
+from prompt_packing import PACKED_JSON_FORMAT, PACKED_TEXT_FORMAT, estimate_tokens, pack, request_packed
+from schedule_corpus import TASKS, json_schedule, legacy_schedule, sessions
+from schedule_parser import parse_schedule
+
+TASK_MAX_TOKENS = 500
+SYSTEM_PROMPT_TOKENS = 250
+PROMPT_TOKEN_FACTOR = 0.1
+
+
+class FakeModel:
+    def __init__(self, json_output, rtt, token_seconds, seed=0):
+        self.json_output = json_output
+        self.rtt = rtt
+        self.token_seconds = token_seconds
+        self.rng = random.Random(seed)
+
+    def answer(self):
+        items = sessions(self.rng, self.rng.randint(1, 4))
+        if self.json_output:
+            return json_schedule(self.rng, items, fenced=False)
+        return legacy_schedule(self.rng, items, 'text')
+
+    def complete(self, prompt, max_tokens):
+        numbers = [int(n) for n in re.findall(r'^(\d+)\. ', prompt, re.MULTILINE)] or [1]
+        answers = [self.answer() for _ in numbers]
+        if self.json_output and len(numbers) > 1:
+            text = '{"schedules": [' + ', '.join(answer.replace('{', f'{{"task": {number}, ', 1)
+                                                 for number, answer in zip(numbers, answers)) + ']}'
+        elif len(numbers) > 1:
+            text = '\n\n'.join(f'### Task {number}\n{answer}' for number, answer in zip(numbers, answers))
+        else:
+            text = answers[0]
+        truncated = estimate_tokens(text) > max_tokens
+        if truncated:
+            text = text[:max_tokens * 4]
+        prompt_tokens = SYSTEM_PROMPT_TOKENS + estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(text)
+        time.sleep(self.rtt + (prompt_tokens * PROMPT_TOKEN_FACTOR + completion_tokens) * self.token_seconds)
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+        return text, usage, truncated
+
+
+def single(tasks, model):
+    report = {'requests': 0, 'total_tokens': 0, 'usable': 0}
+    started = time.perf_counter()
+    for task in tasks:
+        text, usage, _ = model.complete(f'1. {task}', TASK_MAX_TOKENS)
+        report['requests'] += 1
+        report['total_tokens'] += usage['total_tokens']
+        report['usable'] += parse_schedule(text) is not None
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+def packed(tasks, model, json_output):
+    overhead = SYSTEM_PROMPT_TOKENS + estimate_tokens(PACKED_JSON_FORMAT if json_output else PACKED_TEXT_FORMAT)
+    total = {'requests': 0, 'total_tokens': 0, 'usable': 0, 'seconds': 0.0, 'batches': 0}
+    for batch in pack(tasks, overhead, TASK_MAX_TOKENS):
+        answers, report = request_packed([tasks[index] for index in batch], model.complete, json_output,
+                                         TASK_MAX_TOKENS, accept=lambda answer: parse_schedule(answer) is not None)
+        total['batches'] += 1
+        for key in ('requests', 'total_tokens', 'seconds'):
+            total[key] += report[key]
+        total['usable'] += sum(answer is not None for answer in answers)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=20)
+    parser.add_argument('--text', action='store_true', help='use the legacy text format instead of JSON')
+    parser.add_argument('--rtt-ms', type=float, default=300.0)
+    parser.add_argument('--token-us', type=float, default=200.0, help='time per generated token')
+    args = parser.parse_args()
+
+    tasks = [f'{TASKS[number % len(TASKS)]} #{number}' for number in range(args.tasks)]
+    json_output = not args.text
+    model = FakeModel(json_output, args.rtt_ms / 1000, args.token_us / 1e6)
+    # Packed prompts don't repeat the system prompt for every task
+    baseline = single(tasks, model)
+    result = packed(tasks, model, json_output)
+
+    print(f"{'mode':>8} {'requests':>9} {'tokens':>8} {'time':>8} {'usable':>7}")
+    print(f"{'single':>8} {baseline['requests']:>9} {baseline['total_tokens']:>8} {baseline['seconds']:>7.2f}s "
+          f"{baseline['usable']:>4}/{len(tasks)}")
+    print(f"{'packed':>8} {result['requests']:>9} {result['total_tokens']:>8} {result['seconds']:>7.2f}s "
+          f"{result['usable']:>4}/{len(tasks)}  ({result['batches']} batch(es))")
+
+
+if __name__ == '__main__':
+    main()
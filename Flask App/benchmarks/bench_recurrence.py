@@ -0,0 +1,62 @@
+"""Benchmark recurring events stored as one series row vs materialized rows.
+
+Each user holds one daily 2-hour block of the given length, either as a
+single RRULE row or as one row per day. Times the homepage page query, a
+page a year out and a conflict check, with expansions memoized and cold.
+
+Usage: python benchmarks/bench_recurrence.py [--days 120 1000 10000]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from common import load_app, median_ms, samples
+import recurrence
+
+
+def seed(app, user_id, days, start, as_series):
+    with app.app.app_context():
+        if as_series:
+            event = app.Event(user_id=user_id, title='Study block', start_time=start,
+                              end_time=start + timedelta(hours=2))
+            event.set_recurrence(f'FREQ=DAILY;COUNT={days}')
+            app.db.session.add(event)
+        else:
+            rows = [{'user_id': user_id, 'title': 'Study block', 'start_time': start + timedelta(days=day),
+                     'end_time': start + timedelta(days=day, hours=2)} for day in range(days)]
+            app.db.session.execute(app.db.insert(app.Event), rows)
+        app.db.session.commit()
+        return app.Event.query.filter_by(user_id=user_id).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[120, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = load_app()
+    start = datetime(2024, 9, 2, 9, 0)
+    later = start + timedelta(days=365)
+
+    print(f"{'days':>6} {'storage':>9} {'rows':>6} {'page':>9} {'page +1y':>9} {'conflict':>9} {'cold page':>10}")
+    user_id = 0
+    for days in args.days:
+        for as_series in (False, True):
+            user_id += 1
+            rows = seed(app, user_id, days, start, as_series)
+            with app.app.app_context():
+                page = samples(lambda: app.events_page(user_id, start), args.repeat)
+                page_later = samples(lambda: app.events_page(user_id, later), args.repeat)
+                conflict = samples(lambda: app.find_conflicts(user_id, later + timedelta(hours=1),
+                                                              later + timedelta(hours=3)), args.repeat)
+
+                def cold():
+                    recurrence.expand.cache_clear()
+                    app.events_page(user_id, later)
+                cold_page = samples(cold, args.repeat)
+            print(f"{days:>6} {'series' if as_series else 'rows':>9} {rows:>6} {median_ms(page):>7.2f}ms "
+                  f"{median_ms(page_later):>7.2f}ms {median_ms(conflict):>7.2f}ms {median_ms(cold_page):>8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark schedule_parser on a corpus of LLM answers.
+
+Reports, per answer category, the parse failure rate (answers whose
+sessions or plan were not all recovered), exceptions (which must stay at
+zero, fuzzed answers included) and the time to parse one answer.
+
+Usage: python benchmarks/bench_schedule_parser.py [--size 1000] [--seed 0] [--repeat 5] [--json]
+                                                  [--write corpus.jsonl]
+"""
+import argparse
+import json
+import statistics
+import time
+
+import common  # noqa: F401  (puts the app directory on sys.path)
+from schedule_corpus import build_corpus
+from schedule_parser import parse_plan, parse_schedule
+
+MAX_SESSIONS = 14
+
+
+def parse(entry):
+    """Parse one answer; returns the number of sessions (plans count as one) or 0."""
+    if entry['kind'] == 'plan':
+        return 1 if parse_plan(entry['text'], MAX_SESSIONS) is not None else 0
+    schedule = parse_schedule(entry['text'])
+    return len(schedule.sessions) if schedule is not None else 0
+
+
+def measure(corpus, repeat):
+    results = {}
+    for entry in corpus:
+        stats = results.setdefault(entry['category'], {'responses': 0, 'failures': 0, 'exceptions': 0, 'times': [],
+                                                       'checked': entry['expected'] is not None})
+        stats['responses'] += 1
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            try:
+                found = parse(entry)
+            except Exception:
+                stats['exceptions'] += 1
+                found = None
+                break
+            best = min(best, time.perf_counter() - started)
+        if found is None:
+            continue
+        stats['times'].append(best)
+        if entry['expected'] is not None and found != entry['expected']:
+            stats['failures'] += 1
+    report = {}
+    for category, stats in sorted(results.items()):
+        times = sorted(stats['times']) or [0.0]
+        report[category] = {'responses': stats['responses'],
+                            # Fuzzed answers have no right answer, only a wrong outcome (raising)
+                            'failure_rate': stats['failures'] / stats['responses'] if stats['checked'] else None,
+                            'exceptions': stats['exceptions'],
+                            'mean_us': statistics.mean(times) * 1e6,
+                            'p99_us': times[min(len(times) - 1, int(len(times) * 0.99))] * 1e6}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000, help='well-formed answers; as many fuzzed ones are added')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--write', metavar='PATH', help='also save the corpus as JSON lines')
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.seed, args.size)
+    if args.write:
+        with open(args.write, 'w') as f:
+            for entry in corpus:
+                f.write(json.dumps(entry) + '\n')
+    report = measure(corpus, args.repeat)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'category':>22} {'answers':>8} {'failures':>9} {'exceptions':>11} {'mean':>9} {'p99':>9}")
+    for category, row in report.items():
+        failures = f"{row['failure_rate']:.1%}" if row['failure_rate'] is not None else '-'
+        print(f"{category:>22} {row['responses']:>8} {failures:>9} {row['exceptions']:>11} "
+              f"{row['mean_us']:>7.1f}us {row['p99_us']:>7.1f}us")
+
+
+if __name__ == '__main__':
+    main()
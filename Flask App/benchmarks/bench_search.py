@@ -0,0 +1,114 @@
+"""Benchmark /api/search's FTS5 queries over a large event table.
+
+Seeds --events events spread over --users users, plus one heavy user
+with --heavy-events, through the event table's triggers as normal writes
+would. Then times event_search.search() for whole words, short prefixes,
+several words and date ranges, against a LIKE '%word%' scan of the same
+user's titles, for a common and a missing word, for comparison.
+
+Usage: python benchmarks/bench_search.py [--events 1000000] [--users 1000] [--heavy-events 50000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import load_app, samples
+
+SUBJECTS = ('Calculus', 'Linear algebra', 'Organic chemistry', 'Physics', 'History', 'Literature', 'Economics',
+            'Biology', 'Statistics', 'Philosophy', 'Spanish', 'Programming', 'Databases', 'Psychology', 'Music theory')
+KINDS = ('lecture', 'lab', 'tutorial', 'exam', 'revision', 'study group', 'office hours', 'seminar', 'quiz',
+         'project meeting', 'reading', 'practice')
+EXTRAS = ('', '', '', 'room 101', 'library', 'online', 'week 3', 'chapter 7', 'with Ana', 'café', 'gym')
+# (label, query, whether to restrict it to a month)
+QUERIES = (('word', 'calculus', False), ('prefix 1', 'c', False), ('prefix 3', 'che', False),
+           ('two words', 'organic ex', False), ('word + month', 'lecture', True), ('no match', 'zebra', False))
+
+
+def titles(rng, count):
+    for _ in range(count):
+        yield f'{rng.choice(SUBJECTS)} {rng.choice(KINDS)} {rng.choice(EXTRAS)}'.strip()
+
+
+def seed(app, users, events, heavy_events, rng, chunk=20000):
+    """Insert the users and their events; returns (user ids, heavy user id, seconds spent inserting events)."""
+    with app.app.app_context():
+        accounts = [app.User(email=f'search-{number}@bench', password='x') for number in range(users + 1)]
+        app.db.session.add_all(accounts)
+        app.db.session.commit()
+        user_ids = [account.id for account in accounts]
+        heavy = user_ids.pop()
+        start = datetime(2025, 9, 1, 8)
+        owners = [user_ids[number % len(user_ids)] for number in range(events)] + [heavy] * heavy_events
+        started = time.perf_counter()
+        names = titles(rng, len(owners))
+        for position in range(0, len(owners), chunk):
+            rows = []
+            for owner in owners[position:position + chunk]:
+                begin = start + timedelta(hours=rng.randrange(0, 24 * 365))
+                rows.append({'user_id': owner, 'title': next(names), 'start_time': begin,
+                             'end_time': begin + timedelta(hours=1)})
+            app.db.session.execute(app.db.insert(app.Event), rows)
+        app.db.session.commit()
+        return user_ids, heavy, time.perf_counter() - started
+
+
+def like_scan(app, user_id, word):
+    return (app.Event.query.filter(app.Event.user_id == user_id, app.Event.title.like(f'%{word}%'))
+            .limit(20).all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--heavy-events', type=int, default=50000, help='events of the one heavy user')
+    parser.add_argument('--queries', type=int, default=200, help='queries timed per kind')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    app = load_app(os.path.join(tempfile.mkdtemp(prefix='mayday-search-'), 'bench.db'))
+    from event_search import search
+
+    user_ids, heavy, seconds = seed(app, args.users, args.events, args.heavy_events, rng)
+    total = args.events + args.heavy_events
+    print(f'{total} events for {len(user_ids) + 1} users inserted through the triggers in {seconds:.1f}s '
+          f'({total / seconds:.0f} events/s)')
+
+    month = (datetime(2026, 1, 1), datetime(2026, 2, 1))
+    print(f"\n{'query':>14} {'user':>6} {'p50':>8} {'p95':>8} {'max':>8} {'hits':>5}")
+    with app.app.app_context():
+        for label, query, ranged in QUERIES:
+            for kind in ('typical', 'heavy'):
+                hits = []
+
+                def run():
+                    user_id = heavy if kind == 'heavy' else rng.choice(user_ids)
+                    start, end = month if ranged else (None, None)
+                    hits.append(len(search(app.db, app.Event, user_id, query, start, end, limit=20)))
+                    app.db.session.rollback()
+                durations = sorted(samples(run, args.queries))
+                p95 = durations[int(len(durations) * 0.95) - 1]
+                print(f'{label:>14} {kind:>6} {statistics.median(durations) * 1e3:>6.2f}ms {p95 * 1e3:>6.2f}ms '
+                      f'{durations[-1] * 1e3:>6.2f}ms {statistics.median(hits):>5.0f}')
+
+        # A LIKE scan stops at 20 hits for a common word but reads every row of
+        # the user's for a missing one, and can't rank either
+        for word in ('chemistry', 'zebra'):
+            for kind, user_id in (('typical', user_ids[0]), ('heavy', heavy)):
+                durations = samples(lambda: like_scan(app, user_id, word), max(5, args.queries // 10))
+                print(f"{'LIKE ' + word:>14} {kind:>6} {statistics.median(durations) * 1e3:>6.2f}ms")
+
+        client = app.app.test_client()
+        with client.session_transaction() as cookie:
+            cookie['user_id'] = user_ids[0]
+        durations = samples(lambda: client.get('/api/search?q=calc%20lec'), args.queries)
+        print(f"\n/api/search over HTTP (test client): p50 {statistics.median(durations) * 1e3:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
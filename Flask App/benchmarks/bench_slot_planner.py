@@ -0,0 +1,47 @@
+"""Benchmark local slot placement for users with large calendars.
+
+Usage: python benchmarks/bench_slot_planner.py [--events 1000 5000 20000]
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from common import timed
+from conflicts import IntervalIndex
+from slot_planner import HORIZON_DAYS, place_sessions
+
+
+def synthetic_events(count, now, seed=0):
+    """Spread events over a year either side of now, mostly inside working hours."""
+    rng = random.Random(seed)
+    events = []
+    for event_id in range(count):
+        day = now + timedelta(days=rng.randint(-365, 365))
+        start = day.replace(hour=rng.randint(7, 21), minute=rng.choice((0, 15, 30, 45)))
+        events.append((event_id, start, start + timedelta(minutes=rng.choice((30, 60, 90, 120)))))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    now = datetime(2024, 9, 2, 8, 0)
+    print(f"{'events':>8} {'index build':>12} {'window query':>13} {'earliest x3':>12} {'balanced x5':>12}")
+    for count in args.events:
+        events = synthetic_events(count, now)
+        build = timed(lambda: IntervalIndex(events), 3)
+        index = IntervalIndex(events)
+        horizon = now + timedelta(days=HORIZON_DAYS + 1)
+        query = timed(lambda: index.overlaps(now, horizon), args.repeat)
+        busy = index.overlaps(now, horizon)
+        earliest = timed(lambda: place_sessions(busy, timedelta(hours=2), 3, now, 'earliest'), args.repeat)
+        balanced = timed(lambda: place_sessions(busy, timedelta(hours=2), 5, now, 'balanced'), args.repeat)
+        print(f"{count:>8} {build * 1e3:>10.2f}ms {query * 1e6:>11.1f}us "
+              f"{earliest * 1e6:>10.1f}us {balanced * 1e6:>10.1f}us")
+
+
+if __name__ == '__main__':
+    main()
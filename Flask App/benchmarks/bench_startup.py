@@ -0,0 +1,126 @@
+"""Benchmark how long a fresh worker takes to import the app and become ready.
+
+Each run is a new interpreter, as when an autoscaler starts a container:
+it imports app.py, calls create_app() and requests /readyz. The same is
+timed with the OpenAI, OAuth and Google client libraries and NumPy imported
+up front, as app.py used to at module load, to show what deferring them saves. A
+python -X importtime run then lists what the import still spends its time
+on, and the libraries now loaded on first use are timed on their own.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 12]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import APP_DIR, app_environment
+
+# What app.py imported at module load before the clients and NumPy were made lazy
+EAGER_IMPORTS = ('openai', 'google_auth_oauthlib.flow', 'googleapiclient.discovery', 'google.oauth2.credentials',
+                 'google.auth.transport.requests', 'google_auth_httplib2', 'pytz', 'numpy')
+
+BOOT = '''
+import json, time
+started = time.perf_counter()
+for name in {preload!r}:
+    __import__(name)
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+status = application.test_client().get('/readyz').status_code
+ready = time.perf_counter()
+print(json.dumps({{'import': imported - started, 'create_app': created - imported, 'readyz': ready - created,
+                  'status': status}}))
+'''
+
+FIRST_USE = '''
+import json, time
+import app
+timings = {{}}
+for name in {names!r}:
+    started = time.perf_counter()
+    __import__(name)
+    timings[name] = time.perf_counter() - started
+started = time.perf_counter()
+app.openai_client()
+timings['openai_client()'] = time.perf_counter() - started
+print(json.dumps(timings))
+'''
+
+
+def run_python(code, environ, flags=()):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, *flags, '-c', code], cwd=APP_DIR, env=environ,
+                            capture_output=True, text=True, check=True)
+    return result, time.perf_counter() - started
+
+
+def boot(environ, preload):
+    result, seconds = run_python(BOOT.format(preload=preload), environ)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process'] = seconds
+    return timings
+
+
+def import_profile(environ):
+    """(total, {module: cumulative}) for app and the modules it imports directly, in seconds."""
+    result, _ = run_python('import app', environ, ('-X', 'importtime'))
+    modules = {}
+    total = None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if name.strip() == 'app' and depth == 0:
+            total = int(cumulative) / 1e6
+        elif depth == 1:
+            modules[name.strip()] = modules.get(name.strip(), 0) + int(cumulative) / 1e6
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12, help='modules listed from the importtime profile')
+    args = parser.parse_args()
+
+    environ = app_environment(os.path.join(tempfile.mkdtemp(prefix='mayday-startup-'), 'bench.db'))
+    environ['JOB_WORKERS'] = '0'
+    # Warm the OS file cache and create the database, so every timed run starts alike
+    boot(environ, EAGER_IMPORTS)
+
+    print(f"{'mode':>6} {'import':>9} {'create_app':>11} {'readyz':>8} {'process':>9}")
+    medians = {}
+    for mode, preload in (('lazy', ()), ('eager', EAGER_IMPORTS)):
+        runs = [boot(environ, preload) for _ in range(args.runs)]
+        if any(run['status'] != 200 for run in runs):
+            raise SystemExit(f'/readyz did not answer 200 in {mode} mode')
+        medians[mode] = {key: statistics.median(run[key] for run in runs)
+                         for key in ('import', 'create_app', 'readyz', 'process')}
+        row = medians[mode]
+        print(f"{mode:>6} {row['import'] * 1e3:>7.0f}ms {row['create_app'] * 1e3:>9.0f}ms "
+              f"{row['readyz'] * 1e3:>6.0f}ms {row['process'] * 1e3:>7.0f}ms")
+    saved = medians['eager']['process'] - medians['lazy']['process']
+    print(f"deferring the clients saves {saved * 1e3:.0f}ms per worker start "
+          f"({saved / medians['eager']['process']:.0%})")
+
+    total, modules = import_profile(environ)
+    print(f'\nimport app: {total * 1e3:.0f}ms (python -X importtime), slowest direct imports:')
+    for name, seconds in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {name:<32} {seconds * 1e3:>7.1f}ms')
+
+    result, _ = run_python(FIRST_USE.format(names=EAGER_IMPORTS), environ)
+    print('\npaid on first use instead:')
+    for name, seconds in json.loads(result.stdout.strip().splitlines()[-1]).items():
+        print(f'  {name:<32} {seconds * 1e3:>7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
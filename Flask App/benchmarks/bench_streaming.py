@@ -0,0 +1,74 @@
+"""Benchmark time-to-first-session with streamed completions.
+
+Replays a canned completion as a token stream with a fixed delay per token
+and compares when the first session is known against waiting for the whole
+completion, for both the prototypes' Day:/Time: plans and the web app's
+Duration:/Sessions: answers (where streaming also stops reading early).
+
+Usage: python benchmarks/bench_streaming.py [--token-ms 20] [--days 5]
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+import common  # noqa: F401  (puts the app directory on sys.path)
+from schedule_parser import PlanParser, SessionParser
+from schedule_stream import content_deltas, iter_lines
+
+WORDS_PER_TOKEN = 0.75
+
+
+def prototype_plan(days):
+    lines = ['Yes', '', 'Task Analysis:',
+             'This is a complex study topic requiring multiple focused sessions with review in between.',
+             '', 'Scheduling Plan:']
+    for day in range(1, days + 1):
+        lines += ['Advanced Mathematics: 2 hours', f'Day: {day}', 'Time: 09:00 - 11:00',
+                  f'Topic/Activity: Chapter {day} exercises, worked examples and a short self-test', '']
+    return '\n'.join(lines)
+
+
+WEB_ANSWER = ('Duration: 2 hours\nSessions: 3\n\n'
+              'Three two-hour sessions leave time to practise between them. Start with the basics, '
+              'then move on to worked problems, and finish with a timed review of everything covered.')
+
+
+def fake_stream(text, token_delay):
+    """Yield chat completion chunks of roughly one token each."""
+    words = text.replace('\n', ' \n ').split(' ')
+    step = max(1, round(1 / WORDS_PER_TOKEN))
+    for position in range(0, len(words), step):
+        time.sleep(token_delay)
+        piece = ' '.join(words[position:position + step]) + ' '
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece.replace(' \n ', '\n')))])
+
+
+def first_and_total(text, token_delay, parser, stop_early):
+    started = time.perf_counter()
+    first = None
+    for line in iter_lines(content_deltas(fake_stream(text, token_delay))):
+        if parser.feed(line) and first is None:
+            first = time.perf_counter() - started
+            if stop_early:
+                break
+    return first, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--token-ms', type=float, default=20.0)
+    parser.add_argument('--days', type=int, default=5)
+    args = parser.parse_args()
+    delay = args.token_ms / 1000
+
+    print(f"{'answer':>10} {'first session':>14} {'streamed total':>15} {'blocking':>9}")
+    plan = prototype_plan(args.days)
+    first, total = first_and_total(plan, delay, SessionParser(), stop_early=False)
+    print(f"{'prototype':>10} {first * 1e3:>12.0f}ms {total * 1e3:>13.0f}ms {total * 1e3:>7.0f}ms")
+    first, total = first_and_total(WEB_ANSWER, delay, PlanParser(14), stop_early=True)
+    _, blocking = first_and_total(WEB_ANSWER, delay, PlanParser(14), stop_early=False)
+    print(f"{'web plan':>10} {first * 1e3:>12.0f}ms {total * 1e3:>13.0f}ms {blocking * 1e3:>7.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Shared helpers for the benchmark scripts."""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, APP_DIR)
+
+
+def app_environment(database_path, environ=os.environ):
+    """The environment app.py needs, with every file it writes next to database_path."""
+    directory = os.path.dirname(database_path)
+    environ = dict(environ)
+    environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    environ.setdefault('SECRET_KEY', 'benchmark')
+    environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    environ.setdefault('GOOGLE_CLIENT_CONFIG', '{}')
+    environ.setdefault('LLM_CACHE_PATH', os.path.join(directory, 'llm_cache.db'))
+    environ.setdefault('JOB_QUEUE_PATH', os.path.join(directory, 'jobs.db'))
+    environ.setdefault('ICS_STORE_PATH', os.path.join(directory, 'ics'))
+    environ.setdefault('TOKEN_STORE_PATH', os.path.join(directory, 'tokens.db'))
+    return environ
+
+
+def load_app(database_path=None):
+    """Import app.py against a throwaway SQLite database and create its tables."""
+    if database_path is None:
+        database_path = os.path.join(tempfile.mkdtemp(prefix='mayday-bench-'), 'bench.db')
+    os.environ.update(app_environment(database_path))
+    import app
+    with app.app.app_context():
+        app.db.create_all()
+    return app
+
+
+def timed(function, repeat):
+    """Return the best wall-clock time of repeat calls, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def samples(function, repeat):
+    """Return every wall-clock time of repeat calls, in seconds."""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def median_ms(durations):
+    return statistics.median(durations) * 1e3
@@ -0,0 +1,134 @@
+"""Corpus of LLM scheduling answers for the parser benchmark.
+
+Answers are generated from a seed, so runs are comparable: the formats the
+prompts ask for, the variations models actually produce (markdown, bullets,
+am/pm times, en dashes, chatter around the answer, fenced JSON), and fuzzed
+copies (truncated, shuffled, corrupted) that must never make a parser raise.
+Each entry records how many sessions a correct parse finds, or None for
+fuzzed answers, where any result except an exception is acceptable, and
+the answer itself: (duration, unit, sessions) of a plan, or (day, start,
+end) of each session of a schedule.
+"""
+import json
+import random
+from datetime import time
+
+TASKS = ['Advanced Mathematics', 'Spanish vocabulary', 'Clean the garage', 'Thesis chapter 3',
+         'Piano practice', 'Tax return', 'Machine learning course', 'Marathon training']
+TOPICS = ['Introduction and basic concepts', 'Worked examples', 'Practice problems', 'Review and self-test',
+          'Deep dive into the hard parts', 'Wrap-up, notes and next steps']
+CHATTER = ['Sure! Here is a schedule for you:', "Here's a plan that should work well.",
+           'I hope this helps! Let me know if you want any changes.', 'Good luck with your studies!']
+
+
+def sessions(rng, days):
+    """Random (task, day, start_hour, length_hours, topic) tuples, one or two per day."""
+    task = rng.choice(TASKS)
+    result = []
+    for day in range(1, days + 1):
+        hour = rng.randint(7, 15)
+        for _ in range(rng.choice((1, 1, 2))):
+            length = rng.choice((1, 2, 3))
+            result.append((task, day, hour, length, rng.choice(TOPICS)))
+            hour += length + 1
+    return result
+
+
+def clock(hour, style):
+    if style == 'ampm':
+        return f"{hour % 12 or 12}:00 {'PM' if hour >= 12 else 'AM'}"
+    return f'{hour:02d}:00' if style == 'padded' else f'{hour}:00'
+
+
+def legacy_schedule(rng, items, variant):
+    """The prototypes' text format, as asked for or as models drift from it."""
+    bold = variant == 'markdown'
+    dash = ' – ' if variant in ('markdown', 'loose') else ' - '
+    style = 'ampm' if variant == 'ampm' else ('unpadded' if variant == 'loose' else 'padded')
+    lines = []
+    if variant == 'chatty':
+        lines += [rng.choice(CHATTER), '']
+    lines += ['Yes' if items[-1][1] > 1 else 'No', '', '**Task Analysis:**' if bold else 'Task Analysis:',
+              f'{items[0][0]} needs focused sessions with breaks in between.', '',
+              '**Scheduling Plan:**' if bold else 'Scheduling Plan:']
+    for task, day, hour, length, topic in items:
+        prefix = '- ' if bold else ''
+        lines += [f'**{task}: {length} hours**' if bold else f'{task}: {length} hours',
+                  f'{prefix}Day {day}' if variant == 'loose' else f'{prefix}Day: {day}',
+                  f'{prefix}Time: {clock(hour, style)}{dash}{clock(hour + length, style)}',
+                  f'{prefix}Topic/Activity: {topic}', '']
+    if variant == 'chatty':
+        lines.append(rng.choice(CHATTER))
+    return '\n'.join(lines)
+
+
+def json_schedule(rng, items, fenced):
+    data = {'multi_day': items[-1][1] > 1,
+            'analysis': f'{items[0][0]} needs focused sessions with breaks in between.',
+            'sessions': [{'name': task, 'day': day, 'start': f'{hour:02d}:00', 'end': f'{hour + length:02d}:00',
+                          'topic': topic} for task, day, hour, length, topic in items]}
+    text = json.dumps(data, indent=rng.choice((None, 2)))
+    return f'```json\n{text}\n```' if fenced else text
+
+
+def plan_answer(rng, fmt):
+    """Return (text, (duration, unit, sessions))."""
+    duration, unit, count = rng.randint(1, 4), rng.choice(('hour', 'minute')), rng.randint(1, 6)
+    if unit == 'minute':
+        duration *= 15
+    if fmt == 'json':
+        return json.dumps({'duration': duration, 'unit': unit, 'sessions': count}), (duration, unit, count)
+    text = f'Duration: {duration} {unit}s\nSessions: {count}'
+    if fmt == 'chatty':
+        text = f'{rng.choice(CHATTER)}\n\n**{text.replace(chr(10), "**" + chr(10) + "**")}**\n\n{rng.choice(CHATTER)}'
+    return text, (duration, unit, count)
+
+
+def fuzz(text, rng):
+    """Corrupt an answer the ways streamed or sloppy output goes wrong."""
+    mutation = rng.choice(('truncate', 'drop_line', 'shuffle', 'noise', 'swap_colons', 'bad_time', 'empty'))
+    lines = text.split('\n')
+    if mutation == 'truncate':
+        return text[:rng.randrange(len(text))]
+    if mutation == 'drop_line' and len(lines) > 1:
+        del lines[rng.randrange(len(lines))]
+        return '\n'.join(lines)
+    if mutation == 'shuffle':
+        rng.shuffle(lines)
+        return '\n'.join(lines)
+    if mutation == 'noise':
+        chars = list(text)
+        for _ in range(max(1, len(chars) // 20)):
+            chars[rng.randrange(len(chars))] = rng.choice('{}[]":,\\\n\t#*-–0123456789é🕒')
+        return ''.join(chars)
+    if mutation == 'swap_colons':
+        return text.replace(':', rng.choice((' -', ';', '')), rng.randint(1, 5))
+    if mutation == 'bad_time':
+        return text.replace(':00', rng.choice((':99', ':0x', '', ':00:00')), rng.randint(1, 3))
+    return ''
+
+
+def build_corpus(seed=0, size=1000):
+    """Return a list of {'kind', 'category', 'text', 'expected', 'answer'} dicts."""
+    rng = random.Random(seed)
+    corpus = []
+    for number in range(size):
+        items = sessions(rng, rng.randint(1, 7))
+        category = ('schedule/text', 'schedule/markdown', 'schedule/ampm', 'schedule/loose', 'schedule/chatty',
+                    'schedule/json', 'schedule/json-fenced', 'plan/text', 'plan/chatty', 'plan/json')[number % 10]
+        kind, variant = category.split('/')
+        if kind == 'plan':
+            text, answer = plan_answer(rng, variant)
+            corpus.append({'kind': 'plan', 'category': category, 'text': text, 'expected': 1, 'answer': answer})
+            continue
+        answer = [(day, time(hour), time(hour + length)) for _, day, hour, length, _ in items]
+        if variant.startswith('json'):
+            corpus.append({'kind': 'schedule', 'category': category, 'answer': answer,
+                           'text': json_schedule(rng, items, variant == 'json-fenced'), 'expected': len(items)})
+        else:
+            corpus.append({'kind': 'schedule', 'category': category, 'answer': answer,
+                           'text': legacy_schedule(rng, items, variant), 'expected': len(items)})
+    for entry in list(corpus):
+        corpus.append({'kind': entry['kind'], 'category': entry['kind'] + '/fuzzed',
+                       'text': fuzz(entry['text'], rng), 'expected': None, 'answer': None})
+    return corpus
@@ -0,0 +1,236 @@
+"""Create, update and delete many events in one request and one transaction.
+
+Items are validated a field at a time across the whole request (every
+title, then every start time, and so on), and ids are checked against the
+database with one query per chunk rather than one per item. Errors are
+reported per item; valid items are written with executemany bulk
+statements of plain mappings, so no ORM objects are built per row.
+
+Events mirrored from Google Calendar (google_id set) can't be updated or
+deleted here: nothing would carry the change to Google, and the next sync
+would quietly undo it. They are changed in Google Calendar instead.
+"""
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from recurrence import series_end, validate_rule
+
+MAX_TITLE_LENGTH = 100
+MAX_BULK_ITEMS = 10000
+# Ids per IN (...) when loading or deleting rows
+QUERY_CHUNK = 1000
+TIME_FIELDS = ('start_time', 'end_time')
+UPDATE_FIELDS = ('title',) + TIME_FIELDS
+# A field left out of an update, as opposed to one set to null
+_MISSING = object()
+MIRRORED = 'event is mirrored from Google Calendar; change it there'
+
+
+def parse_time(value):
+    """Parse an ISO 8601 string to a naive datetime, in UTC if it had an offset; None if invalid."""
+    if not isinstance(value, str):
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _fail(errors, index, message):
+    if errors[index] is None:
+        errors[index] = message
+
+
+def _check_titles(titles, errors):
+    for index, title in enumerate(titles):
+        if title is _MISSING:
+            continue
+        if not isinstance(title, str) or not title.strip():
+            _fail(errors, index, 'title is required')
+        elif len(title) > MAX_TITLE_LENGTH:
+            _fail(errors, index, f'title is longer than {MAX_TITLE_LENGTH} characters')
+
+
+def _check_times(values, field, errors):
+    """Parse one time column; returns the parsed values (None where left out or invalid)."""
+    parsed = [None if value is _MISSING else parse_time(value) for value in values]
+    for index, (value, moment) in enumerate(zip(values, parsed)):
+        if moment is None and value is not _MISSING:
+            _fail(errors, index, f'{field} must be an ISO 8601 date and time')
+    return parsed
+
+
+def _check_order(starts, ends, errors):
+    for index, (start, end) in enumerate(zip(starts, ends)):
+        if start is not None and end is not None and end <= start:
+            _fail(errors, index, 'end_time must be after start_time')
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_ids(ids, errors, existing, taken):
+    """Ids must be integers of the user's local events, and each used once per request."""
+    counts = Counter(event_id for event_id in ids if _is_id(event_id))
+    for index, event_id in enumerate(ids):
+        if not _is_id(event_id):
+            _fail(errors, index, 'id must be an integer')
+        elif event_id not in existing:
+            _fail(errors, index, 'event not found')
+        elif counts[event_id] > 1 or event_id in taken:
+            _fail(errors, index, 'event appears more than once')
+        elif existing[event_id][3] is not None:
+            _fail(errors, index, MIRRORED)
+
+
+def validate_creates(items, user_id):
+    """Return (rows, errors): an insert mapping or None per item, and an error or None."""
+    errors = [None if isinstance(item, dict) else 'expected an object' for item in items]
+    items = [item if isinstance(item, dict) else {} for item in items]
+    _check_titles([item.get('title') for item in items], errors)
+    starts = _check_times([item.get('start_time') for item in items], 'start_time', errors)
+    ends = _check_times([item.get('end_time') for item in items], 'end_time', errors)
+    _check_order(starts, ends, errors)
+    rows = []
+    for item, start, end, index in zip(items, starts, ends, range(len(items))):
+        if errors[index] is not None:
+            rows.append(None)
+            continue
+        row = {'user_id': user_id, 'title': item['title'], 'start_time': start, 'end_time': end,
+               'rrule': None, 'exdates': None, 'recurrence_end': None}
+        if item.get('rrule'):
+            # Rules can't be checked a column at a time, but few items have one
+            try:
+                row['rrule'] = validate_rule(str(item['rrule']), start)
+            except ValueError as e:
+                errors[index] = str(e)
+                rows.append(None)
+                continue
+            row['recurrence_end'] = series_end(row['rrule'], start, end - start)
+        rows.append(row)
+    return rows, errors
+
+
+def validate_updates(items, existing, taken=()):
+    """Return (changes, errors): an update mapping or None per item, and an error or None.
+
+    existing maps the user's event ids to (start_time, end_time, rrule,
+    google_id), so a change of only one end is checked against the other.
+    """
+    errors = [None if isinstance(item, dict) else 'expected an object' for item in items]
+    items = [item if isinstance(item, dict) else {} for item in items]
+    _check_ids([item.get('id') for item in items], errors, existing, taken)
+    for index, item in enumerate(items):
+        if errors[index] is None and not any(field in item for field in UPDATE_FIELDS):
+            errors[index] = 'nothing to update'
+    _check_titles([item.get('title', _MISSING) for item in items], errors)
+    starts = _check_times([item.get('start_time', _MISSING) for item in items], 'start_time', errors)
+    ends = _check_times([item.get('end_time', _MISSING) for item in items], 'end_time', errors)
+    # Unchanged ends come from the stored row
+    stored = [existing.get(item.get('id')) if errors[index] is None else None for index, item in enumerate(items)]
+    starts = [start or (row[0] if row else None) for start, row in zip(starts, stored)]
+    ends = [end or (row[1] if row else None) for end, row in zip(ends, stored)]
+    _check_order(starts, ends, errors)
+    changes = []
+    for index, item in enumerate(items):
+        if errors[index] is not None:
+            changes.append(None)
+            continue
+        change = {'id': item['id']}
+        if 'title' in item:
+            change['title'] = item['title']
+        if 'start_time' in item or 'end_time' in item:
+            change['start_time'] = starts[index]
+            change['end_time'] = ends[index]
+            rrule = stored[index][2]
+            if rrule:
+                change['recurrence_end'] = series_end(rrule, starts[index], ends[index] - starts[index])
+        changes.append(change)
+    return changes, errors
+
+
+def validate_deletes(ids, existing, taken=()):
+    """Return an error or None per id."""
+    errors = [None] * len(ids)
+    _check_ids(ids, errors, existing, taken)
+    return errors
+
+
+def load_existing(db, event_model, user_id, ids):
+    """Map the user's events among ids to (start_time, end_time, rrule, google_id)."""
+    Event = event_model
+    ids = list({event_id for event_id in ids if _is_id(event_id)})
+    existing = {}
+    for position in range(0, len(ids), QUERY_CHUNK):
+        existing.update((row[0], tuple(row[1:])) for row in db.session.query(
+            Event.id, Event.start_time, Event.end_time, Event.rrule, Event.google_id).filter(
+            Event.user_id == user_id, Event.id.in_(ids[position:position + QUERY_CHUNK])))
+    return existing
+
+
+def _results(errors, ids):
+    return [{'ok': True, 'id': event_id} if error is None else {'ok': False, 'error': error}
+            for error, event_id in zip(errors, ids)]
+
+
+def apply_bulk(db, event_model, user_id, creates=(), updates=(), deletes=(), atomic=False):
+    """Validate and write a batch of creates, updates and deletes for user_id.
+
+    Returns (results, stats): results has a list per operation with
+    {'ok', 'id'} or {'ok': False, 'error'} per item, in request order.
+    Everything valid is written in a single transaction; with atomic set,
+    nothing is written if any item is invalid. Bulk statements skip the
+    mapper events, so callers invalidate their per-user caches.
+    """
+    Event = event_model
+    started = time.perf_counter()
+    update_ids = [item.get('id') for item in updates if isinstance(item, dict)]
+    existing = load_existing(db, Event, user_id, update_ids + list(deletes))
+    rows, create_errors = validate_creates(creates, user_id)
+    changes, update_errors = validate_updates(updates, existing, taken={i for i in deletes if _is_id(i)})
+    delete_errors = validate_deletes(deletes, existing, taken={i for i in update_ids if _is_id(i)})
+    failed = sum(error is not None for error in create_errors + update_errors + delete_errors)
+
+    created_ids = [None] * len(rows)
+    if not (atomic and failed):
+        valid_rows = [row for row in rows if row is not None]
+        valid_changes = [change for change in changes if change is not None]
+        doomed = [event_id for event_id, error in zip(deletes, delete_errors) if error is None]
+        try:
+            if valid_rows:
+                # RETURNING with executemany, in parameter order, gives each row its id
+                ids = iter(db.session.scalars(
+                    db.insert(Event).returning(Event.id, sort_by_parameter_order=True), valid_rows).all())
+                created_ids = [next(ids) if row is not None else None for row in rows]
+            if valid_changes:
+                db.session.execute(db.update(Event), valid_changes)
+            for position in range(0, len(doomed), QUERY_CHUNK):
+                db.session.execute(db.delete(Event).where(Event.user_id == user_id,
+                                                          Event.id.in_(doomed[position:position + QUERY_CHUNK]))
+                                   .execution_options(synchronize_session=False))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    written = not (atomic and failed)
+    results = {'create': _results(create_errors, created_ids),
+               'update': _results(update_errors, [item.get('id') if isinstance(item, dict) else None
+                                                  for item in updates]),
+               'delete': _results(delete_errors, deletes)}
+    if not written:
+        for item in results['create'] + results['update'] + results['delete']:
+            if item['ok']:
+                item.clear()
+                item.update(ok=False, error='not written: other items are invalid')
+    stats = {'created': sum(row is not None for row in rows) if written else 0,
+             'updated': sum(change is not None for change in changes) if written else 0,
+             'deleted': sum(error is None for error in delete_errors) if written else 0,
+             'failed': failed,
+             'seconds': time.perf_counter() - started}
+    return results, stats
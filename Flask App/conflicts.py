@@ -0,0 +1,131 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+
+# Events longer than this (multi-week imports, say) are kept apart from
+# the rest, so they don't widen every query's window
+LONG_EVENT = timedelta(days=1)
+
+
+class IntervalIndex:
+    """Sorted index of one user's events for overlap queries.
+
+    Events are kept as (start, end, id) tuples sorted by start. Any event
+    overlapping [start, end) must begin within max_duration before end, so a
+    query only bisects into that window instead of scanning every event.
+    Events longer than LONG_EVENT live in a list of their own that every
+    query scans whole; they are few, and keeping them out caps the window
+    at LONG_EVENT.
+    """
+
+    def __init__(self, intervals=()):
+        items = sorted((start, end, event_id) for event_id, start, end in intervals)
+        self.items = [item for item in items if item[1] - item[0] <= LONG_EVENT]
+        self.long = [item for item in items if item[1] - item[0] > LONG_EVENT]
+        self.max_duration = max((end - start for start, end, _ in self.items), default=timedelta(0))
+
+    def __len__(self):
+        return len(self.items) + len(self.long)
+
+    def add(self, event_id, start, end):
+        if end - start > LONG_EVENT:
+            insort(self.long, (start, end, event_id))
+            return
+        insort(self.items, (start, end, event_id))
+        self.max_duration = max(self.max_duration, end - start)
+
+    def remove(self, event_id, start, end):
+        items = self.long if end - start > LONG_EVENT else self.items
+        position = bisect_left(items, (start, end, event_id))
+        if position < len(items) and items[position] == (start, end, event_id):
+            del items[position]
+            # max_duration is left as is; it only has to be an upper bound, and is at most LONG_EVENT
+
+    def overlaps(self, start, end):
+        """Return (start, end, id) for every event overlapping [start, end), sorted by start."""
+        lo = bisect_left(self.items, (start - self.max_duration,))
+        hi = bisect_left(self.items, (end,))
+        found = [item for item in self.items[lo:hi] if item[1] > start]
+        if self.long:
+            found.extend(item for item in self.long if item[0] < end and item[1] > start)
+            found.sort()
+        return found
+
+    def has_overlap(self, start, end):
+        return bool(self.overlaps(start, end))
+
+
+class ConflictIndex:
+    """Per-user IntervalIndex registry, built lazily from the database.
+
+    load(user_id) returns (id, start, end) rows for that user. After that the
+    index is kept current through added/removed; invalidate() drops a user's
+    index so it is rebuilt on the next query, e.g. after bulk writes.
+
+    With version(user_id), the user's change counter in the database (see
+    event_versions), each index remembers the version it was built at and
+    is rebuilt once the database has moved on, as after a write by another
+    process. added/removed then take the version the write left behind and
+    apply it only on top of the one before; anything else drops the index.
+    """
+
+    def __init__(self, load, version=None):
+        self.load = load
+        self.version = version
+        self.indexes = {}
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        current = self.version(user_id) if self.version else None
+        with self.lock:
+            index = self.indexes.get(user_id)
+            if self.versions.get(user_id) != current:
+                index = None
+        if index is None:
+            # Read before loading, so a write in between makes it look stale rather than current
+            index = IntervalIndex(self.load(user_id))
+            with self.lock:
+                self.indexes[user_id] = index
+                self.versions[user_id] = current
+        return index
+
+    def _change(self, user_id, version):
+        """The user's index if the write that left version may be applied to it, else None."""
+        index = self.indexes.get(user_id)
+        if index is None:
+            return None
+        if version is not None:
+            if self.versions.get(user_id) != version - 1:
+                self.indexes.pop(user_id, None)
+                return None
+            self.versions[user_id] = version
+        return index
+
+    def added(self, user_id, event_id, start, end, version=None):
+        with self.lock:
+            index = self._change(user_id, version)
+            if index is not None:
+                index.add(event_id, start, end)
+
+    def removed(self, user_id, event_id, start, end, version=None):
+        with self.lock:
+            index = self._change(user_id, version)
+            if index is not None:
+                index.remove(event_id, start, end)
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.indexes.clear()
+            else:
+                self.indexes.pop(user_id, None)
+
+    def overlaps(self, user_id, start, end):
+        index = self.get(user_id)
+        with self.lock:
+            return index.overlaps(start, end)
+
+    def has_overlap(self, user_id, start, end):
+        return bool(self.overlaps(user_id, start, end))
@@ -0,0 +1,192 @@
+"""Session lengths and counts guessed from the user's own events, before asking the LLM.
+
+Each user gets a small naive Bayes model of their event history: how many
+events ran for each duration (rounded to STEP minutes) as part of a plan
+of how many sessions, and how many of those had each word in the title.
+A description's likeliest plan is the one whose events best explain its
+words. It is only used when that plan holds at least the confidence
+threshold of the probability and every word has been seen in enough
+events; anything new or ambiguous goes to the LLM as before. Events not
+scheduled from an AI plan count as plans of one session.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+# Probability the likeliest duration needs before it's used instead of the LLM
+CONFIDENCE = float(os.getenv('DURATION_CONFIDENCE', '0.8'))
+# Events each word of a description must have appeared in
+MIN_EVENTS = int(os.getenv('DURATION_MIN_EVENTS', '3'))
+STEP = 15
+# Longer events (all-day ones, say) say nothing about a study session
+MAX_MINUTES = 12 * 60
+SMOOTHING = 1.0
+WORD = re.compile(r'\w+')
+
+
+def words(title):
+    return set(WORD.findall(title.lower()))
+
+
+def rounded_minutes(start, end):
+    """The event's length in whole STEPs of minutes, or None if it isn't a usable duration."""
+    minutes = STEP * round((end - start).total_seconds() / 60 / STEP)
+    return minutes if 0 < minutes <= MAX_MINUTES else None
+
+
+class DurationModel:
+    """Word statistics of one user's events, updated one event at a time.
+
+    Events are counted by plan: (minutes, sessions) of the plan they were
+    scheduled from.
+    """
+
+    def __init__(self, events=()):
+        self.plans = Counter()
+        # Word -> Counter of plans of the events it appeared in
+        self.words = {}
+        for title, start, end, sessions in events:
+            self.add(title, start, end, sessions)
+
+    def __len__(self):
+        return sum(self.plans.values())
+
+    def _update(self, title, start, end, sessions, change):
+        minutes = rounded_minutes(start, end)
+        if minutes is None or not title:
+            return
+        plan = (minutes, sessions or 1)
+        self.plans[plan] += change
+        if self.plans[plan] <= 0:
+            del self.plans[plan]
+        for word in words(title):
+            counts = self.words.setdefault(word, Counter())
+            counts[plan] += change
+            if counts[plan] <= 0:
+                del counts[plan]
+            if not counts:
+                del self.words[word]
+
+    def add(self, title, start, end, sessions=None):
+        self._update(title, start, end, sessions, 1)
+
+    def remove(self, title, start, end, sessions=None):
+        self._update(title, start, end, sessions, -1)
+
+    def estimate(self, description, confidence=CONFIDENCE, min_events=MIN_EVENTS):
+        """Return ((minutes, sessions), probability) for the likeliest plan, or None if unsure."""
+        terms = words(description)
+        if not terms or any(sum(self.words.get(term, {}).values()) < min_events for term in terms):
+            return None
+        total = len(self)
+        scores = {}
+        for plan, events in self.plans.items():
+            score = math.log(events / total)
+            for term in terms:
+                # Share of this plan's events with the word, smoothed so one miss isn't fatal
+                score += math.log((self.words[term][plan] + SMOOTHING) / (events + 2 * SMOOTHING))
+            scores[plan] = score
+        best = max(scores, key=scores.get)
+        probability = 1 / sum(math.exp(score - scores[best]) for score in scores.values())
+        if probability < confidence:
+            return None
+        return best, probability
+
+
+class DurationEstimator:
+    """Per-user DurationModel registry, built lazily from the database.
+
+    load(user_id) returns (title, start, end, sessions) rows for that user; after that
+    the model is kept current through added/removed, and invalidate() drops
+    it to be rebuilt, as for the conflict index. version(user_id), if given,
+    is checked before each use the way ConflictIndex does it, so writes by
+    other processes are picked up. Counts how often estimate() answered and
+    what that saved, going by how long the LLM took when it had to be asked
+    (see llm_answered()).
+    """
+
+    def __init__(self, load, confidence=CONFIDENCE, min_events=MIN_EVENTS, version=None):
+        self.load = load
+        self.confidence = confidence
+        self.min_events = min_events
+        self.version = version
+        self.models = {}
+        self.versions = {}
+        self.counts = {'hits': 0, 'misses': 0, 'llm_calls': 0, 'llm_seconds': 0.0, 'seconds_saved': 0.0}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        current = self.version(user_id) if self.version else None
+        with self.lock:
+            model = self.models.get(user_id)
+            if self.versions.get(user_id) != current:
+                model = None
+        if model is None:
+            model = DurationModel(self.load(user_id))
+            with self.lock:
+                self.models[user_id] = model
+                self.versions[user_id] = current
+        return model
+
+    def estimate(self, user_id, description):
+        """(minutes, sessions) for description from the user's history, or None to ask the LLM."""
+        started = time.perf_counter()
+        model = self.get(user_id)
+        with self.lock:
+            result = model.estimate(description, self.confidence, self.min_events)
+            seconds = time.perf_counter() - started
+            if result is None:
+                self.counts['misses'] += 1
+                return None
+            self.counts['hits'] += 1
+            if self.counts['llm_calls']:
+                llm_seconds = self.counts['llm_seconds'] / self.counts['llm_calls']
+                self.counts['seconds_saved'] += max(0.0, llm_seconds - seconds)
+        return result[0]
+
+    def llm_answered(self, seconds):
+        """Record how long an LLM call made after a miss took."""
+        with self.lock:
+            self.counts['llm_calls'] += 1
+            self.counts['llm_seconds'] += seconds
+
+    def _change(self, user_id, version):
+        """The user's model if the write that left version may be applied to it, else None."""
+        model = self.models.get(user_id)
+        if model is None:
+            return None
+        if version is not None:
+            if self.versions.get(user_id) != version - 1:
+                self.models.pop(user_id, None)
+                return None
+            self.versions[user_id] = version
+        return model
+
+    def added(self, user_id, title, start, end, sessions=None, version=None):
+        with self.lock:
+            model = self._change(user_id, version)
+            if model is not None:
+                model.add(title, start, end, sessions)
+
+    def removed(self, user_id, title, start, end, sessions=None, version=None):
+        with self.lock:
+            model = self._change(user_id, version)
+            if model is not None:
+                model.remove(title, start, end, sessions)
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.models.clear()
+            else:
+                self.models.pop(user_id, None)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_rate'] = counts['hits'] / lookups if lookups else 0.0
+        return counts
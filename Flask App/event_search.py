@@ -0,0 +1,124 @@
+"""Full-text search over event titles with SQLite FTS5.
+
+The event_search virtual table is an external-content FTS5 index on the
+event table: it stores only the index, and triggers on event keep it in
+step with every write, including bulk statements and ICS imports that
+skip the ORM. The owner's user_id is indexed as a token too, so a search
+intersects the user's rows with the matching words inside FTS5 instead
+of filtering everyone's matches afterwards.
+
+Results aren't ordered by bm25(). Every row of an all-words query has
+the same idf, so bm25 would only rank shorter titles higher, and working
+out that idf reads every user's matches for each word, which at a million
+events costs more than the search itself. Rows matching every word whole
+come first instead, then shorter titles.
+"""
+import re
+
+from sqlalchemy import and_, column, func, or_, select, table, text
+
+TABLE = 'event_search'
+# Indexed columns of the event table; a new column here (descriptions,
+# say) rebuilds the index on the next install()
+SEARCH_COLUMNS = ('title',)
+TOKENIZER = 'unicode61 remove_diacritics 2'
+# Prefix indexes make short prefixes as cheap as whole words
+PREFIXES = '1 2 3'
+MAX_TERMS = 16
+WORD = re.compile(r'\w+')
+
+_index = table(TABLE, column('rowid'))
+
+
+def _definition(content_table):
+    columns = ', '.join(list(SEARCH_COLUMNS) + ['user_id'])
+    return (f"CREATE VIRTUAL TABLE {TABLE} USING fts5({columns}, content='{content_table}', content_rowid='id', "
+            f"tokenize='{TOKENIZER}', prefix='{PREFIXES}')")
+
+
+def _triggers(content_table):
+    columns = list(SEARCH_COLUMNS) + ['user_id']
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{name}' for name in columns)
+    old = ', '.join(f'old.{name}' for name in columns)
+    insert = f'INSERT INTO {TABLE} (rowid, {names}) VALUES (new.id, {new});'
+    delete = f"INSERT INTO {TABLE} ({TABLE}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    return {
+        f'{TABLE}_insert': f'AFTER INSERT ON {content_table} BEGIN {insert} END',
+        f'{TABLE}_delete': f'AFTER DELETE ON {content_table} BEGIN {delete} END',
+        # Only changes to indexed columns touch the index; moving an event doesn't
+        f'{TABLE}_update': f'AFTER UPDATE OF {names} ON {content_table} BEGIN {delete} {insert} END',
+    }
+
+
+def install(connection, content_table='event'):
+    """Create the index and its triggers if they are missing or out of date.
+
+    Takes a SQLAlchemy connection; returns True if the index was (re)built
+    from the event table. FTS5 is SQLite only, so other databases are left
+    alone and have no search.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    definition = _definition(content_table)
+    triggers = _triggers(content_table)
+    existing = dict(connection.execute(text(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE name = :table OR (type = 'trigger' AND name LIKE :prefix ESCAPE '\\')"),
+        {'table': TABLE, 'prefix': TABLE + '\\_%'}).all())
+    wanted = {TABLE: definition, **{name: f'CREATE TRIGGER {name} {body}' for name, body in triggers.items()}}
+    if existing == wanted:
+        return False
+    for name in existing:
+        if name != TABLE:
+            connection.execute(text(f'DROP TRIGGER {name}'))
+    connection.execute(text(f'DROP TABLE IF EXISTS {TABLE}'))
+    connection.execute(text(definition))
+    for sql in wanted.values():
+        if sql != definition:
+            connection.execute(text(sql))
+    connection.execute(text(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+def match_query(user_id, query, prefix=True):
+    """An FTS5 query for the user's events matching every word of query; None if it has no words.
+
+    Words match as prefixes, or only whole with prefix=False.
+    """
+    terms = WORD.findall(query)[:MAX_TERMS]
+    if not terms:
+        return None
+    # Quoting keeps words like AND, NEAR or column names from being read as syntax
+    words = ' AND '.join(f'"{term}"' + ('*' if prefix else '') for term in terms)
+    return f'user_id:"{int(user_id)}" AND {{{" ".join(SEARCH_COLUMNS)}}}:({words})'
+
+
+def search(db, event_model, user_id, query, start=None, end=None, limit=20, offset=0):
+    """Return [(Event, exact)] for the user's events matching query, best first.
+
+    start and end keep events overlapping [start, end); a recurring event
+    counts if any of its occurrences might, judged by recurrence_end.
+    exact is True when every word matched a whole word of the event.
+    """
+    Event = event_model
+    match = match_query(user_id, query)
+    if match is None:
+        return []
+    # Looked up once for the whole query, not per row
+    whole = select(_index.c.rowid).where(text(f'{TABLE} MATCH :whole')).correlate(None)
+    exact = _index.c.rowid.in_(whole).label('exact')
+    statement = (db.select(Event.id, exact)
+                 .select_from(_index.join(Event.__table__, Event.id == _index.c.rowid))
+                 .where(text(f'{TABLE} MATCH :match'), Event.user_id == user_id))
+    if end is not None:
+        statement = statement.where(Event.start_time < end)
+    if start is not None:
+        statement = statement.where(or_(
+            and_(Event.rrule.is_(None), Event.end_time > start),
+            and_(Event.rrule.isnot(None), or_(Event.recurrence_end.is_(None), Event.recurrence_end > start))))
+    statement = statement.order_by(exact.desc(), func.length(Event.title), Event.start_time, Event.id)
+    rows = db.session.execute(statement.limit(limit).offset(offset),
+                              {'match': match, 'whole': match_query(user_id, query, prefix=False)}).all()
+    events = {event.id: event for event in Event.query.filter(Event.id.in_([row[0] for row in rows]))} if rows else {}
+    return [(events[event_id], bool(exact)) for event_id, exact in rows if event_id in events]
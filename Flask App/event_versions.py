@@ -0,0 +1,92 @@
+"""Per-user change counters for the event table, kept by SQLite triggers.
+
+Every insert, update and delete of a user's events bumps that user's
+version in the event_version table, whichever process made it and
+whether it went through the ORM or not. The in-memory caches built from
+a user's events (conflict index, free/busy bitmaps, duration model, ICS
+digest) remember the version they were built at and are rebuilt when the
+database holds a newer one, so writes from other workers or processes are
+never missed.
+"""
+from sqlalchemy import bindparam, text
+
+TABLE = 'event_version'
+DEFINITION = f'CREATE TABLE {TABLE} (user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)'
+# Users per IN (...) when reading a group's versions
+QUERY_CHUNK = 500
+
+
+def _bump(user_id):
+    return (f'INSERT INTO {TABLE} (user_id, version) VALUES ({user_id}, 1) '
+            f'ON CONFLICT (user_id) DO UPDATE SET version = version + 1;')
+
+
+def _triggers(content_table):
+    return {
+        f'{TABLE}_insert': f'AFTER INSERT ON {content_table} BEGIN {_bump("new.user_id")} END',
+        f'{TABLE}_delete': f'AFTER DELETE ON {content_table} BEGIN {_bump("old.user_id")} END',
+        f'{TABLE}_update': f'AFTER UPDATE ON {content_table} BEGIN {_bump("new.user_id")} END',
+        # An event handed to another user changes the old owner's events too
+        f'{TABLE}_move': (f'AFTER UPDATE OF user_id ON {content_table} WHEN old.user_id IS NOT new.user_id '
+                          f'BEGIN {_bump("old.user_id")} END'),
+    }
+
+
+def install(connection, content_table='event'):
+    """Create the table and its triggers if they are missing or out of date.
+
+    Takes a SQLAlchemy connection; returns True if anything was created.
+    Other databases than SQLite are left alone, and have no versions.
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    triggers = _triggers(content_table)
+    existing = dict(connection.execute(text(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE name = :table OR (type = 'trigger' AND name LIKE :prefix ESCAPE '\\')"),
+        {'table': TABLE, 'prefix': TABLE + '\\_%'}).all())
+    wanted = {TABLE: DEFINITION, **{name: f'CREATE TRIGGER {name} {body}' for name, body in triggers.items()}}
+    if existing == wanted:
+        return False
+    for name in existing:
+        if name != TABLE:
+            connection.execute(text(f'DROP TRIGGER {name}'))
+    if TABLE not in existing:
+        connection.execute(text(DEFINITION))
+    for name, sql in wanted.items():
+        if name != TABLE:
+            connection.execute(text(sql))
+    return True
+
+
+def _enabled(connection):
+    bind = connection.get_bind() if hasattr(connection, 'get_bind') else connection
+    return bind.dialect.name == 'sqlite'
+
+
+def version(connection, user_id):
+    """The user's version (0 before any write), or None without versions.
+
+    connection is a SQLAlchemy connection or session; inside a write
+    transaction the version includes that transaction's own writes.
+    """
+    if not _enabled(connection):
+        return None
+    if hasattr(connection, 'get_bind'):
+        connection = connection.connection()
+    # Checked before every cache read, so it skips compiling a statement (SQLite only, hence '?')
+    found = connection.exec_driver_sql(f'SELECT version FROM {TABLE} WHERE user_id = ?', (user_id,)).scalar()
+    return found or 0
+
+
+def versions(connection, user_ids):
+    """{user_id: version} for every one of user_ids, or {} without versions."""
+    if not _enabled(connection):
+        return {}
+    user_ids = list(dict.fromkeys(user_ids))
+    found = dict.fromkeys(user_ids, 0)
+    query = text(f'SELECT user_id, version FROM {TABLE} WHERE user_id IN :user_ids').bindparams(
+        bindparam('user_ids', expanding=True))
+    for position in range(0, len(user_ids), QUERY_CHUNK):
+        found.update(connection.execute(query, {'user_ids': user_ids[position:position + QUERY_CHUNK]}).all())
+    return found
@@ -0,0 +1,259 @@
+"""A small in-memory stand-in for the Google Calendar v3 API.
+
+Run it directly to get a local server, then point the app or the prototypes
+at it with GOOGLE_CALENDAR_ENDPOINT=http://127.0.0.1:<port>/
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+EVENTS_PATH = re.compile(r'^/calendar/v3/calendars/([^/]+)/events/?$')
+EVENT_PATH = re.compile(r'^/calendar/v3/calendars/([^/]+)/events/([^/]+)$')
+BATCH_PATH = '/batch/calendar/v3'
+DEFAULT_PAGE_SIZE = 250
+
+
+class FakeCalendar:
+    """In-memory calendar state plus the HTTP server that exposes it.
+
+    fail_every makes every Nth insert fail with a 503, which is useful for
+    exercising retries; lose_every stores every Nth insert but still answers
+    503, as when Google applied it and the answer was lost. An insert whose
+    client-supplied id is taken answers 409. latency adds a fixed delay to
+    every HTTP request.
+
+    Every change bumps a sequence number that sync tokens are built from, so
+    events.list with a syncToken returns only what changed, deletions
+    included. expire_sync_tokens() makes older tokens answer 410 Gone.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, fail_every=0, latency=0.0, lose_every=0):
+        self.events = {}
+        self.sequence = 0
+        self.oldest_sync_sequence = 0
+        self.inserts = 0
+        self.http_requests = 0
+        self.fail_every = fail_every
+        self.lose_every = lose_every
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def insert(self, calendar_id, body):
+        """Store an event and return (status, response body)."""
+        with self.lock:
+            self.inserts += 1
+            if self.fail_every and self.inserts % self.fail_every == 0:
+                return 503, {'error': {'code': 503, 'message': 'Backend Error'}}
+            event_id = body.get('id') or uuid.uuid4().hex
+            if event_id in self.events.get(calendar_id, {}):
+                # Google keeps ids of deleted events reserved too
+                return 409, {'error': {'code': 409, 'message': 'The requested identifier already exists.',
+                                       'errors': [{'reason': 'duplicate'}]}}
+            stored = self._store(calendar_id, dict(body, id=event_id, status='confirmed'))
+            if self.lose_every and self.inserts % self.lose_every == 0:
+                return 503, {'error': {'code': 503, 'message': 'Backend Error'}}
+            return 200, stored
+
+    def _store(self, calendar_id, event):
+        self.sequence += 1
+        event['_sequence'] = self.sequence
+        self.events.setdefault(calendar_id, {})[event['id']] = event
+        return self._public(event)
+
+    @staticmethod
+    def _public(event):
+        return {key: value for key, value in event.items() if not key.startswith('_')}
+
+    def patch(self, calendar_id, event_id, changes):
+        with self.lock:
+            event = self.events.get(calendar_id, {}).get(event_id)
+            if event is None or event['status'] == 'cancelled':
+                return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+            return 200, self._store(calendar_id, dict(event, **changes))
+
+    def delete(self, calendar_id, event_id):
+        with self.lock:
+            event = self.events.get(calendar_id, {}).get(event_id)
+            if event is None or event['status'] == 'cancelled':
+                return 410, {'error': {'code': 410, 'message': 'Resource has been deleted'}}
+            # Deleted events stay behind as tombstones for incremental sync
+            self._store(calendar_id, {'id': event_id, 'status': 'cancelled'})
+            return 204, b''
+
+    def expire_sync_tokens(self):
+        with self.lock:
+            # Tokens handed out so far are all older than this
+            self.sequence += 1
+            self.oldest_sync_sequence = self.sequence
+
+    def list(self, calendar_id, query):
+        """events.list with syncToken, pageToken and maxResults support."""
+        page_size = int(query.get('maxResults', [DEFAULT_PAGE_SIZE])[0])
+        with self.lock:
+            if 'pageToken' in query:
+                since, upto, offset = (int(part) for part in query['pageToken'][0].split(':'))
+            else:
+                offset = 0
+                upto = self.sequence
+                since = 0
+                if 'syncToken' in query:
+                    since = int(query['syncToken'][0])
+                    if since < self.oldest_sync_sequence:
+                        return 410, {'error': {'code': 410, 'message': 'Sync token is no longer valid'}}
+            changed = sorted(
+                (event for event in self.events.get(calendar_id, {}).values()
+                 if since < event['_sequence'] <= upto
+                 # A full sync leaves out deleted events
+                 and (since or event['status'] != 'cancelled')),
+                key=lambda event: event['_sequence'])
+        page = changed[offset:offset + page_size]
+        response = {'kind': 'calendar#events', 'items': [self._public(event) for event in page]}
+        if offset + page_size < len(changed):
+            response['nextPageToken'] = f'{since}:{upto}:{offset + page_size}'
+        else:
+            response['nextSyncToken'] = str(upto)
+        return 200, response
+
+    def dispatch(self, method, path, body):
+        url = urlsplit(path)
+        match = EVENTS_PATH.match(url.path)
+        if match:
+            calendar_id = unquote(match.group(1))
+            if method == 'POST':
+                return self.insert(calendar_id, json.loads(body or b'{}'))
+            if method == 'GET':
+                return self.list(calendar_id, parse_qs(url.query))
+        match = EVENT_PATH.match(url.path)
+        if match:
+            calendar_id, event_id = unquote(match.group(1)), unquote(match.group(2))
+            if method == 'DELETE':
+                return self.delete(calendar_id, event_id)
+            if method in ('PATCH', 'PUT'):
+                return self.patch(calendar_id, event_id, json.loads(body or b'{}'))
+        return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+
+    def batch(self, content_type, body):
+        """Answer a multipart/mixed batch request part by part."""
+        message = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+        boundary = uuid.uuid4().hex
+        parts = []
+        for part in message.iter_parts():
+            raw = part.get_payload(decode=True)
+            head, _, payload = raw.partition(b'\n\n')
+            request_line = head.split(b'\n', 1)[0].decode()
+            method, path = request_line.split(' ')[:2]
+            status, response = self.dispatch(method, path, payload.strip())
+            if not isinstance(response, bytes):
+                response = json.dumps(response).encode()
+            content_id = part['Content-ID'].replace('<', '<response-', 1)
+            parts.append(
+                f'--{boundary}\r\n'
+                'Content-Type: application/http\r\n'
+                f'Content-ID: {content_id}\r\n\r\n'
+                f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+                'Content-Type: application/json; charset=UTF-8\r\n\r\n'
+                f'{response.decode()}\r\n'
+            )
+        parts.append(f'--{boundary}--\r\n')
+        return boundary, ''.join(parts).encode()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so clients can reuse connections as with Google
+            protocol_version = 'HTTP/1.1'
+            # Send headers and body in one segment to avoid delayed-ACK stalls
+            disable_nagle_algorithm = True
+            wbufsize = -1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length)
+
+            def _send(self, status, payload, content_type='application/json'):
+                if not isinstance(payload, bytes):
+                    payload = json.dumps(payload).encode()
+                if status == 204:
+                    self.send_response(status)
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _handle(self, method):
+                with fake.lock:
+                    fake.http_requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                body = self._body()
+                if self.path.split('?', 1)[0] == BATCH_PATH:
+                    boundary, payload = fake.batch(self.headers['Content-Type'], body)
+                    self._send(200, payload, f'multipart/mixed; boundary={boundary}')
+                    return
+                status, payload = fake.dispatch(method, self.path, body)
+                self._send(status, payload)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PATCH(self):
+                self._handle('PATCH')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def do_DELETE(self):
+                self._handle('DELETE')
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a fake Google Calendar API server.')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--fail-every', type=int, default=0)
+    parser.add_argument('--lose-every', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeCalendar(port=args.port, fail_every=args.fail_every, latency=args.latency,
+                        lose_every=args.lose_every)
+    print(f'Fake Google Calendar listening on {fake.url}')
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
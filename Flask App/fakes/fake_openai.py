@@ -0,0 +1,192 @@
+"""A small stand-in for the OpenAI chat completions API.
+
+Run it directly to get a local server, then point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 (the prototypes' openai 0.x
+client reads OPENAI_API_BASE instead).
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = '/v1/chat/completions'
+CHARS_PER_TOKEN = 4
+NUMBERED_TASK = re.compile(r'^(\d+)\. (.+)$', re.MULTILINE)
+
+
+class FakeOpenAI:
+    """Canned scheduling answers behind the chat completions endpoint.
+
+    The answer follows the request: a duration/sessions plan for the web
+    app's prompt, otherwise a day-by-day schedule per task (several for a
+    packed request), as JSON when response_format asks for a json_object.
+    answer, if given, is a function of the request body returning the text
+    instead.
+
+    latency is the delay before the first token and token_latency the delay
+    between streamed chunks of about one token, so both time to first token
+    and total generation time can be modelled.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, token_latency=0.0, answer=None, seed=0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.answer = answer
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.completion_tokens = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reply(self, body):
+        """Return the answer text for a chat completion request body."""
+        if self.answer is not None:
+            return self.answer(body)
+        messages = body.get('messages') or [{}]
+        system = messages[0].get('content', '')
+        prompt = messages[-1].get('content', '')
+        as_json = (body.get('response_format') or {}).get('type') == 'json_object'
+        with self.lock:
+            if 'how many separate sessions' in system:
+                return self._plan(as_json)
+            tasks = NUMBERED_TASK.findall(prompt)
+            if not tasks:
+                return self._schedule(prompt.rsplit(':', 1)[-1].strip() or 'Task', as_json)
+            if as_json:
+                schedules = [dict(json.loads(self._schedule(task, True)), task=int(number)) for number, task in tasks]
+                return json.dumps({'schedules': schedules})
+            return '\n\n'.join(f'### Task {number}\n{self._schedule(task, False)}' for number, task in tasks)
+
+    def _plan(self, as_json):
+        duration, sessions = self.rng.choice((1, 2)), self.rng.randint(1, 4)
+        if as_json:
+            return json.dumps({'duration': duration, 'unit': 'hour', 'sessions': sessions})
+        return (f'Duration: {duration} hours\nSessions: {sessions}\n\n'
+                'Shorter sessions with breaks in between tend to work best for this.')
+
+    def _schedule(self, task, as_json):
+        days = self.rng.randint(1, 3)
+        hours = [self.rng.randint(8, 16) for _ in range(days)]
+        if as_json:
+            return json.dumps({'multi_day': days > 1, 'analysis': f'{task} fits in {days} session(s).',
+                               'sessions': [{'name': task, 'day': day, 'start': f'{hour:02d}:00',
+                                             'end': f'{hour + 2:02d}:00', 'topic': f'Part {day}'}
+                                            for day, hour in enumerate(hours, 1)]})
+        lines = ['Yes' if days > 1 else 'No', '', 'Task Analysis:', f'{task} fits in {days} session(s).', '',
+                 'Scheduling Plan:']
+        for day, hour in enumerate(hours, 1):
+            lines += [f'{task}: 2 hours', f'Day: {day}', f'Time: {hour:02d}:00 - {hour + 2:02d}:00',
+                      f'Topic/Activity: Part {day}', '']
+        return '\n'.join(lines)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if self.path.split('?', 1)[0] != COMPLETIONS_PATH:
+                    self._send(404, {'error': {'message': 'Not Found', 'type': 'invalid_request_error'}})
+                    return
+                with fake.lock:
+                    fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                text = fake.reply(body)
+                # max_tokens cuts the answer short, like the real API
+                limit = body.get('max_tokens')
+                finish_reason = 'stop'
+                if limit and len(text) > limit * CHARS_PER_TOKEN:
+                    text, finish_reason = text[:limit * CHARS_PER_TOKEN], 'length'
+                completion_tokens = len(text) // CHARS_PER_TOKEN + 1
+                prompt_tokens = sum(len(message.get('content') or '') for message in body.get('messages', []))
+                prompt_tokens = prompt_tokens // CHARS_PER_TOKEN + 1
+                with fake.lock:
+                    fake.completion_tokens += completion_tokens
+                base = {'id': 'chatcmpl-' + uuid.uuid4().hex, 'created': int(time.time()),
+                        'model': body.get('model', 'gpt-3.5-turbo')}
+                if body.get('stream'):
+                    self._stream(base, text, finish_reason)
+                    return
+                self._send(200, dict(base, object='chat.completion', choices=[
+                    {'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': finish_reason}],
+                    usage={'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                           'total_tokens': prompt_tokens + completion_tokens}))
+
+            def _stream(self, base, text, finish_reason):
+                # Server-Sent Events; the end of the body is marked by closing the connection
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                pieces = [{'role': 'assistant', 'content': ''}]
+                pieces += [{'content': text[i:i + CHARS_PER_TOKEN]} for i in range(0, len(text), CHARS_PER_TOKEN)]
+                for number, delta in enumerate(pieces):
+                    if number and fake.token_latency:
+                        time.sleep(fake.token_latency)
+                    chunk = dict(base, object='chat.completion.chunk',
+                                 choices=[{'index': 0, 'delta': delta, 'finish_reason': None}])
+                    try:
+                        self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        # The client stopped reading early
+                        return
+                last = dict(base, object='chat.completion.chunk',
+                            choices=[{'index': 0, 'delta': {}, 'finish_reason': finish_reason}])
+                try:
+                    self.wfile.write(f'data: {json.dumps(last)}\n\ndata: [DONE]\n\n'.encode())
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a fake OpenAI chat completions server.')
+    parser.add_argument('--port', type=int, default=8086)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before the first token')
+    parser.add_argument('--token-latency', type=float, default=0.0, help='seconds between streamed tokens')
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(port=args.port, latency=args.latency, token_latency=args.token_latency)
+    print(f'Fake OpenAI listening on {fake.url}')
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
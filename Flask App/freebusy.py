@@ -0,0 +1,200 @@
+"""Free/busy bitmaps for finding times that suit a whole group of users."""
+import os
+import threading
+from datetime import datetime, time, timedelta, timezone
+
+SLOT_MINUTES = int(os.getenv('FREEBUSY_SLOT_MINUTES', '15'))
+HORIZON_DAYS = int(os.getenv('FREEBUSY_HORIZON_DAYS', '90'))
+MAX_CANDIDATES = 100
+
+
+def utc_today():
+    return datetime.combine(datetime.now(timezone.utc).date(), time(0))
+
+
+class FreeBusyIndex:
+    """Per-user busy bitmaps over a fixed horizon, as NumPy arrays.
+
+    Each user's array covers horizon_days from midnight (UTC) today in slots
+    of slot_minutes. A slot holds the number of events overlapping it rather
+    than a single bit, so a deleted event can be subtracted again; a slot is
+    busy while its count is above zero. load(user_ids, start, end) returns
+    (user_id, start, end) rows overlapping [start, end) for every user in
+    user_ids, so a group is built with one query. Like ConflictIndex, the
+    arrays are kept current through added/removed and rebuilt after
+    invalidate(). The horizon moves on at midnight, which drops them all.
+    versions(user_ids), if given, returns each user's change counter in the
+    database, and a bitmap built at an older version is rebuilt, as in
+    ConflictIndex; added/removed take the version their write left behind.
+    NumPy is imported by the methods that use it, so importing the app
+    doesn't pay for it until the first group query.
+    """
+
+    def __init__(self, load, slot_minutes=SLOT_MINUTES, horizon_days=HORIZON_DAYS, today=utc_today,
+                 versions=None):
+        if (24 * 60) % slot_minutes:
+            raise ValueError('slot_minutes must divide a day')
+        self.load = load
+        self.slot_minutes = slot_minutes
+        self.slot = timedelta(minutes=slot_minutes)
+        self.slots = horizon_days * 24 * 60 // slot_minutes
+        self.today = today
+        self.versions = versions
+        self.origin = None
+        self.bitmaps = {}
+        self.built_at = {}
+        self.lock = threading.Lock()
+
+    @property
+    def horizon_end(self):
+        return self.origin + self.slots * self.slot
+
+    def _roll_over(self):
+        origin = self.today()
+        if origin != self.origin:
+            self.origin = origin
+            self.bitmaps.clear()
+
+    def _slot_bounds(self, starts, ends):
+        """Slot indexes [first, last) covering each interval, clipped to the horizon."""
+        import numpy as np
+        # Timedelta arithmetic is much faster than NumPy's datetime conversion of Python objects
+        origin, step = self.origin, self.slot.total_seconds()
+        starts = np.fromiter(((start - origin).total_seconds() for start in starts), dtype=np.float64)
+        ends = np.fromiter(((end - origin).total_seconds() for end in ends), dtype=np.float64)
+        first = np.clip(np.floor(starts / step), 0, self.slots).astype(np.int64)
+        last = np.clip(np.ceil(ends / step), 0, self.slots).astype(np.int64)
+        return first, last
+
+    def ensure(self, user_ids):
+        """Build the bitmaps of any of user_ids that aren't built yet."""
+        current = self.versions(user_ids) if self.versions else {}
+        with self.lock:
+            self._roll_over()
+            origin = self.origin
+            missing = [user_id for user_id in dict.fromkeys(user_ids)
+                       if user_id not in self.bitmaps or self.built_at.get(user_id) != current.get(user_id)]
+        if not missing:
+            return
+        rows = self.load(missing, origin, origin + self.slots * self.slot)
+        with self.lock:
+            if origin != self.origin:
+                return
+            import numpy as np
+            position = {user_id: number for number, user_id in enumerate(missing)}
+            # Difference array: +1 where an event starts, -1 where it ends, then a running sum
+            width = self.slots + 1
+            size = len(missing) * width
+            if rows:
+                user_ids, starts, ends = zip(*rows)
+                first, last = self._slot_bounds(starts, ends)
+                offsets = np.fromiter((position[user_id] for user_id in user_ids), dtype=np.int64,
+                                      count=len(rows)) * width
+                counts = (np.bincount(offsets + first, minlength=size)
+                          - np.bincount(offsets + last, minlength=size)).reshape(len(missing), width)
+            else:
+                counts = np.zeros((len(missing), width), dtype=np.int64)
+            counts = np.cumsum(counts[:, :-1], axis=1).astype(np.uint16)
+            for user_id, number in position.items():
+                self.bitmaps[user_id] = counts[number]
+                self.built_at[user_id] = current.get(user_id)
+
+    def _change(self, user_id, start, end, delta, version):
+        with self.lock:
+            bitmap = self.bitmaps.get(user_id)
+            if bitmap is None or self.origin is None:
+                return
+            if version is not None:
+                if self.built_at.get(user_id) != version - 1:
+                    self.bitmaps.pop(user_id, None)
+                    return
+                self.built_at[user_id] = version
+            first, last = self._slot_bounds([start], [end])
+            window = bitmap[first[0]:last[0]]
+            if delta > 0:
+                window += 1
+            else:
+                import numpy as np
+                np.subtract(window, 1, out=window, where=window > 0)
+
+    def added(self, user_id, start, end, version=None):
+        self._change(user_id, start, end, 1, version)
+
+    def removed(self, user_id, start, end, version=None):
+        self._change(user_id, start, end, -1, version)
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.bitmaps.clear()
+            else:
+                self.bitmaps.pop(user_id, None)
+
+    def busy(self, user_ids, start, end):
+        """Return (first slot start, bool matrix of users x slots) for [start, end).
+
+        start is rounded up and end down to whole slots, so only slots
+        inside the window count, and both are clipped to the horizon.
+        """
+        import numpy as np
+        self.ensure(user_ids)
+        with self.lock:
+            first = min(self.slots, max(0, -(-(start - self.origin) // self.slot)))
+            last = min(self.slots, max(first, (end - self.origin) // self.slot))
+            matrix = np.empty((len(user_ids), last - first), dtype=bool)
+            for row, user_id in enumerate(user_ids):
+                bitmap = self.bitmaps.get(user_id)
+                if bitmap is None:
+                    # Dropped by a write in the meantime; its next query rebuilds it
+                    raise LookupError(f'No free/busy bitmap for user {user_id}')
+                np.greater(bitmap[first:last], 0, out=matrix[row])
+            return self.origin + first * self.slot, matrix
+
+    def common_slots(self, user_ids, start, end, duration, require='all', day_start=None, day_end=None,
+                     limit=MAX_CANDIDATES):
+        """Find windows of at least duration where enough of user_ids are free.
+
+        require is 'all' (AND of the free bitmaps), 'any' (OR) or the number
+        of users that must be free. day_start/day_end (times of day) limit
+        windows to those hours. Returns up to limit (start, end, free) tuples
+        in time order, free being the fewest users free at any point of the
+        window. Each window is a maximal run, so a caller may book any
+        duration-long part of it.
+        """
+        import numpy as np
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return []
+        if require == 'all':
+            required = len(user_ids)
+        elif require == 'any':
+            required = 1
+        else:
+            required = int(require)
+        try:
+            first_start, matrix = self.busy(user_ids, start, end)
+        except LookupError:
+            first_start, matrix = self.busy(user_ids, start, end)
+        if not matrix.shape[1]:
+            return []
+        free = len(user_ids) - matrix.sum(axis=0, dtype=np.int32)
+        ok = free >= required
+        if day_start is not None or day_end is not None:
+            minutes = (np.arange(matrix.shape[1]) * self.slot_minutes
+                       + (first_start.hour * 60 + first_start.minute)) % (24 * 60)
+            if day_start is not None:
+                ok &= minutes >= day_start.hour * 60 + day_start.minute
+            if day_end is not None:
+                # The slot has to end by day_end
+                ok &= minutes + self.slot_minutes <= day_end.hour * 60 + day_end.minute
+        # Runs of free slots start where ok flips to True and end where it flips back
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], ok.view(np.int8), [0]))))
+        starts, ends = edges[0::2], edges[1::2]
+        needed = max(1, -(-duration // self.slot))
+        long_enough = ends - starts >= needed
+        starts, ends = starts[long_enough][:limit], ends[long_enough][:limit]
+        if not len(starts):
+            return []
+        fewest = np.minimum.reduceat(np.append(free, 0), np.column_stack((starts, ends)).ravel())[0::2]
+        return [(first_start + int(s) * self.slot, first_start + int(e) * self.slot, int(n))
+                for s, e, n in zip(starts, ends, fewest)]
@@ -0,0 +1,148 @@
+import base64
+import json
+import secrets
+import time
+
+from googleapiclient.errors import HttpError
+
+from upstream import CircuitOpen, backoff_delay
+
+# Google recommends at most 50 calls per Calendar batch request
+BATCH_SIZE = 50
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# A 403 is only worth retrying when Google says it is rate limiting
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+# Google's answer to an insert whose id is taken, by an earlier attempt or a deleted event
+CONFLICT = 409
+
+
+def new_event_id():
+    """A random Calendar event id: base32hex digits, as Google requires.
+
+    Google keeps the ids of deleted events reserved, so an id must never be
+    derived from anything that can come round again, like a reused row id.
+    """
+    return base64.b32hexencode(secrets.token_bytes(20)).decode().lower()
+
+
+def event_body(name, start, end, time_zone='UTC', recurrence=None, event_id=None):
+    """Build a Calendar API event body; recurrence is a list of RRULE/EXDATE lines."""
+    body = {
+        'summary': name,
+        'start': {'dateTime': start.isoformat(), 'timeZone': time_zone},
+        'end': {'dateTime': end.isoformat(), 'timeZone': time_zone},
+    }
+    if event_id:
+        body['id'] = event_id
+    if recurrence:
+        body['recurrence'] = recurrence
+    return body
+
+
+def _status_of(error):
+    if isinstance(error, HttpError):
+        return error.resp.status
+    return None
+
+
+def _reasons_of(error):
+    """The 'reason' of each error in a Google API error response."""
+    try:
+        data = json.loads(error.content)
+    except (TypeError, ValueError):
+        return set()
+    details = data.get('error') if isinstance(data, dict) else None
+    errors = details.get('errors') if isinstance(details, dict) else None
+    return {item.get('reason') for item in errors or () if isinstance(item, dict)}
+
+
+def _is_retryable(error):
+    if isinstance(error, CircuitOpen):
+        # Retrying within this push won't get past an open circuit
+        return False
+    status = _status_of(error)
+    if status == 403:
+        return bool(_reasons_of(error) & RATE_LIMIT_REASONS)
+    # Transport errors (no HTTP status) are always worth another try
+    return status is None or status in RETRYABLE_STATUSES
+
+
+def push_events(service, bodies, calendar_id='primary', batch_size=BATCH_SIZE,
+                max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF, upstream=None):
+    """Insert event bodies into Google Calendar using batch requests.
+
+    Returns one result per body, in input order, of the form
+    {'ok': bool, 'id': str or None, 'status': int or None,
+    'error': str or None, 'attempts': int}. Only items that failed with a
+    retryable error are sent again, with jittered exponential backoff
+    between rounds.
+
+    Inserts aren't idempotent by themselves: an insert Google applied but
+    whose answer was lost would be made twice. So every body carries its
+    own id (a new_event_id() unless it has one), and a 409 for an id this
+    call already sent means an earlier attempt got through. A 409 on the
+    first attempt means the id is taken, and is a failure like any other.
+    With an upstream.Upstream, each batch request gets its deadline and
+    circuit breaker; it neither retries nor hedges them itself.
+    """
+    # Already imported if the service came from gcal_service
+    import httplib2
+    bodies = [body if body.get('id') else dict(body, id=new_event_id()) for body in bodies]
+    results = [{'ok': False, 'id': None, 'status': None, 'error': None, 'attempts': 0}
+               for _ in bodies]
+    pending = list(range(len(bodies)))
+    attempt = 0
+
+    while pending:
+        if attempt:
+            time.sleep(backoff_delay(attempt, backoff))
+        retry = []
+
+        for offset in range(0, len(pending), batch_size):
+            chunk = pending[offset:offset + batch_size]
+
+            def record(request_id, response, exception):
+                index = int(request_id)
+                result = results[index]
+                result['attempts'] += 1
+                if exception is None:
+                    result.update(ok=True, id=response.get('id'), status=200, error=None)
+                    return
+                status = _status_of(exception)
+                if status == CONFLICT and result['attempts'] > 1:
+                    # An earlier attempt got through even though its answer didn't
+                    result.update(ok=True, id=bodies[index]['id'], status=status, error=None)
+                    return
+                result.update(status=status, error=str(exception))
+                if _is_retryable(exception):
+                    retry.append(index)
+
+            batch = service.new_batch_http_request(callback=record)
+            for index in chunk:
+                request = service.events().insert(calendarId=calendar_id, body=bodies[index])
+                batch.add(request, request_id=str(index))
+
+            try:
+                if upstream is None:
+                    batch.execute()
+                else:
+                    upstream.call(batch.execute, retries=0)
+            except (HttpError, httplib2.HttpLib2Error, OSError, CircuitOpen) as error:
+                # The whole batch request failed, so every item in it did
+                for index in chunk:
+                    record(str(index), None, error)
+
+        if attempt >= max_retries:
+            break
+        pending = sorted(retry)
+        attempt += 1
+
+    return results
+
+
+def summarize(results):
+    """Return (succeeded, failed) counts for push_events results."""
+    succeeded = sum(1 for result in results if result['ok'])
+    return succeeded, len(results) - succeeded
@@ -0,0 +1,109 @@
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+# The Google client libraries are imported on first use: together they
+# take a few hundred milliseconds, which every web worker would pay at boot
+
+HTTP_TIMEOUT = 30
+MAX_CACHED_USERS = 256
+
+
+@lru_cache(maxsize=None)
+def _parsed_document(endpoint):
+    from googleapiclient import discovery_cache
+    # The bundled discovery document is parsed once per process
+    document = json.loads(discovery_cache.get_static_doc('calendar', 'v3'))
+    if endpoint:
+        # Rewriting rootUrl moves both the REST paths and the batch path
+        document['rootUrl'] = endpoint.rstrip('/') + '/'
+    return document
+
+
+def discovery_document(endpoint=None):
+    """Return the Calendar v3 discovery document, optionally pointed at another endpoint.
+
+    The endpoint defaults to GOOGLE_CALENDAR_ENDPOINT so the app and the
+    prototypes can be run against a local fake Calendar server.
+    """
+    return copy.deepcopy(_parsed_document(endpoint or os.getenv('GOOGLE_CALENDAR_ENDPOINT')))
+
+
+def build_calendar_service(credentials, endpoint=None, http=None):
+    """Build a Calendar v3 service from the cached discovery document."""
+    from googleapiclient.discovery import build_from_document
+    if http is not None:
+        return build_from_document(discovery_document(endpoint), http=http)
+    return build_from_document(discovery_document(endpoint), credentials=credentials)
+
+
+def credentials_to_dict(credentials):
+    return {'token': credentials.token,
+            'refresh_token': credentials.refresh_token,
+            'token_uri': credentials.token_uri,
+            'client_id': credentials.client_id,
+            'client_secret': credentials.client_secret,
+            'scopes': credentials.scopes,
+            'expiry': credentials.expiry.isoformat() if credentials.expiry else None}
+
+
+def credentials_from_dict(info):
+    """Rebuild Credentials from the dict stored by credentials_to_dict."""
+    from google.oauth2.credentials import Credentials
+    info = dict(info)
+    expiry = info.pop('expiry', None)
+    credentials = Credentials(**info)
+    if expiry:
+        # google-auth compares expiry against naive UTC datetimes
+        credentials.expiry = datetime.fromisoformat(expiry).replace(tzinfo=None)
+    return credentials
+
+
+class CalendarServiceFactory:
+    """Per-process cache of Calendar services, one per user and thread.
+
+    Each cached service keeps its own httplib2 connection pool (httplib2 is
+    not thread-safe, hence per thread) and reuses the parsed discovery
+    document. Credentials come from the TokenStore, which refreshes them
+    ahead of expiry in place, so a cached service always sends the current
+    token.
+    """
+
+    def __init__(self, endpoint=None, max_users=MAX_CACHED_USERS, timeout=HTTP_TIMEOUT):
+        self.endpoint = endpoint
+        self.max_users = max_users
+        self.timeout = timeout
+        self.local = threading.local()
+        self.builds = 0
+
+    def _cache(self):
+        if not hasattr(self.local, 'services'):
+            self.local.services = OrderedDict()
+        return self.local.services
+
+    def service(self, user_id, credentials):
+        """Return the Calendar service for a user's Credentials.
+
+        A new Credentials object (a new grant, or a token another process
+        refreshed) gets a new service.
+        """
+        cache = self._cache()
+        entry = cache.get(user_id)
+        if entry is None or entry[0] is not credentials:
+            import google_auth_httplib2
+            import httplib2
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=self.timeout))
+            entry = (credentials, build_calendar_service(credentials, self.endpoint, http=http))
+            self.builds += 1
+        cache[user_id] = entry
+        cache.move_to_end(user_id)
+        while len(cache) > self.max_users:
+            cache.popitem(last=False)
+        return entry[1]
+
+    def forget(self, user_id):
+        self._cache().pop(user_id, None)
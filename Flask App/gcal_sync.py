@@ -0,0 +1,211 @@
+from datetime import datetime, timezone
+
+from googleapiclient.errors import HttpError
+
+from gcal_batch import CONFLICT, event_body, new_event_id, push_events
+from recurrence import add_exdate, format_exdates, parse_exdates, recurrence_lines, validate_rule
+
+PAGE_SIZE = 250
+
+
+def parse_google_time(value):
+    """Return a naive UTC datetime for a Calendar API start/end object."""
+    if 'dateTime' in value:
+        moment = datetime.fromisoformat(value['dateTime'])
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        return moment
+    # All-day events only carry a date
+    return datetime.fromisoformat(value['date'])
+
+
+def assign_push_ids(events):
+    """Give each Event row without one the random id it is pushed under.
+
+    The ids are meant to be committed before the push, so that a row whose
+    answer was lost is sent under the same id again.
+    """
+    for event in events:
+        if event.push_id is None:
+            event.push_id = new_event_id()
+
+
+def record_push(events, results):
+    """Mark the rows push_events() inserted as mirrored.
+
+    A row whose id was taken (by an event deleted in Google since, say)
+    gets a new one on its next push instead of failing for good.
+    """
+    for event, result in zip(events, results):
+        if result['ok']:
+            event.google_id = result['id']
+        elif result['status'] == CONFLICT:
+            event.push_id = None
+
+
+def row_body(event):
+    """The Calendar API body for an Event row, under the row's push_id (see assign_push_ids())."""
+    return event_body(event.title, event.start_time, event.end_time,
+                      recurrence=recurrence_lines(event.rrule, event.exdates),
+                      event_id=event.push_id)
+
+
+def parse_recurrence(lines):
+    """Return (rrule, exdates column) from a Calendar API 'recurrence' list."""
+    rule = None
+    exdates = set()
+    for line in lines or []:
+        name, _, value = line.partition(':')
+        name = name.split(';')[0].upper()
+        if name == 'RRULE' and rule is None:
+            rule = value
+        elif name == 'EXDATE':
+            for part in value.split(','):
+                moment = datetime.strptime(part.rstrip('Z')[:15], '%Y%m%dT%H%M%S') if 'T' in part \
+                    else datetime.strptime(part[:8], '%Y%m%d')
+                exdates.add(moment)
+    return rule, format_exdates(exdates) if rule else None
+
+
+class CalendarSync:
+    """Two-way sync between Event rows and a user's Google calendar.
+
+    Local events that were never pushed (google_id is NULL) are sent first.
+    Remote changes are then pulled with events.list and a per-user syncToken,
+    so after the first full listing only the deltas (inserts, updates and
+    cancellations) are fetched and applied. A 410 from Google means the token
+    expired, and the user gets a full resync instead.
+
+    Recurring events are mirrored as one series row. Google reports changes
+    to single instances separately; a cancelled instance becomes an exdate
+    on the series, a moved or edited one a plain row plus an exdate.
+    Calls to Google go through upstream (an upstream.Upstream), if given.
+    """
+
+    def __init__(self, db, event_model, state_model, calendar_id='primary', page_size=PAGE_SIZE, upstream=None):
+        self.db = db
+        self.Event = event_model
+        self.State = state_model
+        self.calendar_id = calendar_id
+        self.page_size = page_size
+        self.upstream = upstream
+
+    def sync(self, service, user_id, now=None):
+        """Sync one user and return counts of what changed."""
+        stats = {'pushed': 0, 'inserted': 0, 'updated': 0, 'deleted': 0, 'full': False}
+        stats['pushed'] = self.push_pending(service, user_id, now or datetime.utcnow())
+
+        state = self.db.session.get(self.State, user_id)
+        if state is None:
+            state = self.State(user_id=user_id)
+            self.db.session.add(state)
+        try:
+            sync_token = self._pull(service, user_id, state.sync_token, stats)
+        except HttpError as error:
+            if error.resp.status != 410 or state.sync_token is None:
+                raise
+            sync_token = self._pull(service, user_id, None, stats)
+
+        state.sync_token = sync_token
+        state.synced_at = datetime.utcnow()
+        self.db.session.commit()
+        return stats
+
+    def push_pending(self, service, user_id, now):
+        """Push upcoming local events that Google doesn't know about yet."""
+        pending = self.Event.query.filter(self.Event.user_id == user_id,
+                                          self.Event.google_id.is_(None),
+                                          self.Event.end_time >= now).all()
+        if not pending:
+            return 0
+        assign_push_ids(pending)
+        self.db.session.commit()
+        results = push_events(service, [row_body(event) for event in pending], calendar_id=self.calendar_id,
+                              upstream=self.upstream)
+        record_push(pending, results)
+        self.db.session.commit()
+        return sum(1 for result in results if result['ok'])
+
+    def _pull(self, service, user_id, sync_token, stats):
+        full = sync_token is None
+        stats['full'] = stats['full'] or full
+        seen = set()
+        page_token = None
+        while True:
+            # singleEvents=False keeps series compact instead of listing every instance
+            params = {'calendarId': self.calendar_id, 'maxResults': self.page_size, 'singleEvents': False}
+            if page_token:
+                params['pageToken'] = page_token
+            elif sync_token:
+                params['syncToken'] = sync_token
+            request = service.events().list(**params)
+            # Listing is idempotent, so it can be retried
+            response = request.execute() if self.upstream is None else self.upstream.call(request.execute)
+
+            items = response.get('items', [])
+            ids = [item['id'] for item in items] + [item['recurringEventId'] for item in items
+                                                    if 'recurringEventId' in item]
+            rows = {row.google_id: row for row in self.Event.query.filter(
+                self.Event.user_id == user_id, self.Event.google_id.in_(ids))} if ids else {}
+            for item in items:
+                seen.add(item['id'])
+                self._apply(user_id, item, rows, stats)
+            self.db.session.flush()
+
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+
+        if full:
+            # Anything mirrored before but missing from a full listing is gone
+            mirrored = self.Event.query.filter(self.Event.user_id == user_id,
+                                               self.Event.google_id.isnot(None))
+            for row in mirrored:
+                if row.google_id not in seen:
+                    self.db.session.delete(row)
+                    stats['deleted'] += 1
+        return response.get('nextSyncToken')
+
+    def _apply(self, user_id, item, rows, stats):
+        row = rows.get(item['id'])
+        if 'recurringEventId' in item and 'originalStartTime' in item:
+            # An instance of a series that was cancelled or changed on its own
+            series = rows.get(item['recurringEventId'])
+            if series is not None and series.rrule:
+                exdates = add_exdate(series.exdates, parse_google_time(item['originalStartTime']))
+                if exdates != series.exdates:
+                    series.exdates = exdates
+                    stats['updated'] += 1
+        if item.get('status') == 'cancelled':
+            if row is not None:
+                self.db.session.delete(row)
+                stats['deleted'] += 1
+            return
+        if 'start' not in item or 'end' not in item:
+            return
+        title = (item.get('summary') or '(No title)')[:100]
+        start_time = parse_google_time(item['start'])
+        end_time = parse_google_time(item['end'])
+        rule, exdates = parse_recurrence(item.get('recurrence'))
+        if rule:
+            try:
+                rule = validate_rule(rule, start_time)
+            except ValueError:
+                # Keep series with rules we can't expand as their first instance
+                rule, exdates = None, None
+        if rule and row is not None and row.rrule:
+            # Keep instances cancelled through exceptions excluded
+            exdates = format_exdates(parse_exdates(row.exdates) | parse_exdates(exdates))
+        if row is None:
+            row = self.Event(user_id=user_id, title=title, start_time=start_time,
+                             end_time=end_time, google_id=item['id'])
+            row.set_recurrence(rule, exdates)
+            self.db.session.add(row)
+            # Instances later in the page may refer to this series
+            rows[item['id']] = row
+            stats['inserted'] += 1
+        elif (row.title, row.start_time, row.end_time, row.rrule, row.exdates) != (title, start_time, end_time,
+                                                                                    rule, exdates):
+            row.title, row.start_time, row.end_time = title, start_time, end_time
+            row.set_recurrence(rule, exdates)
+            stats['updated'] += 1
@@ -0,0 +1,143 @@
+"""Per-user store of generated ICS files, addressed by what they contain.
+
+An artifact's name is the SHA-256 of the events it was written from, so
+the same events never get serialized twice and the name doubles as a
+strong ETag. Files live in one directory per user and are written to a
+temporary file first, so readers never see half a calendar.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from ics_stream import write_calendar
+
+STORE_PATH = os.getenv('ICS_STORE_PATH', 'ics_artifacts')
+STORE_MAX_AGE = int(os.getenv('ICS_STORE_MAX_AGE', str(7 * 24 * 3600)))
+STORE_MAX_BYTES = int(os.getenv('ICS_STORE_MAX_BYTES', str(256 * 2 ** 20)))
+DIGEST = re.compile(r'^[0-9a-f]{64}$')
+SUFFIX = '.ics'
+
+
+def fingerprint(events):
+    """SHA-256 of the event tuples, in order, as a hex string."""
+    digest = hashlib.sha256()
+    for event in events:
+        digest.update(json.dumps(event, default=str).encode())
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """ICS files on disk, one directory per user.
+
+    Events are the (uid, summary, start, end, rrule, exdates) tuples
+    write_calendar() takes. calendar() keeps the digest of each user's full
+    calendar in memory until invalidate(user_id), like ConflictIndex, so
+    an unchanged calendar is served without reading its events again; given
+    the user's version (see event_versions), a digest kept from an older
+    one is worked out again, so writes by other processes aren't missed.
+    Artifacts older than max_age seconds are evicted, then the oldest ones
+    until the store is under max_bytes; this runs whenever one is written.
+    """
+
+    def __init__(self, root=STORE_PATH, max_age=STORE_MAX_AGE, max_bytes=STORE_MAX_BYTES):
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.current = {}
+        self.versions = {}
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def path(self, user_id, digest):
+        """The artifact's path, or None if digest isn't a valid name."""
+        if not DIGEST.match(digest):
+            return None
+        return os.path.join(self.root, str(int(user_id)), digest + SUFFIX)
+
+    def get(self, user_id, digest):
+        """The path of a stored artifact, or None if there is none."""
+        path = self.path(user_id, digest)
+        return path if path is not None and os.path.exists(path) else None
+
+    def put(self, user_id, events, digest=None):
+        """Store the calendar of events unless it's already there; returns its digest.
+
+        events must be a list (or be given with its digest) since it is read
+        twice, once for the digest and once for the file.
+        """
+        if digest is None:
+            digest = fingerprint(events)
+        path = self.path(user_id, digest)
+        if os.path.exists(path):
+            return digest
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        handle, partial = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(handle)
+        try:
+            write_calendar(partial, events)
+            os.replace(partial, path)
+        except BaseException:
+            os.unlink(partial)
+            raise
+        with self.lock:
+            self.writes += 1
+        self.evict()
+        return digest
+
+    def calendar(self, user_id, load, version=None):
+        """Digest of the user's full calendar, writing it only if it changed.
+
+        load() yields the user's events; it is called to fingerprint them on
+        the first request after a change, and again if that calendar isn't
+        stored yet. version is the user's version read before load() is.
+        """
+        with self.lock:
+            digest = self.current.get(user_id)
+            if self.versions.get(user_id) != version:
+                digest = None
+        if digest is None or self.get(user_id, digest) is None:
+            digest = fingerprint(load())
+            self.put(user_id, load(), digest)
+            with self.lock:
+                self.current[user_id] = digest
+                self.versions[user_id] = version
+        return digest
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.current.clear()
+            else:
+                self.current.pop(user_id, None)
+
+    def evict(self, now=None):
+        """Delete expired artifacts, then the oldest until under max_bytes."""
+        now = time.time() if now is None else now
+        files = []
+        with os.scandir(self.root) as users:
+            for user in users:
+                if not user.is_dir():
+                    continue
+                with os.scandir(user.path) as entries:
+                    for entry in entries:
+                        stat = entry.stat()
+                        # A .tmp is a write in progress unless it was abandoned long ago
+                        if entry.name.endswith('.tmp') and now - stat.st_mtime < 3600:
+                            continue
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for modified, size, path in files:
+            if (not self.max_age or now - modified <= self.max_age) and total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
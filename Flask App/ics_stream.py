@@ -0,0 +1,109 @@
+import re
+import uuid
+from datetime import datetime, timezone
+
+from recurrence import recurrence_lines
+
+PRODID = '-//MayDay//Smart Calendar//EN'
+CRLF = '\r\n'
+MAX_LINE_OCTETS = 75
+NEEDS_ESCAPE = re.compile(r'[\\;,\r\n]')
+
+
+def escape_text(value):
+    """Escape a TEXT property value (RFC 5545 section 3.3.11)."""
+    if not NEEDS_ESCAPE.search(value):
+        return value
+    return (value.replace('\\', '\\\\')
+                 .replace(';', '\\;')
+                 .replace(',', '\\,')
+                 .replace('\r\n', '\\n')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\n'))
+
+
+def fold(line):
+    """Fold a content line to 75 octets, never splitting a UTF-8 character."""
+    if line.isascii():
+        if len(line) <= MAX_LINE_OCTETS:
+            return line + CRLF
+        # Continuation lines start with a space, which counts towards the limit
+        parts = [line[:MAX_LINE_OCTETS]]
+        parts.extend(' ' + line[i:i + MAX_LINE_OCTETS - 1]
+                     for i in range(MAX_LINE_OCTETS, len(line), MAX_LINE_OCTETS - 1))
+        return CRLF.join(parts) + CRLF
+
+    parts = []
+    current = []
+    size = 0
+    for char in line:
+        octets = len(char.encode('utf-8'))
+        if size + octets > MAX_LINE_OCTETS:
+            parts.append(''.join(current))
+            current = [' ']
+            size = 1
+        current.append(char)
+        size += octets
+    parts.append(''.join(current))
+    return CRLF.join(parts) + CRLF
+
+
+def format_datetime(moment):
+    """Format a datetime as UTC; naive datetimes are taken to be UTC already."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime('%Y%m%dT%H%M%SZ')
+
+
+def serialize_event(uid, summary, start, end, stamp, description=None, rrule=None, exdates=None):
+    """Return one VEVENT as folded, CRLF-terminated text."""
+    lines = [
+        'BEGIN:VEVENT' + CRLF,
+        fold('UID:' + escape_text(uid)),
+        'DTSTAMP:' + stamp + CRLF,
+        'DTSTART:' + format_datetime(start) + CRLF,
+        'DTEND:' + format_datetime(end) + CRLF,
+        fold('SUMMARY:' + escape_text(summary)),
+    ]
+    if description:
+        lines.append(fold('DESCRIPTION:' + escape_text(description)))
+    lines.extend(fold(line) for line in recurrence_lines(rrule, exdates))
+    lines.append('END:VEVENT' + CRLF)
+    return ''.join(lines)
+
+
+def iter_calendar(events, prodid=PRODID):
+    """Yield a VCALENDAR chunk by chunk.
+
+    events yields (uid, summary, start, end) tuples, optionally followed by
+    an RRULE and exdates for a recurring event; uid may be None for a
+    random one. Nothing but the current event is held in memory, so this
+    can stream straight from a database cursor.
+    """
+    stamp = format_datetime(datetime.now(timezone.utc))
+    yield f'BEGIN:VCALENDAR{CRLF}VERSION:2.0{CRLF}' + fold('PRODID:' + prodid)
+    for uid, summary, start, end, *recurrence in events:
+        yield serialize_event(uid or f'{uuid.uuid4()}@mayday', summary, start, end, stamp, None, *recurrence)
+    yield 'END:VCALENDAR' + CRLF
+
+
+def chunked(pieces, size=64 * 1024):
+    """Join small string pieces into chunks of roughly size characters."""
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def write_calendar(filename, events):
+    """Stream a VCALENDAR into a file."""
+    # newline='' keeps the CRLF line endings RFC 5545 requires
+    with open(filename, 'w', encoding='utf-8', newline='') as f:
+        f.writelines(iter_calendar(events))
@@ -0,0 +1,312 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'jobs.db')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', '2.0'))
+# Jobs of one user that may run at the same time, and wait in the queue
+MAX_RUNNING_PER_USER = int(os.getenv('JOB_MAX_RUNNING_PER_USER', '1'))
+MAX_QUEUED_PER_USER = int(os.getenv('JOB_MAX_QUEUED_PER_USER', '10'))
+# Finished jobs are kept this long so clients can still poll them
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', str(24 * 3600)))
+# Running jobs older than this are taken to belong to a worker that died
+STALE_AFTER = int(os.getenv('JOB_STALE_AFTER', '900'))
+POLL_INTERVAL = 1.0
+
+STATUSES = ('queued', 'running', 'done', 'failed')
+
+
+class QueueFull(Exception):
+    """The user already has as many jobs waiting as they may."""
+
+
+class JobQueue:
+    """Durable job queue in a SQLite file, so no external broker is needed.
+
+    Jobs move from queued to running to done or failed. A job whose handler
+    raises is put back with exponential backoff until it has used up
+    max_attempts. claim() skips users who already have max_running jobs
+    running, which caps per-user concurrency across every worker, including
+    workers in other processes sharing the file. A job that is tried again
+    loses the progress events of its failed attempt, with a 'retry' event in
+    their place, so clients replaying them never see a plan twice.
+    """
+
+    def __init__(self, path=QUEUE_PATH, max_running_per_user=MAX_RUNNING_PER_USER,
+                 max_queued_per_user=MAX_QUEUED_PER_USER, backoff=RETRY_BACKOFF):
+        self.path = path
+        self.max_running_per_user = max_running_per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.backoff = backoff
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        # Notified when a job in this process reports progress or finishes
+        self.progressed = threading.Condition(self.lock)
+        # Autocommit; claim() opens its own write transaction
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' kind TEXT NOT NULL,'
+            ' user_id INTEGER,'
+            ' payload TEXT NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' max_attempts INTEGER NOT NULL,'
+            ' result TEXT,'
+            ' error TEXT,'
+            ' created_at REAL NOT NULL,'
+            ' available_at REAL NOT NULL,'
+            ' started_at REAL,'
+            ' finished_at REAL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user_id, status)')
+        # Progress a running job reports, e.g. for Server-Sent Events
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS job_events ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' job_id INTEGER NOT NULL,'
+            ' kind TEXT NOT NULL,'
+            ' data TEXT NOT NULL,'
+            ' created_at REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq)')
+
+    def enqueue(self, kind, payload, user_id=None, max_attempts=MAX_ATTEMPTS):
+        """Add a job and return its id; raises QueueFull past the per-user limit."""
+        now = time.time()
+        with self.lock:
+            if user_id is not None and self.max_queued_per_user:
+                waiting = self.conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+                    (user_id,)).fetchone()[0]
+                if waiting >= self.max_queued_per_user:
+                    raise QueueFull(f'User {user_id} already has {waiting} jobs pending')
+            cursor = self.conn.execute(
+                'INSERT INTO jobs (kind, user_id, payload, status, max_attempts, created_at, available_at)'
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (kind, user_id, json.dumps(payload), max_attempts, now, now))
+            self.available.notify()
+            return cursor.lastrowid
+
+    def claim(self):
+        """Mark the oldest runnable job as running and return it, or None."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' AND available_at <= ?"
+                    ' AND (user_id IS NULL OR user_id NOT IN ('
+                    "  SELECT user_id FROM jobs WHERE status = 'running' AND user_id IS NOT NULL"
+                    '  GROUP BY user_id HAVING COUNT(*) >= ?))'
+                    ' ORDER BY available_at, id LIMIT 1',
+                    (now, self.max_running_per_user or 2 ** 31)).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?"
+                        ' WHERE id = ?', (now, row[0]))
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return self.get(row[0]) if row is not None else None
+
+    def complete(self, job_id, result):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id))
+            # A user's next job may be runnable now
+            self.available.notify()
+            self.progressed.notify_all()
+
+    def fail(self, job_id, error):
+        """Requeue the job with backoff, or mark it failed after its last attempt."""
+        now = time.time()
+        with self.lock:
+            attempts, max_attempts = self.conn.execute(
+                'SELECT attempts, max_attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if attempts < max_attempts:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, available_at = ? WHERE id = ?",
+                    (error, now + self.backoff * 2 ** (attempts - 1), job_id))
+                self._retry(job_id, attempts, now)
+            else:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    (error, now, job_id))
+            self.available.notify()
+            self.progressed.notify_all()
+
+    def _retry(self, job_id, attempts, now):
+        """Drop the progress of a failed attempt, since the next one reports it again."""
+        # Earlier 'retry' events stay, so a client that missed them still sees how many there were
+        self.conn.execute("DELETE FROM job_events WHERE job_id = ? AND kind != 'retry'", (job_id,))
+        self._publish(job_id, 'retry', {'attempts': attempts}, now)
+
+    def publish(self, job_id, kind, data):
+        """Record a progress event for a job."""
+        with self.lock:
+            self._publish(job_id, kind, data, time.time())
+            self.progressed.notify_all()
+
+    def _publish(self, job_id, kind, data, now):
+        self.conn.execute('INSERT INTO job_events (job_id, kind, data, created_at) VALUES (?, ?, ?, ?)',
+                          (job_id, kind, json.dumps(data), now))
+
+    def events(self, job_id, after=0):
+        """Return (seq, kind, data) for a job's events after seq, oldest first."""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT seq, kind, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq',
+                (job_id, after)).fetchall()
+        return [(seq, kind, json.loads(data)) for seq, kind, data in rows]
+
+    def get(self, job_id):
+        """Return a job as a dict, or None if there is no such job."""
+        with self.lock:
+            cursor = self.conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([column[0] for column in cursor.description], row))
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def requeue_stale(self, stale_after=STALE_AFTER):
+        """Put jobs that have been running for too long back in the queue."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                stale = self.conn.execute(
+                    "SELECT id, attempts FROM jobs WHERE status = 'running' AND started_at < ?",
+                    (now - stale_after,)).fetchall()
+                for job_id, attempts in stale:
+                    self.conn.execute("UPDATE jobs SET status = 'queued', available_at = ? WHERE id = ?",
+                                      (now, job_id))
+                    self._retry(job_id, attempts, now)
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            return len(stale)
+
+    def prune(self, retention=JOB_RETENTION):
+        """Delete finished jobs older than retention seconds."""
+        with self.lock:
+            pruned = self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - retention,)).rowcount
+            if pruned:
+                self.conn.execute('DELETE FROM job_events WHERE job_id NOT IN (SELECT id FROM jobs)')
+            return pruned
+
+    def metrics(self):
+        """Queue depth and job counts by status."""
+        now = time.time()
+        with self.lock:
+            counts = dict(self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+            oldest = self.conn.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            users = self.conn.execute(
+                "SELECT COUNT(DISTINCT user_id) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            retried = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE attempts > 1").fetchone()[0]
+        metrics = {status: counts.get(status, 0) for status in STATUSES}
+        metrics['depth'] = metrics['queued']
+        metrics['oldest_queued_seconds'] = now - oldest if oldest is not None else 0.0
+        metrics['active_users'] = users
+        metrics['retried'] = retried
+        return metrics
+
+    def wait(self, timeout):
+        """Block until something may have become runnable, or timeout passes."""
+        with self.lock:
+            self.available.wait(timeout)
+
+    def wait_for_progress(self, timeout):
+        """Block until a job reports progress or finishes, or timeout passes.
+
+        Only jobs run by this process wake it early; those of workers in
+        other processes are seen when the timeout is up.
+        """
+        with self.lock:
+            self.progressed.wait(timeout)
+
+
+class WorkerPool:
+    """Threads that claim jobs from a JobQueue and run their handlers.
+
+    handlers maps a job kind to a function taking the payload and a
+    progress(kind, data) callback, and returning a JSON-serializable result.
+    An exception counts as a failed attempt.
+    context, if given, is a factory for a context manager each job runs in
+    (for example app.app_context).
+    """
+
+    def __init__(self, queue, handlers, workers=JOB_WORKERS, context=None, poll_interval=POLL_INTERVAL):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.context = context
+        self.poll_interval = poll_interval
+        self.threads = []
+        self.stopping = threading.Event()
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads once; later calls do nothing."""
+        with self.start_lock:
+            if self.threads or not self.workers:
+                return
+            self.queue.requeue_stale()
+            self.queue.prune()
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'job-worker-{number}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        with self.queue.lock:
+            self.queue.available.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+        self.stopping.clear()
+
+    def run_one(self):
+        """Claim and run a single job; returns False if none was runnable."""
+        job = self.queue.claim()
+        if job is None:
+            return False
+        handler = self.handlers.get(job['kind'])
+        progress = lambda kind, data: self.queue.publish(job['id'], kind, data)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {job['kind']}")
+            if self.context is not None:
+                with self.context():
+                    result = handler(job['payload'], progress)
+            else:
+                result = handler(job['payload'], progress)
+        except Exception as e:
+            print(f"Error: job {job['id']} ({job['kind']}) attempt {job['attempts']} failed: {str(e)}")
+            self.queue.fail(job['id'], str(e))
+        else:
+            self.queue.complete(job['id'], result)
+        return True
+
+    def _run(self):
+        while not self.stopping.is_set():
+            if not self.run_one():
+                self.queue.wait(self.poll_interval)
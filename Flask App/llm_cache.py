@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'llm_cache.db')
+CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))
+
+
+def cache_disabled():
+    """True when LLM_CACHE_BYPASS is set to a truthy value."""
+    return os.getenv('LLM_CACHE_BYPASS', '').lower() in ('1', 'true', 'yes')
+
+
+def normalize_prompt(text):
+    """Fold case, punctuation and whitespace so near-identical prompts share a key."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+class LLMCache:
+    """Disk-backed cache for parsed LLM answers.
+
+    Entries are keyed on model, temperature, system prompt and the normalized
+    user prompt. Values are any JSON-serializable object; callers store the
+    parsed, date-independent plan rather than the raw completion so cached
+    answers stay valid as "now" moves on. Entries expire after ttl seconds and
+    the least recently used ones are evicted beyond max_entries.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_used REAL NOT NULL,'
+            ' hits INTEGER NOT NULL DEFAULT 0)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)')
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model, temperature, system, prompt):
+        raw = json.dumps([model, temperature, system, normalize_prompt(prompt)])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, model, temperature, system, prompt):
+        """Return the cached value, or None on a miss."""
+        key = self.make_key(model, temperature, system, prompt)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT value, created_at FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    self.conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute(
+                'UPDATE llm_cache SET last_used = ?, hits = hits + 1 WHERE key = ?', (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, model, temperature, system, prompt, value):
+        key = self.make_key(model, temperature, system, prompt)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now, now))
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        if self.ttl:
+            self.conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl,))
+        count = self.conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                'DELETE FROM llm_cache WHERE key IN ('
+                ' SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)',
+                (count - self.max_entries,))
+
+    def cached(self, model, temperature, system, prompt, compute, bypass=False):
+        """Return the cached value or compute and store it.
+
+        compute() returns the value to cache, or None if it should not be
+        cached (for example an unparseable response). With bypass set (or
+        LLM_CACHE_BYPASS in the environment) the cache is neither read nor
+        written.
+        """
+        if bypass or cache_disabled():
+            return compute()
+        value = self.get(model, temperature, system, prompt)
+        if value is not None:
+            return value
+        value = compute()
+        if value is not None:
+            self.set(model, temperature, system, prompt, value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM llm_cache')
+            self.conn.commit()
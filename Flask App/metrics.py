@@ -0,0 +1,189 @@
+"""Request, job and span timings, exposed in the Prometheus text format.
+
+A span times one slow step (the LLM call, SQLite, writing ICS, Google
+inserts) into a histogram labelled with the span's name, and also adds it
+to the breakdown of the request or job it ran in, so a slow request can be
+logged with where its time went.
+"""
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a SQLite query up to a slow LLM answer
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Requests and jobs slower than this are printed with their breakdown; 0 turns the log off
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '0'))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Span name -> [seconds, count] for the request or job running in this context
+_breakdown = contextvars.ContextVar('breakdown', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """A Prometheus histogram with a fixed set of label names."""
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Label values -> per-bucket counts (the last one is +Inf), sum
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            snapshot = sorted((values, list(counts), total) for values, (counts, total) in self.series.items())
+        for values, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _label_text(self.labels, values, f'le="{_number(bound)}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _label_text(self.labels, values)
+            lines.append(f'{self.name}_sum{labels} {_number(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """A gauge read when metrics are collected.
+
+    collect() returns {label values tuple: value}; with no labels, the key
+    is (). kind='counter' exposes values that only ever go up, such as
+    counts kept elsewhere, as a counter.
+    """
+
+    def __init__(self, name, help, labels, collect, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for values, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{_label_text(self.labels, values)} {_number(value)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One broken collector shouldn't take the whole scrape down
+                print(f"Error: {str(e)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+REQUEST_SECONDS = registry.register(Histogram('http_request_duration_seconds', 'Time to handle a request.',
+                                              ('method', 'route', 'status')))
+JOB_SECONDS = registry.register(Histogram('job_duration_seconds', 'Time to run a background job.',
+                                          ('kind', 'outcome')))
+SPAN_SECONDS = registry.register(Histogram('span_duration_seconds', 'Time spent in one step of a request or job.',
+                                           ('span',)))
+UPSTREAM_SECONDS = registry.register(Histogram('upstream_request_duration_seconds',
+                                               'Time of one attempt at a call to OpenAI or Google.',
+                                               ('upstream', 'outcome')))
+
+
+def record(name, seconds):
+    """Add a finished span to its histogram and to the current breakdown."""
+    SPAN_SECONDS.observe(seconds, name)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        total = breakdown.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as the span name."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def start_breakdown():
+    """Start collecting spans for a request or job; returns a token for finish_breakdown()."""
+    return _breakdown.set({})
+
+
+def finish_breakdown(token):
+    """Stop collecting spans and return {span: (seconds, count)}."""
+    breakdown = _breakdown.get() or {}
+    _breakdown.reset(token)
+    return {name: tuple(total) for name, total in breakdown.items()}
+
+
+def format_breakdown(breakdown):
+    return ', '.join(f'{name} {seconds * 1e3:.1f}ms x{count}'
+                     for name, (seconds, count) in sorted(breakdown.items(), key=lambda item: -item[1][0]))
+
+
+def is_slow(seconds):
+    return SLOW_REQUEST_SECONDS > 0 and seconds >= SLOW_REQUEST_SECONDS
+
+
+def timed_job(kind, handler):
+    """Wrap a job handler so its runs are timed and slow ones logged."""
+    def run(payload, progress):
+        token = start_breakdown()
+        started = time.perf_counter()
+        outcome = 'failed'
+        try:
+            result = handler(payload, progress)
+            outcome = 'done'
+            return result
+        finally:
+            seconds = time.perf_counter() - started
+            breakdown = finish_breakdown(token)
+            JOB_SECONDS.observe(seconds, kind, outcome)
+            if is_slow(seconds):
+                print(f"Slow job: {kind} {outcome} in {seconds * 1e3:.0f}ms ({format_breakdown(breakdown)})")
+    return run
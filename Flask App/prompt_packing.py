@@ -0,0 +1,138 @@
+"""Schedule many tasks in one chat completion instead of one request each.
+
+Every request repeats the system prompt and pays a round trip, so tasks
+are packed into as few requests as a token budget allows. The model answers
+each task under its number, and the answer is split back into one schedule
+per task in the same format a single-task request returns, so callers parse
+and cache it exactly as before. A batch whose answer comes back truncated
+or missing tasks is retried in halves.
+"""
+import json
+import os
+import re
+import time
+
+from schedule_parser import load_json_object, looks_like_json
+
+# Prompt plus completion must fit in the model's context window
+PACK_TOKEN_BUDGET = int(os.getenv('OPENAI_PACK_TOKEN_BUDGET', '12000'))
+# The most completion tokens one request may ask for
+MAX_COMPLETION_TOKENS = int(os.getenv('OPENAI_MAX_COMPLETION_TOKENS', '4096'))
+# Rough ratio for English text; no tokenizer is needed for budgeting
+CHARS_PER_TOKEN = 4
+# Numbering and line break added per packed task
+TASK_OVERHEAD_TOKENS = 4
+
+PACKED_JSON_FORMAT = ('Schedule each of the numbered tasks below separately. Respond with a JSON object only, '
+                      'of the form {"schedules": [...]}, holding one schedule object per task, as described in '
+                      'your instructions, each with an extra "task" key set to the task\'s number.')
+PACKED_TEXT_FORMAT = ('Schedule each of the numbered tasks below separately. Start each task\'s schedule with a '
+                      'line "### Task N", where N is the task\'s number, followed by its schedule in the usual '
+                      'format.')
+TASK_HEADER = re.compile(r'^[\s#*]*task\s+(\d+)\b[^\n]*$', re.IGNORECASE | re.MULTILINE)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack(prompts, overhead_tokens, output_tokens, budget=PACK_TOKEN_BUDGET, max_completion=MAX_COMPLETION_TOKENS):
+    """Group prompt indexes into batches that fit the token budget.
+
+    overhead_tokens is what every request costs regardless of its tasks
+    (the system prompt and instructions), output_tokens the completion
+    allowance per task. Order is kept; a task too large for any batch gets
+    a request of its own.
+    """
+    batches = []
+    batch = []
+    used = overhead_tokens
+    for index, prompt in enumerate(prompts):
+        cost = estimate_tokens(prompt) + TASK_OVERHEAD_TOKENS + output_tokens
+        if batch and (used + cost > budget or (len(batch) + 1) * output_tokens > max_completion):
+            batches.append(batch)
+            batch = []
+            used = overhead_tokens
+        batch.append(index)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def packed_prompt(prompts, json_output):
+    """The user message asking for every prompt in one answer."""
+    lines = [PACKED_JSON_FORMAT if json_output else PACKED_TEXT_FORMAT, '']
+    lines.extend(f'{number}. {prompt}' for number, prompt in enumerate(prompts, 1))
+    return '\n'.join(lines)
+
+
+def split_response(text, count):
+    """Split a packed answer into count per-task answers; missing ones are None."""
+    answers = [None] * count
+    if looks_like_json(text):
+        data = load_json_object(text)
+        schedules = data.get('schedules') if data is not None else None
+        if not isinstance(schedules, list):
+            return answers
+        for position, schedule in enumerate(schedules):
+            if not isinstance(schedule, dict):
+                continue
+            try:
+                index = int(schedule.pop('task', position + 1)) - 1
+            except (TypeError, ValueError):
+                index = position
+            if 0 <= index < count and answers[index] is None:
+                answers[index] = json.dumps(schedule)
+        return answers
+    headers = list(TASK_HEADER.finditer(text))
+    for header, following in zip(headers, headers[1:] + [None]):
+        index = int(header.group(1)) - 1
+        body = text[header.end():following.start() if following else len(text)].strip()
+        if 0 <= index < count and answers[index] is None and body:
+            answers[index] = body
+    return answers
+
+
+def request_packed(prompts, complete, json_output, output_tokens, accept=None):
+    """Answer every prompt with as few complete() calls as possible.
+
+    complete(user_message, max_tokens) sends one request and returns
+    (text, usage, truncated), usage being the API's token counts. accept,
+    if given, decides whether a per-task answer is usable. Answers missing
+    from a truncated or partial reply are asked for again in two halves,
+    down to one task per request. Returns (answers, report) where report
+    totals the requests, tokens and wall-clock seconds spent.
+    """
+    report = {'tasks': len(prompts), 'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+              'total_tokens': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+    answers = _request(prompts, complete, json_output, output_tokens, accept, report)
+    report['seconds'] = time.perf_counter() - started
+    return answers, report
+
+
+def _request(prompts, complete, json_output, output_tokens, accept, report):
+    text, usage, truncated = complete(packed_prompt(prompts, json_output), output_tokens * len(prompts))
+    report['requests'] += 1
+    for key in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+        report[key] += (usage or {}).get(key, 0)
+    answers = split_response(text or '', len(prompts))
+    if accept is not None:
+        answers = [answer if answer is not None and accept(answer) else None for answer in answers]
+    if truncated and len(prompts) > 1:
+        # The answer cut off by max_tokens may parse but be missing sessions
+        answered = [index for index, answer in enumerate(answers) if answer is not None]
+        if answered:
+            answers[answered[-1]] = None
+    missing = [index for index, answer in enumerate(answers) if answer is None]
+    if not missing or len(prompts) == 1:
+        return answers
+    # Halves, so a batch that overflowed max_tokens fits on the next try
+    middle = len(missing) // 2
+    groups = [missing[:middle], missing[middle:]] if middle else [missing]
+    for group in groups:
+        for index, answer in zip(group, _request([prompts[i] for i in group], complete, json_output,
+                                                 output_tokens, accept, report)):
+            answers[index] = answer
+    return answers
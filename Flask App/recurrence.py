@@ -0,0 +1,189 @@
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from dateutil.rrule import MINUTELY, SECONDLY, rrulestr
+
+EXPANSION_CACHE_SIZE = 4096
+# Upper bound for series created from forms and plans
+MAX_OCCURRENCES = 366
+# Largest COUNT accepted from clients and imports, a weekly series of about twenty years
+MAX_COUNT = 1000
+EXDATE_FORMAT = '%Y%m%dT%H%M%S'
+# UNTIL in UTC, as Google and most .ics files write it
+UTC_UNTIL = re.compile(r'(UNTIL=\d{8}T\d{6})Z', re.IGNORECASE)
+
+
+class Occurrence:
+    """One expanded instance of a recurring Event.
+
+    Duck-types the parts of Event the templates and JSON API use. id is the
+    series' id, so (start_time, id) stays a unique sort key for paging.
+    """
+
+    __slots__ = ('id', 'title', 'start_time', 'end_time')
+
+    def __init__(self, series, start_time):
+        self.id = series.id
+        self.title = series.title
+        self.start_time = start_time
+        self.end_time = start_time + (series.end_time - series.start_time)
+
+    @property
+    def series_id(self):
+        return self.id
+
+    def to_dict(self):
+        return {'id': self.id,
+                'title': self.title,
+                'start_time': self.start_time.isoformat(),
+                'end_time': self.end_time.isoformat(),
+                'series_id': self.id}
+
+
+@lru_cache(maxsize=256)
+def parse_rule(rule, dtstart):
+    """Parse an RRULE value (without the 'RRULE:' prefix); raises ValueError."""
+    try:
+        return rrulestr(rule, dtstart=dtstart)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid RRULE {rule!r}: {e}') from None
+
+
+def validate_rule(rule, dtstart):
+    """Return the normalized rule if it parses, raising ValueError otherwise.
+
+    Event times are stored as naive UTC, and dateutil won't compare a UTC
+    UNTIL with a naive start, so UNTIL loses its 'Z' (its value is UTC already).
+    Rules come from clients and imported files, so ones that would take long
+    to step through (more often than hourly, or a COUNT above MAX_COUNT)
+    are refused too.
+    """
+    rule = rule.strip()
+    if rule.upper().startswith('RRULE:'):
+        rule = rule[6:]
+    rule = UTC_UNTIL.sub(r'\1', rule)
+    parsed = parse_rule(rule, dtstart)
+    if parsed._freq in (SECONDLY, MINUTELY):
+        raise ValueError(f'Invalid RRULE {rule!r}: repeats more often than hourly')
+    if parsed._count is not None and parsed._count > MAX_COUNT:
+        raise ValueError(f'Invalid RRULE {rule!r}: COUNT is over {MAX_COUNT}')
+    return rule
+
+
+def parse_exdates(value):
+    """Parse the comma-separated exdates column into a frozenset of datetimes."""
+    if not value:
+        return frozenset()
+    return frozenset(datetime.strptime(part, EXDATE_FORMAT) for part in value.split(','))
+
+
+def format_exdates(moments):
+    return ','.join(sorted(moment.strftime(EXDATE_FORMAT) for moment in moments)) or None
+
+
+def add_exdate(value, moment):
+    """Return the exdates column with moment excluded as well."""
+    return format_exdates(parse_exdates(value) | {moment})
+
+
+@lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def expand(rule, dtstart, exdates, window_start, window_end=None, limit=None):
+    """Return the starts of a series' occurrences in [window_start, window_end).
+
+    At least one of window_end and limit bounds the result. Results are
+    memoized per series and window, and the arguments include the rule and
+    exclusions, so editing a series never serves a stale expansion.
+    """
+    if window_end is None and limit is None:
+        raise ValueError('expand() needs a window_end or a limit')
+    excluded = parse_exdates(exdates)
+    starts = []
+    for start in parse_rule(rule, dtstart).xafter(window_start, inc=True):
+        if window_end is not None and start >= window_end:
+            break
+        if start in excluded:
+            continue
+        starts.append(start)
+        if limit is not None and len(starts) >= limit:
+            break
+    return tuple(starts)
+
+
+def occurrences(series, window_start, window_end=None, limit=None):
+    """Return Occurrence objects of series starting in [window_start, window_end)."""
+    starts = expand(series.rrule, series.start_time, series.exdates, window_start, window_end, limit)
+    return [Occurrence(series, start) for start in starts]
+
+
+def overlapping(series, start, end):
+    """Return (start, end, id) for occurrences of series overlapping [start, end)."""
+    duration = series.end_time - series.start_time
+    # Occurrences starting up to one duration before the window still overlap it
+    starts = expand(series.rrule, series.start_time, series.exdates, start - duration + timedelta(microseconds=1), end)
+    return [(begin, begin + duration, series.id) for begin in starts]
+
+
+def series_end(rule, dtstart, duration):
+    """Return when the last occurrence ends, or None for an unbounded series.
+
+    A series bounded by UNTIL is taken to end a duration after it, which may
+    be later than its last occurrence but never earlier, without stepping
+    through the occurrences; only a (capped) COUNT is counted out.
+    """
+    parsed = parse_rule(rule, dtstart)
+    if parsed._until is not None:
+        return max(parsed._until, dtstart) + duration
+    if parsed._count is None:
+        return None
+    last = None
+    for last in parsed:
+        pass
+    return (last or dtstart) + duration
+
+
+def recurrence_lines(rule, exdates):
+    """RRULE/EXDATE lines for a Google Calendar 'recurrence' field or a VEVENT."""
+    if not rule:
+        return []
+    lines = ['RRULE:' + rule]
+    if exdates:
+        lines.append('EXDATE:' + ','.join(moment.strftime(EXDATE_FORMAT) + 'Z'
+                                          for moment in sorted(parse_exdates(exdates))))
+    return lines
+
+
+def compact(events):
+    """Fold evenly spaced repeats into daily series.
+
+    events is an iterable of (title, start, end). Sessions that share a
+    title, time of day and duration and follow each other at a constant
+    whole-day interval become one (title, start, end, rule) entry; the rest
+    come back with rule None. Output is ordered by start.
+    """
+    groups = {}
+    for title, start, end in events:
+        groups.setdefault((title, start.time(), end - start), []).append(start)
+
+    series = []
+    for (title, _, duration), starts in groups.items():
+        starts.sort()
+        run = [starts[0]]
+        for start in starts[1:]:
+            gap = start - run[-1]
+            if gap.days and gap == timedelta(days=gap.days) and (len(run) == 1 or gap == run[1] - run[0]):
+                run.append(start)
+            else:
+                series.append(_series_entry(title, run, duration))
+                run = [start]
+        series.append(_series_entry(title, run, duration))
+    series.sort(key=lambda entry: entry[1])
+    return series
+
+
+def _series_entry(title, run, duration):
+    if len(run) == 1:
+        return title, run[0], run[0] + duration, None
+    interval = (run[1] - run[0]).days
+    rule = f'FREQ=DAILY;COUNT={len(run)}' + (f';INTERVAL={interval}' if interval > 1 else '')
+    return title, run[0], run[0] + duration, rule
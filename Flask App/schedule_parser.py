@@ -0,0 +1,315 @@
+"""Parsing of the LLM's scheduling answers, shared by the app and prototypes.
+
+Two answer shapes exist: the web app's plan (a session duration and count)
+and the prototypes' day-by-day schedule. Each comes either as a JSON object
+(when the model is asked for structured output) or in the legacy text
+format. Text is parsed in a single pass with one compiled pattern per line
+kind, and both parsers also work incrementally on streamed lines.
+"""
+import json
+import os
+import re
+from datetime import time
+from typing import List, NamedTuple
+
+RESPONSE_FORMAT = os.getenv('LLM_RESPONSE_FORMAT', 'json')
+
+PLAN_TEXT_PROMPT = ("You are a scheduling assistant. Estimate how long each session of the following event should "
+                    "take and how many separate sessions it needs. Respond in the format: 'Duration: N hours' "
+                    "(or minutes) on one line and 'Sessions: N' on the next.")
+PLAN_JSON_PROMPT = ("You are a scheduling assistant. Estimate how long each session of the following event should "
+                    "take and how many separate sessions it needs. Respond with a JSON object only, of the form "
+                    '{"duration": <integer>, "unit": "hour" or "minute", "sessions": <integer>}.')
+SCHEDULE_JSON_FORMAT = ('Respond with a JSON object only, of the form {"multi_day": true or false, '
+                        '"analysis": "<brief analysis of the task>", "sessions": [{"name": "<task name>", '
+                        '"day": <day number, starting at 1>, "start": "HH:MM", "end": "HH:MM", '
+                        '"topic": "<focus of the session>"}]}.')
+
+
+class Plan(NamedTuple):
+    duration: int
+    unit: str
+    sessions: int
+
+
+class Session(NamedTuple):
+    name: str
+    day: int
+    start: time
+    end: time
+    topic: str = ''
+
+
+class Schedule(NamedTuple):
+    multi_day: bool
+    analysis: str
+    sessions: List[Session]
+
+
+def json_mode():
+    """True when answers should be requested as JSON objects."""
+    return RESPONSE_FORMAT.lower() == 'json'
+
+
+def response_format_kwargs():
+    """Extra chat completion arguments for the configured response format."""
+    return {'response_format': {'type': 'json_object'}} if json_mode() else {}
+
+
+
+SCHEDULE_LINE = re.compile(r"""
+    ^[\s*#>•-]*
+    (?:
+        (?P<answer>yes|no)\b
+      | (?P<analysis>task\ analysis)\s*:\s*(?P<analysis_text>.*)
+      | (?P<plan>scheduling\ plan)\s*:
+      | day\s*:?\s*(?P<day>\d+)\b
+      | time\s*:\s*(?P<start>\d{1,2}:\d{2}\s*(?:[ap]\.?m\.?)?)\s*(?:-|–|—|to)\s*(?P<end>\d{1,2}:\d{2}\s*(?:[ap]\.?m\.?)?)
+      | topic(?:/activity)?\s*:\s*(?P<topic>.*)
+      | (?P<task>[^:]{1,120}?)\s*:\s*\S
+    )""", re.IGNORECASE | re.VERBOSE)
+CLOCK = re.compile(r'(\d{1,2}):(\d{2})\s*(?:([ap])\.?m\.?)?', re.IGNORECASE)
+UNITS = {'hour': 'hour', 'hours': 'hour', 'h': 'hour', 'hr': 'hour', 'hrs': 'hour',
+         'minute': 'minute', 'minutes': 'minute', 'min': 'minute', 'mins': 'minute', 'm': 'minute'}
+# Longest units first, so 'hours' isn't read as 'h'
+PLAN_DURATION = re.compile(r'duration.*?(\d+(?:\.\d+)?)\s*(%s)\b' % '|'.join(sorted(UNITS, key=len, reverse=True)),
+                           re.IGNORECASE)
+PLAN_SESSIONS = re.compile(r'sessions?\D*?(\d+)', re.IGNORECASE)
+
+
+def parse_clock(text):
+    """Parse 'HH:MM' (optionally with am/pm) into a time; raises ValueError."""
+    match = CLOCK.fullmatch(text.strip())
+    if not match:
+        raise ValueError(f'Bad time: {text!r}')
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if match.group(3):
+        if not 1 <= hour <= 12:
+            raise ValueError(f'Bad time: {text!r}')
+        hour = hour % 12 + (12 if match.group(3).lower() == 'p' else 0)
+    return time(hour, minute)
+
+
+def whole_duration(amount, unit):
+    """(duration, unit) with a whole duration: 1.5 hours become 90 minutes."""
+    if unit == 'hour' and amount != int(amount):
+        return round(amount * 60), 'minute'
+    return round(amount), unit
+
+
+def load_json_object(text):
+    """Return the JSON object in text (code fences allowed), or None."""
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1 or end < start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def looks_like_json(text):
+    stripped = text.lstrip()
+    if stripped.startswith('```'):
+        stripped = stripped.split('\n', 1)[-1].lstrip()
+    return stripped.startswith('{')
+
+
+class PlanParser:
+    """Incremental parser for 'Duration: N hours' / 'Sessions: N' answers.
+
+    feed() returns True once both lines have been seen, so callers can stop
+    reading a stream early. plan() returns the Plan, or None if no duration
+    was found.
+    """
+
+    def __init__(self, max_sessions):
+        self.max_sessions = max_sessions
+        self.duration = None
+        self.sessions = None
+
+    def feed(self, line):
+        # Both can be on one line ('Duration: 2 hours, Sessions: 3')
+        if self.duration is None:
+            match = PLAN_DURATION.search(line)
+            if match:
+                self.duration = whole_duration(float(match.group(1)), UNITS[match.group(2).lower()])
+        if self.sessions is None:
+            match = PLAN_SESSIONS.search(line)
+            if match:
+                self.sessions = max(1, min(int(match.group(1)), self.max_sessions))
+        return self.duration is not None and self.sessions is not None
+
+    def plan(self):
+        if self.duration is None or self.duration[0] <= 0:
+            return None
+        return Plan(self.duration[0], self.duration[1], self.sessions or 1)
+
+
+def parse_plan(text, max_sessions):
+    """Parse a plan answer in either format; returns a Plan or None."""
+    if not text:
+        return None
+    if looks_like_json(text):
+        data = load_json_object(text)
+        if data is None:
+            return None
+        try:
+            duration, unit = whole_duration(float(data['duration']), UNITS[str(data.get('unit', 'hour')).lower()])
+            sessions = int(data.get('sessions') or 1)
+        except (KeyError, OverflowError, TypeError, ValueError):
+            return None
+        if duration <= 0:
+            return None
+        return Plan(duration, unit, max(1, min(sessions, max_sessions)))
+    parser = PlanParser(max_sessions)
+    for line in text.splitlines():
+        if parser.feed(line):
+            break
+    return parser.plan()
+
+
+class SessionParser:
+    """Incremental parser for the legacy Day:/Time: schedule text.
+
+    feed() takes one line and returns a Session as soon as its Time: line
+    is complete, or None. A Topic: line that follows fills in the topic of
+    the sessions list, which schedule() returns once all lines are in.
+    """
+
+    def __init__(self):
+        self.multi_day = None
+        self.analysis = []
+        self.section = None
+        self.task = None
+        self.day = None
+        self.sessions = []
+
+    def feed(self, line):
+        line = line.strip().replace('**', '')
+        if not line:
+            return None
+        match = SCHEDULE_LINE.match(line)
+        if match is None:
+            if self.section == 'analysis':
+                self.analysis.append(line)
+            return None
+        kind = match.lastgroup
+        if kind == 'answer':
+            if self.multi_day is None:
+                self.multi_day = match.group('answer').lower() == 'yes'
+            elif self.section == 'analysis':
+                self.analysis.append(line)
+        elif kind in ('analysis', 'analysis_text'):
+            self.section = 'analysis'
+            if match.group('analysis_text'):
+                self.analysis.append(match.group('analysis_text'))
+        elif kind == 'plan':
+            self.section = 'plan'
+        elif self.section == 'analysis':
+            self.analysis.append(line)
+        elif kind == 'day':
+            self.day = int(match.group('day'))
+        elif kind == 'end':
+            if self.task and self.day:
+                try:
+                    session = Session(self.task, self.day, parse_clock(match.group('start')),
+                                      parse_clock(match.group('end')))
+                except ValueError:
+                    return None
+                if session.end > session.start:
+                    self.sessions.append(session)
+                    return session
+        elif kind == 'topic':
+            if self.sessions and not self.sessions[-1].topic:
+                self.sessions[-1] = self.sessions[-1]._replace(topic=match.group('topic').strip())
+        elif kind == 'task':
+            self.task = line.split(':', 1)[0].strip()
+        return None
+
+    def schedule(self):
+        if not self.sessions:
+            return None
+        multi_day = self.multi_day if self.multi_day is not None else len({s.day for s in self.sessions}) > 1
+        return Schedule(multi_day, '\n'.join(self.analysis).strip(), self.sessions)
+
+
+def session_from_json(item):
+    """Build a Session from one JSON session object, or None if it's invalid."""
+    try:
+        name = str(item.get('name') or item.get('task') or '').strip()
+        day = int(item.get('day', 1))
+        start, end = parse_clock(str(item['start'])), parse_clock(str(item['end']))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    if not name or day < 1 or end <= start:
+        return None
+    return Session(name, day, start, end, str(item.get('topic') or '').strip())
+
+
+def parse_schedule(text):
+    """Parse a day-by-day schedule answer in either format; returns a Schedule or None."""
+    if not text:
+        return None
+    if looks_like_json(text):
+        data = load_json_object(text)
+        if data is None or not isinstance(data.get('sessions'), list):
+            return None
+        sessions = [session for session in map(session_from_json, data['sessions']) if session is not None]
+        if not sessions:
+            return None
+        multi_day = data.get('multi_day')
+        if not isinstance(multi_day, bool):
+            multi_day = len({session.day for session in sessions}) > 1
+        return Schedule(multi_day, str(data.get('analysis') or '').strip(), sessions)
+    parser = SessionParser()
+    for line in text.splitlines():
+        parser.feed(line)
+    return parser.schedule()
+
+
+class JSONSessionStream:
+    """Pick complete session objects out of a streamed JSON schedule.
+
+    feed() takes raw text and returns the Sessions whose objects closed in
+    it. Only objects nested directly in the top-level object's arrays are
+    sessions, so the brace depth (outside strings) is all that is tracked.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.current = None
+
+    def feed(self, text):
+        sessions = []
+        for char in text or '':
+            if self.current is not None:
+                self.current.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+                if self.depth == 2:
+                    self.current = [char]
+            elif char == '}':
+                if self.depth == 2 and self.current is not None:
+                    try:
+                        session = session_from_json(json.loads(''.join(self.current)))
+                    except ValueError:
+                        session = None
+                    if session is not None:
+                        sessions.append(session)
+                    self.current = None
+                self.depth -= 1
+        return sessions
@@ -0,0 +1,74 @@
+from schedule_parser import JSONSessionStream, SessionParser
+
+
+def content_deltas(stream):
+    """Yield the text of each chunk of a streamed chat completion.
+
+    Handles the chunk objects of the openai>=1 client as well as the dicts
+    the older openai.ChatCompletion API streams.
+    """
+    for chunk in stream:
+        if isinstance(chunk, dict):
+            choices = chunk.get('choices') or [{}]
+            text = choices[0].get('delta', {}).get('content')
+        else:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+        if text:
+            yield text
+
+
+def iter_lines(deltas):
+    """Re-split streamed text into complete lines as soon as each one ends."""
+    buffer = ''
+    for text in deltas:
+        buffer += text
+        if '\n' not in buffer:
+            continue
+        *lines, buffer = buffer.split('\n')
+        yield from lines
+    if buffer:
+        yield buffer
+
+
+def stream_sessions(deltas, on_session):
+    """Parse a streamed schedule, calling on_session for each session as it completes.
+
+    The format is picked from the first non-blank text: JSON answers are
+    scanned for closed session objects, anything else goes line by line
+    through a SessionParser. Returns the full text, for callers that also
+    keep or cache it.
+    """
+    seen = []
+    feed = None
+    for text in deltas:
+        seen.append(text)
+        if feed is None:
+            head = ''.join(seen).lstrip()
+            # Wait until an opening code fence can be told apart
+            if '```'.startswith(head):
+                continue
+            feed = JSONSessionStream().feed if head.startswith(('{', '```')) else _line_feed()
+            text = ''.join(seen)
+        for session in feed(text):
+            on_session(session)
+    if feed is not None:
+        for session in feed(None):
+            on_session(session)
+    return ''.join(seen)
+
+
+def _line_feed():
+    """Return a feed(text) for the line format; feed(None) flushes the last line."""
+    parser = SessionParser()
+    buffer = ''
+
+    def feed(text):
+        nonlocal buffer
+        if text is None:
+            lines, buffer = [buffer], ''
+        else:
+            buffer += text
+            *lines, buffer = buffer.split('\n')
+        return [session for session in map(parser.feed, lines) if session is not None]
+
+    return feed
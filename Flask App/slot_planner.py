@@ -0,0 +1,112 @@
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+
+DAY_START = time(9, 0)
+DAY_END = time(21, 0)
+HORIZON_DAYS = 30
+GRANULARITY = timedelta(minutes=15)
+
+STRATEGIES = ('earliest', 'balanced')
+
+
+def round_up(moment, granularity=GRANULARITY):
+    """Round a datetime up to the next multiple of granularity."""
+    midnight = datetime.combine(moment.date(), time(0), tzinfo=moment.tzinfo)
+    steps = -(-(moment - midnight) // granularity)
+    return midnight + steps * granularity
+
+
+def merge_busy(busy, start, end):
+    """Clip (start, end, ...) tuples sorted by start to [start, end) and merge them."""
+    merged = []
+    for item in busy:
+        busy_start, busy_end = max(item[0], start), min(item[1], end)
+        if busy_start >= busy_end:
+            continue
+        if merged and busy_start <= merged[-1][1]:
+            if busy_end > merged[-1][1]:
+                merged[-1][1] = busy_end
+        else:
+            merged.append([busy_start, busy_end])
+    return merged
+
+
+def free_slots(busy, start, end, day_start=DAY_START, day_end=DAY_END):
+    """Yield free (start, end) gaps inside the daily window, in time order.
+
+    busy is a list of (start, end, ...) tuples sorted by start, such as the
+    items of a conflicts.IntervalIndex. The sweep is linear in the number of
+    days plus the number of busy intervals in [start, end).
+    """
+    merged = merge_busy(busy, start, end)
+    position = 0
+    day = start.date()
+    while True:
+        window_start = max(datetime.combine(day, day_start, tzinfo=start.tzinfo), start)
+        window_end = min(datetime.combine(day, day_end, tzinfo=start.tzinfo), end)
+        if datetime.combine(day, day_start, tzinfo=start.tzinfo) >= end:
+            return
+        day += timedelta(days=1)
+        if window_start >= window_end:
+            continue
+
+        while position < len(merged) and merged[position][1] <= window_start:
+            position += 1
+        cursor = window_start
+        scan = position
+        while scan < len(merged) and merged[scan][0] < window_end:
+            if merged[scan][0] > cursor:
+                yield cursor, merged[scan][0]
+            cursor = max(cursor, merged[scan][1])
+            scan += 1
+        if cursor < window_end:
+            yield cursor, window_end
+
+
+def _fit(gap_start, gap_end, duration, granularity):
+    slot_start = round_up(gap_start, granularity)
+    if slot_start + duration <= gap_end:
+        return slot_start, slot_start + duration
+    return None
+
+
+def place_sessions(busy, duration, sessions=1, now=None, strategy='earliest',
+                   horizon_days=HORIZON_DAYS, day_start=DAY_START, day_end=DAY_END,
+                   granularity=GRANULARITY):
+    """Place sessions of the given duration into free slots, one per day.
+
+    'earliest' takes the first days with room for a session. 'balanced'
+    spreads the sessions evenly over the horizon, taking the first fitting
+    slot on or after each target day. Returns a sorted list of (start, end),
+    which may be shorter than sessions if the calendar is too full.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    now = round_up(now or datetime.now(), granularity)
+    horizon_end = datetime.combine(now.date() + timedelta(days=horizon_days), day_end, tzinfo=now.tzinfo)
+
+    # First fitting slot of each day, in day order
+    first_fit = {}
+    for gap_start, gap_end in free_slots(busy, now, horizon_end, day_start, day_end):
+        if gap_start.date() in first_fit:
+            continue
+        slot = _fit(gap_start, gap_end, duration, granularity)
+        if slot:
+            first_fit[gap_start.date()] = slot
+            if strategy == 'earliest' and len(first_fit) == sessions:
+                break
+
+    days = sorted(first_fit)
+    if strategy == 'earliest' or len(days) <= sessions:
+        return [first_fit[day] for day in days[:sessions]]
+
+    # Aim for evenly spaced days, leaving enough later days for the rest
+    chosen = []
+    position = 0
+    for index in range(sessions):
+        target = now.date() + timedelta(days=index * horizon_days // sessions)
+        latest = len(days) - (sessions - index)
+        position = max(position, min(bisect_left(days, target), latest))
+        chosen.append(first_fit[days[position]])
+        position += 1
+    return chosen
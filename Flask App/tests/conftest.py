@@ -0,0 +1,68 @@
+"""Shared fixtures; app.py is imported against a throwaway database."""
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, 'fakes'))
+
+# app.py reads its settings at import time, so they are set before any test imports it
+STATE_DIR = tempfile.mkdtemp(prefix='mayday-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(STATE_DIR, 'app.db')}",
+    'SECRET_KEY': 'tests',
+    'OPENAI_API_KEY': 'tests',
+    'GOOGLE_CLIENT_CONFIG': '{}',
+    'LLM_CACHE_PATH': os.path.join(STATE_DIR, 'llm_cache.db'),
+    'JOB_QUEUE_PATH': os.path.join(STATE_DIR, 'jobs.db'),
+    'ICS_STORE_PATH': os.path.join(STATE_DIR, 'ics'),
+    'TOKEN_STORE_PATH': os.path.join(STATE_DIR, 'tokens.db'),
+    'JOB_WORKERS': '0',
+})
+
+_emails = itertools.count()
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    with app.app.app_context():
+        app.db.create_all()
+    return app
+
+
+@pytest.fixture
+def app_context(app_module):
+    with app_module.app.app_context():
+        yield app_module
+        app_module.db.session.remove()
+
+
+@pytest.fixture
+def user_id(app_context):
+    """A fresh user, so per-user caches never carry over between tests."""
+    app = app_context
+    user = app.User(email=f'user-{next(_emails)}@tests', password='x')
+    app.db.session.add(user)
+    app.db.session.commit()
+    return user.id
+
+
+@pytest.fixture
+def fake_calendar():
+    from fake_calendar import FakeCalendar
+    fake = FakeCalendar()
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def calendar_service(fake_calendar):
+    import httplib2
+    from gcal_service import build_calendar_service
+    return build_calendar_service(None, endpoint=fake_calendar.url, http=httplib2.Http())
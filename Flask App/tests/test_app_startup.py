@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+from conftest import APP_DIR
+
+
+def test_importing_the_app_writes_no_files(tmp_path):
+    environ = {key: value for key, value in os.environ.items()
+               if key not in ('JOB_QUEUE_PATH', 'LLM_CACHE_PATH', 'TOKEN_STORE_PATH', 'ICS_STORE_PATH')}
+    environ['DATABASE_URL'] = f"sqlite:///{tmp_path / 'app.db'}"
+    environ['PYTHONPATH'] = os.path.abspath(APP_DIR)
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=tmp_path, env=environ, check=True)
+    assert os.listdir(tmp_path) == []
+
+
+def test_stores_open_where_the_config_says(app_module, tmp_path, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'LLM_CACHE_PATH', str(tmp_path / 'plans.db'))
+    app_module.llm_cache.cache_clear()
+    try:
+        assert app_module.llm_cache().path == str(tmp_path / 'plans.db')
+        assert (tmp_path / 'plans.db').exists()
+    finally:
+        app_module.llm_cache.cache_clear()
+
+
+def test_importing_the_app_leaves_heavy_libraries_unloaded(tmp_path):
+    environ = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}", PYTHONPATH=os.path.abspath(APP_DIR))
+    code = ('import sys, app; '
+            "print(sorted(name for name in ('numpy', 'openai') if name in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=environ, check=True,
+                            capture_output=True, text=True)
+    assert result.stdout.strip() == '[]'
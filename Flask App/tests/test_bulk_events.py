@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bulk_events import MIRRORED
+
+START = datetime(2030, 3, 4, 9)
+
+
+@pytest.fixture
+def client(app_context, user_id):
+    client = app_context.app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+    return client
+
+
+def add(app, user_id, title, google_id=None):
+    event = app.Event(user_id=user_id, title=title, start_time=START, end_time=START + timedelta(hours=1),
+                      google_id=google_id)
+    app.db.session.add(event)
+    app.db.session.commit()
+    return event.id
+
+
+def test_create_update_delete(app_context, user_id, client):
+    app = app_context
+    moved, removed = add(app, user_id, 'Moved'), add(app, user_id, 'Removed')
+    response = client.post('/api/events/bulk', json={
+        'create': [{'title': 'New', 'start_time': '2030-03-05T09:00:00', 'end_time': '2030-03-05T10:00:00'},
+                   {'title': '', 'start_time': '2030-03-05T09:00:00', 'end_time': '2030-03-05T10:00:00'}],
+        'update': [{'id': moved, 'start_time': '2030-03-04T08:30:00'}],
+        'delete': [removed, 'x']})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body['created'], body['updated'], body['deleted'], body['failed']) == (1, 1, 1, 2)
+    assert [item['ok'] for item in body['results']['create']] == [True, False]
+    titles = {event.title: event for event in app.Event.query.filter_by(user_id=user_id)}
+    assert set(titles) == {'Moved', 'New'}
+    assert titles['Moved'].start_time == datetime(2030, 3, 4, 8, 30)
+
+
+def test_atomic_writes_nothing_on_errors(app_context, user_id, client):
+    response = client.post('/api/events/bulk', json={'atomic': True, 'create': [
+        {'title': 'Fine', 'start_time': '2030-03-05T09:00:00', 'end_time': '2030-03-05T10:00:00'},
+        {'title': 'Backwards', 'start_time': '2030-03-05T09:00:00', 'end_time': '2030-03-05T08:00:00'}]})
+    assert response.status_code == 400
+    assert app_context.Event.query.filter_by(user_id=user_id).count() == 0
+
+
+@pytest.mark.parametrize('atomic', ['false', 'true', 0, 1, None, []])
+def test_atomic_must_be_a_boolean(app_context, user_id, client, atomic):
+    response = client.post('/api/events/bulk', json={'atomic': atomic, 'create': [
+        {'title': 'Fine', 'start_time': '2030-03-05T09:00:00', 'end_time': '2030-03-05T10:00:00'}]})
+    assert response.status_code == 400
+    assert app_context.Event.query.filter_by(user_id=user_id).count() == 0
+
+
+def test_mirrored_events_are_left_to_google(app_context, user_id, client):
+    app = app_context
+    mirrored = add(app, user_id, 'From Google', google_id='abc123')
+    local = add(app, user_id, 'Local')
+    body = client.post('/api/events/bulk', json={'update': [{'id': mirrored, 'title': 'Renamed'}],
+                                                 'delete': [local]}).get_json()
+    assert body['results']['update'] == [{'ok': False, 'error': MIRRORED}]
+    assert body['results']['delete'] == [{'ok': True, 'id': local}]
+    assert app.db.session.get(app.Event, mirrored).title == 'From Google'
+
+    body = client.post('/api/events/bulk', json={'delete': [mirrored]}).get_json()
+    assert body['results']['delete'] == [{'ok': False, 'error': MIRRORED}]
+    assert app.db.session.get(app.Event, mirrored) is not None
+
+
+def test_bulk_writes_reach_the_caches(app_context, user_id, client):
+    app = app_context
+    window = (datetime(2030, 3, 5, 9), datetime(2030, 3, 5, 10))
+    assert not app.conflict_index.has_overlap(user_id, *window)
+    client.post('/api/events/bulk', json={'create': [
+        {'title': 'New', 'start_time': window[0].isoformat(), 'end_time': window[1].isoformat()}]})
+    assert app.conflict_index.has_overlap(user_id, *window)
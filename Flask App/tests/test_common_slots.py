@@ -0,0 +1,72 @@
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+
+START = datetime.combine(datetime.utcnow().date() + timedelta(days=2), datetime.min.time())
+_groups = itertools.count()
+
+
+@pytest.fixture
+def users(app_context):
+    app = app_context
+    group = next(_groups)
+    accounts = [app.User(email=f'{name}-{group}@slots', password='x') for name in ('me', 'friend', 'stranger')]
+    app.db.session.add_all(accounts)
+    app.db.session.commit()
+    return accounts
+
+
+def client_for(app, user):
+    client = app.app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user.id
+    return client
+
+
+def search(client, emails):
+    return client.get('/api/common_slots', query_string={
+        'emails': ','.join(emails), 'start': (START + timedelta(hours=9)).isoformat(),
+        'end': (START + timedelta(hours=12)).isoformat(), 'duration': 60, 'day_start': '00:00',
+        'day_end': '23:59'}).get_json()
+
+
+def test_only_users_who_share_take_part(app_context, users):
+    app = app_context
+    me, friend, stranger = users
+    friend_client = client_for(app, friend)
+    assert friend_client.post('/api/freebusy_shares', json={'email': me.email}).get_json() == {'emails': [me.email]}
+    for user in (friend, stranger):
+        app.db.session.add(app.Event(user_id=user.id, title='Busy', start_time=START + timedelta(hours=9),
+                                     end_time=START + timedelta(hours=10)))
+    app.db.session.commit()
+
+    found = search(client_for(app, me), [friend.email, stranger.email, 'nobody@slots'])
+    assert found['users'] == 2
+    # An account that doesn't share looks just like no account at all
+    assert found['unavailable'] == [stranger.email, 'nobody@slots']
+    # The friend's event counts, the stranger's doesn't matter
+    assert [slot['start'] for slot in found['slots']] == [(START + timedelta(hours=10)).isoformat()]
+
+    assert friend_client.delete('/api/freebusy_shares', query_string={'email': me.email}).get_json() == {'emails': []}
+    assert search(client_for(app, me), [friend.email])['users'] == 1
+
+
+def test_share_needs_an_email(app_context, users):
+    client = client_for(app_context, users[0])
+    assert client.post('/api/freebusy_shares', json={'email': ' '}).status_code == 400
+    assert client.post('/api/freebusy_shares', json=['x']).status_code == 400
+    # Sharing with an address nobody registered is fine, and says nothing about it
+    assert client.post('/api/freebusy_shares', json={'email': 'later@slots'}).get_json() == {'emails': ['later@slots']}
+
+
+def test_a_session_without_a_user_row(app_context, users):
+    app = app_context
+    me, friend, _ = users
+    client_for(app, friend).post('/api/freebusy_shares', json={'email': me.email})
+    # The dummy login keeps a user id that may have no row
+    client = app.app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = me.id + 10 ** 6
+    found = search(client, [friend.email])
+    assert (found['users'], found['unavailable']) == (1, [friend.email])
@@ -0,0 +1,83 @@
+import random
+from datetime import datetime, timedelta
+
+from conflicts import LONG_EVENT, ConflictIndex, IntervalIndex
+
+START = datetime(2030, 1, 1)
+
+
+def random_events(rng, count):
+    events = []
+    for event_id in range(count):
+        begin = START + timedelta(minutes=15 * rng.randrange(0, 4 * 24 * 60))
+        length = rng.choice((timedelta(minutes=30), timedelta(hours=2), timedelta(hours=20), timedelta(days=9)))
+        events.append((event_id, begin, begin + length))
+    return events
+
+
+def brute_force(events, start, end):
+    return sorted((begin, finish, event_id) for event_id, begin, finish in events if begin < end and finish > start)
+
+
+def test_overlaps_match_a_full_scan():
+    rng = random.Random(3)
+    events = random_events(rng, 500)
+    index = IntervalIndex(events)
+    for _ in range(300):
+        start = START + timedelta(minutes=15 * rng.randrange(0, 4 * 24 * 60))
+        end = start + timedelta(minutes=15 * rng.randrange(1, 40))
+        assert index.overlaps(start, end) == brute_force(events, start, end)
+
+
+def test_adds_and_removes_keep_it_exact():
+    rng = random.Random(5)
+    events = random_events(rng, 300)
+    index = IntervalIndex(events[:100])
+    for event in events[100:]:
+        index.add(*event)
+    for event in events[::3]:
+        index.remove(*event)
+    remaining = [event for position, event in enumerate(events) if position % 3]
+    assert len(index) == len(remaining)
+    for _ in range(200):
+        start = START + timedelta(minutes=15 * rng.randrange(0, 4 * 24 * 60))
+        end = start + timedelta(hours=rng.randrange(1, 6))
+        assert index.overlaps(start, end) == brute_force(remaining, start, end)
+
+
+def test_long_events_do_not_widen_the_window():
+    index = IntervalIndex([(1, START, START + timedelta(days=400))])
+    index.add(2, START + timedelta(days=10), START + timedelta(days=10, hours=1))
+    assert index.max_duration <= LONG_EVENT
+    assert [item[2] for item in index.overlaps(START + timedelta(days=10), START + timedelta(days=11))] == [1, 2]
+    index.remove(1, START, START + timedelta(days=400))
+    assert not index.has_overlap(START + timedelta(days=50), START + timedelta(days=51))
+
+
+def test_touching_events_do_not_overlap():
+    index = IntervalIndex([(1, START, START + timedelta(hours=1))])
+    assert not index.has_overlap(START + timedelta(hours=1), START + timedelta(hours=2))
+    assert not index.has_overlap(START - timedelta(hours=1), START)
+
+
+def test_conflict_index_loads_each_user_once():
+    loads = []
+
+    def load(user_id):
+        loads.append(user_id)
+        return [(10 * user_id, START, START + timedelta(hours=1))]
+
+    conflicts = ConflictIndex(load)
+    assert conflicts.has_overlap(1, START, START + timedelta(minutes=5))
+    conflicts.added(1, 11, START + timedelta(hours=3), START + timedelta(hours=4))
+    conflicts.removed(1, 10, START, START + timedelta(hours=1))
+    assert not conflicts.has_overlap(1, START, START + timedelta(minutes=5))
+    assert conflicts.has_overlap(1, START + timedelta(hours=3), START + timedelta(hours=5))
+    assert loads == [1]
+
+    # Changes to users not loaded yet are picked up when they are
+    conflicts.added(2, 21, START + timedelta(hours=5), START + timedelta(hours=6))
+    assert conflicts.overlaps(2, START, START + timedelta(days=1)) == [(START, START + timedelta(hours=1), 20)]
+    conflicts.invalidate(1)
+    conflicts.has_overlap(1, START, START + timedelta(hours=1))
+    assert loads == [1, 2, 1]
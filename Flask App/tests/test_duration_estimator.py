@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from duration_estimator import DurationModel
+
+START = datetime(2025, 9, 1, 9)
+
+
+def history(title, minutes, sessions, count=5):
+    for day in range(count):
+        begin = START + timedelta(days=day)
+        yield title, begin, begin + timedelta(minutes=minutes), sessions
+
+
+def test_one_off_events_are_single_sessions():
+    model = DurationModel(history('Piano practice', 45, None))
+    assert model.estimate('piano practice')[0] == (45, 1)
+
+
+def test_plans_keep_their_session_count():
+    model = DurationModel([*history('Thesis writing', 120, 3), *history('Piano practice', 45, None)])
+    assert model.estimate('Thesis writing')[0] == (120, 3)
+    for event in history('Thesis writing', 120, 3):
+        model.remove(*event)
+    assert model.estimate('Thesis writing') is None
+
+
+def test_ai_schedule_repeats_the_earlier_plan(app_context, user_id, monkeypatch):
+    app = app_context
+    def ask_llm(description):
+        raise AssertionError('the history should have answered')
+    monkeypatch.setattr(app, 'request_ai_plan', ask_llm)
+    monkeypatch.setattr(app, 'google_calendar_service', lambda user_id: None)
+    app.db.session.add_all(app.Event(user_id=user_id, title=title, start_time=start, end_time=end,
+                                     plan_sessions=sessions)
+                           for title, start, end, sessions in history('Thesis writing', 120, 3))
+    app.db.session.commit()
+
+    progress = []
+    result = app.run_ai_schedule({'user_id': user_id, 'description': 'thesis writing'},
+                                 lambda kind, data: progress.append((kind, data)))
+    assert result['event_added']
+    assert progress[0] == ('plan', {'duration': 2, 'unit': 'hour', 'sessions': 3})
+    assert [kind for kind, _ in progress[1:]] == ['session'] * 3
+    saved = app.Event.query.filter(app.Event.id.in_(result['event_ids'])).all()
+    assert {event.plan_sessions for event in saved} == {3}
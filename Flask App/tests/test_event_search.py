@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+START = datetime(2030, 5, 6, 9)
+
+
+@pytest.fixture
+def client(app_context, user_id):
+    client = app_context.app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+    return client
+
+
+def add(app, user_id, title, start=START, hours=1, rule=None):
+    event = app.Event(user_id=user_id, title=title, start_time=start, end_time=start + timedelta(hours=hours))
+    event.set_recurrence(rule)
+    app.db.session.add(event)
+    app.db.session.commit()
+    return event
+
+
+def titles(client, query, **params):
+    response = client.get('/api/search', query_string=dict(params, q=query))
+    assert response.status_code == 200
+    return [(event['title'], event['exact']) for event in response.get_json()['events']]
+
+
+def test_words_match_as_prefixes(app_context, user_id, client):
+    app = app_context
+    add(app, user_id, 'Calculus exam')
+    add(app, user_id, 'Calculus lecture')
+    add(app, user_id, 'Chemistry exam')
+
+    assert titles(client, 'calc ex') == [('Calculus exam', False)]
+    assert sorted(titles(client, 'calc')) == [('Calculus exam', False), ('Calculus lecture', False)]
+    assert titles(client, 'CALCULUS Exám') == [('Calculus exam', True)]
+    assert titles(client, 'physics') == []
+
+
+def test_whole_word_matches_come_first(app_context, user_id, client):
+    app = app_context
+    add(app, user_id, 'Exams')
+    add(app, user_id, 'Exam review session for finals')
+    add(app, user_id, 'Examples')
+
+    # The exact match outranks the shorter prefix matches, which then go by length
+    assert titles(client, 'exam') == [('Exam review session for finals', True), ('Exams', False),
+                                      ('Examples', False)]
+
+
+def test_only_the_users_own_events_match(app_context, user_id, client):
+    app = app_context
+    other = app.User(email=f'other-{user_id}@tests', password='x')
+    app.db.session.add(other)
+    app.db.session.commit()
+    add(app, other.id, 'Dentist')
+    add(app, user_id, 'Dentist appointment')
+
+    assert titles(client, 'dentist') == [('Dentist appointment', True)]
+
+
+def test_renamed_and_deleted_events_follow_the_index(app_context, user_id, client):
+    app = app_context
+    event = add(app, user_id, 'Gym')
+    event.title = 'Swimming'
+    app.db.session.commit()
+    assert titles(client, 'gym') == []
+    assert titles(client, 'swim') == [('Swimming', False)]
+
+    app.db.session.delete(event)
+    app.db.session.commit()
+    assert titles(client, 'swim') == []
+
+
+def test_start_and_end_keep_overlapping_events(app_context, user_id, client):
+    app = app_context
+    add(app, user_id, 'Review early', START - timedelta(days=3))
+    add(app, user_id, 'Review overlapping', START - timedelta(hours=1), hours=2)
+    add(app, user_id, 'Review inside', START + timedelta(days=1))
+    add(app, user_id, 'Review late', START + timedelta(days=10))
+    # Began before the range, but later occurrences fall inside it
+    add(app, user_id, 'Review weekly', START - timedelta(days=14), rule='FREQ=WEEKLY;COUNT=5')
+    add(app, user_id, 'Review ended', START - timedelta(days=14), rule='FREQ=DAILY;COUNT=3')
+
+    found = titles(client, 'review', start=START.isoformat(), end=(START + timedelta(days=7)).isoformat())
+    assert sorted(title for title, _ in found) == ['Review inside', 'Review overlapping', 'Review weekly']
+    assert sorted(title for title, _ in titles(client, 'review', end=START.isoformat())) == [
+        'Review early', 'Review ended', 'Review overlapping', 'Review weekly']
+
+
+def test_pages_by_offset(app_context, user_id, client):
+    app = app_context
+    for number in range(5):
+        add(app, user_id, f'Standup {number}', START + timedelta(days=number))
+
+    seen, params = [], {'limit': 2}
+    while True:
+        page = client.get('/api/search', query_string=dict(params, q='standup')).get_json()
+        seen.extend(event['title'] for event in page['events'])
+        if page['next'] is None:
+            break
+        params.update(page['next'])
+    assert seen == [f'Standup {number}' for number in range(5)]
+
+
+@pytest.mark.parametrize('params', [{}, {'q': 'x', 'start': 'soon'}, {'q': 'x', 'limit': 'many'}])
+def test_invalid_searches(client, params):
+    assert client.get('/api/search', query_string=params).status_code == 400
+
+
+def test_queries_without_words_find_nothing(app_context, user_id, client):
+    add(app_context, user_id, 'AND OR NEAR')
+    assert titles(client, '*"()') == []
+    assert titles(client, 'near') == [('AND OR NEAR', True)]
@@ -0,0 +1,91 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import event_versions
+
+START = datetime.combine(datetime.utcnow().date() + timedelta(days=2), datetime.min.time()) + timedelta(hours=9)
+
+
+def other_process(app):
+    """A connection of its own to the database file, as another worker process would have."""
+    return sqlite3.connect(app.db.engine.url.database, isolation_level=None)
+
+
+def insert_elsewhere(app, user_id, title, start, end):
+    with other_process(app) as connection:
+        connection.execute('INSERT INTO event (user_id, title, start_time, end_time) VALUES (?, ?, ?, ?)',
+                           (user_id, title, start.isoformat(' '), end.isoformat(' ')))
+
+
+def add(app, user_id, title, start, end):
+    event = app.Event(user_id=user_id, title=title, start_time=start, end_time=end)
+    app.db.session.add(event)
+    app.db.session.commit()
+    return event
+
+
+def test_every_write_bumps_the_version(app_context, user_id):
+    app = app_context
+    assert event_versions.version(app.db.session, user_id) == 0
+    event = add(app, user_id, 'Lecture', START, START + timedelta(hours=1))
+    event.title = 'Lecture moved'
+    app.db.session.commit()
+    app.db.session.delete(event)
+    app.db.session.commit()
+    insert_elsewhere(app, user_id, 'Lab', START, START + timedelta(hours=1))
+    assert event_versions.version(app.db.session, user_id) == 4
+    assert event_versions.versions(app.db.session, [user_id, -1]) == {user_id: 4, -1: 0}
+
+
+def test_conflict_index_sees_other_processes(app_context, user_id):
+    app = app_context
+    window = (START, START + timedelta(hours=1))
+    assert not app.conflict_index.has_overlap(user_id, *window)
+    insert_elsewhere(app, user_id, 'Booked elsewhere', *window)
+    assert app.conflict_index.has_overlap(user_id, *window)
+
+
+def test_own_writes_keep_the_index(app_context, user_id):
+    app = app_context
+    app.conflict_index.has_overlap(user_id, START, START + timedelta(hours=1))
+    index = app.conflict_index.get(user_id)
+    add(app, user_id, 'Lecture', START, START + timedelta(hours=1))
+    # Applied in place rather than rebuilt
+    assert app.conflict_index.get(user_id) is index
+    assert app.conflict_index.has_overlap(user_id, START, START + timedelta(minutes=30))
+
+
+def test_freebusy_sees_other_processes(app_context, user_id):
+    app = app_context
+    window = (START, START + timedelta(hours=1))
+    assert not app.freebusy_index.busy([user_id], *window)[1].any()
+    insert_elsewhere(app, user_id, 'Booked elsewhere', *window)
+    assert app.freebusy_index.busy([user_id], *window)[1].all()
+
+
+def test_duration_estimator_sees_other_processes(app_context, user_id):
+    app = app_context
+    assert app.duration_estimator.estimate(user_id, 'Piano practice') is None
+    for day in range(5):
+        begin = START - timedelta(days=day + 1)
+        insert_elsewhere(app, user_id, 'Piano practice', begin, begin + timedelta(minutes=45))
+    assert app.duration_estimator.estimate(user_id, 'Piano practice') == (45, 1)
+
+
+def test_ics_export_sees_other_processes(app_context, user_id):
+    app = app_context
+    client = app.app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+    add(app, user_id, 'Lecture', START, START + timedelta(hours=1))
+    first = client.get('/export.ics')
+    assert first.status_code == 200
+
+    insert_elsewhere(app, user_id, 'Booked elsewhere', START + timedelta(hours=2), START + timedelta(hours=3))
+    second = client.get('/export.ics', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert b'Booked elsewhere' in second.data
+
+    # Unchanged since, so the digest is reused and the client's copy is current
+    assert client.get('/export.ics', headers={'If-None-Match': second.headers['ETag']}).status_code == 304
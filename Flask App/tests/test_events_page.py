@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+START = datetime(2030, 3, 4, 9)
+
+
+@pytest.fixture
+def client(app_context, user_id):
+    client = app_context.app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+    return client
+
+
+def add(app, user_id, title, start, hours=1, rule=None):
+    event = app.Event(user_id=user_id, title=title, start_time=start, end_time=start + timedelta(hours=hours))
+    event.set_recurrence(rule)
+    app.db.session.add(event)
+    app.db.session.commit()
+    return event
+
+
+def pages(client, limit, **query):
+    """Every event /api/events returns, following its cursors."""
+    events = []
+    params = dict(query, limit=limit)
+    while True:
+        page = client.get('/api/events', query_string=params).get_json()
+        assert len(page['events']) <= limit
+        events.extend((event['title'], event['start_time']) for event in page['events'])
+        if page['next'] is None:
+            return events
+        params.update(page['next'])
+
+
+def test_pages_interleave_series_and_single_events(app_context, user_id, client):
+    app = app_context
+    add(app, user_id, 'Daily', START, rule='FREQ=DAILY;COUNT=6')
+    add(app, user_id, 'Weekly', START + timedelta(hours=3), rule='FREQ=WEEKLY;COUNT=2')
+    # One at the same time as an occurrence, so the cursor has to break the tie by id
+    add(app, user_id, 'Same time', START + timedelta(days=2))
+    add(app, user_id, 'Single', START + timedelta(days=4, hours=5))
+    add(app, user_id, 'Before', START - timedelta(days=1))
+
+    expected = ([('Daily', START + timedelta(days=day)) for day in range(6)] +
+                [('Weekly', START + timedelta(days=7 * week, hours=3)) for week in range(2)] +
+                [('Same time', START + timedelta(days=2)), ('Single', START + timedelta(days=4, hours=5))])
+    for limit in (1, 2, 3, 50):
+        events = pages(client, limit, after=START.isoformat())
+        assert sorted(events) == sorted((title, start.isoformat()) for title, start in expected)
+        assert [start for _, start in events] == sorted(start for _, start in events)
+
+
+def test_until_ends_the_listing(app_context, user_id, client):
+    app = app_context
+    add(app, user_id, 'Daily', START, rule='FREQ=DAILY')
+    events = pages(client, 2, after=START.isoformat(), until=(START + timedelta(days=5)).isoformat())
+    assert events == [('Daily', (START + timedelta(days=day)).isoformat()) for day in range(5)]
+
+
+def test_an_unbounded_series_is_only_expanded_for_the_page(app_context, user_id, client):
+    app = app_context
+    add(app, user_id, 'Forever', START, rule='FREQ=DAILY')
+    page = client.get('/api/events', query_string={'after': START.isoformat(), 'limit': 3}).get_json()
+    assert [event['start_time'] for event in page['events']] == [(START + timedelta(days=day)).isoformat()
+                                                                 for day in range(3)]
+    assert page['next']['after'] == (START + timedelta(days=2)).isoformat()
+
+
+def test_bad_cursor(client):
+    assert client.get('/api/events', query_string={'after': 'soon'}).status_code == 400
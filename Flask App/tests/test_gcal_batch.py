@@ -0,0 +1,82 @@
+import json
+from datetime import datetime, timedelta
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from gcal_batch import _is_retryable, event_body, new_event_id, push_events, summarize
+
+START = datetime(2030, 3, 4, 9)
+
+
+def bodies(count):
+    return [event_body(f'Session {number}', START + timedelta(hours=number), START + timedelta(hours=number + 1))
+            for number in range(count)]
+
+
+def http_error(status, reason=None):
+    errors = [{'reason': reason}] if reason else []
+    content = json.dumps({'error': {'code': status, 'errors': errors}}).encode()
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+def test_push_inserts_everything(fake_calendar, calendar_service):
+    results = push_events(calendar_service, bodies(5), backoff=0.01)
+    assert summarize(results) == (5, 0)
+    assert [result['attempts'] for result in results] == [1] * 5
+    assert {result['id'] for result in results} == set(fake_calendar.events['primary'])
+
+
+def test_failed_inserts_are_retried(fake_calendar, calendar_service):
+    fake_calendar.fail_every = 3
+    results = push_events(calendar_service, bodies(20), batch_size=7, backoff=0.01)
+    assert summarize(results) == (20, 0)
+    assert any(result['attempts'] > 1 for result in results)
+    assert len(fake_calendar.events['primary']) == 20
+
+
+def test_lost_answers_do_not_make_copies(fake_calendar, calendar_service):
+    fake_calendar.lose_every = 3
+    items = bodies(20)
+    results = push_events(calendar_service, items, backoff=0.01)
+    assert summarize(results) == (20, 0)
+    assert {result['status'] for result in results} == {200, 409}
+    assert len(fake_calendar.events['primary']) == 20
+
+
+def test_taken_ids_are_failures(fake_calendar, calendar_service):
+    items = [dict(body, id=new_event_id()) for body in bodies(3)]
+    push_events(calendar_service, items, backoff=0.01)
+    fake_calendar.delete('primary', items[0]['id'])
+
+    # Google keeps deleted ids too; a 409 not answering a retry of this push isn't a success
+    again = push_events(calendar_service, items, backoff=0.01)
+    assert summarize(again) == (0, 3)
+    assert {(result['status'], result['attempts']) for result in again} == {(409, 1)}
+    assert len(fake_calendar.events['primary']) == 3
+
+
+def test_gives_up_after_max_retries(fake_calendar, calendar_service):
+    fake_calendar.fail_every = 1
+    results = push_events(calendar_service, bodies(3), max_retries=2, backoff=0.01)
+    assert summarize(results) == (0, 3)
+    assert {(result['status'], result['attempts']) for result in results} == {(503, 3)}
+
+
+def test_event_ids_are_random_and_valid():
+    ids = {new_event_id() for _ in range(100)}
+    assert len(ids) == 100
+    # Google only takes base32hex digits, 5 to 1024 of them
+    assert all(set(event_id) <= set('0123456789abcdefghijklmnopqrstuv') and 5 <= len(event_id) <= 1024
+               for event_id in ids)
+
+
+def test_retryable_errors():
+    assert _is_retryable(http_error(503))
+    assert _is_retryable(http_error(429))
+    assert _is_retryable(http_error(403, 'rateLimitExceeded'))
+    assert _is_retryable(http_error(403, 'userRateLimitExceeded'))
+    assert not _is_retryable(http_error(403, 'forbidden'))
+    assert not _is_retryable(http_error(403))
+    assert not _is_retryable(http_error(400))
+    assert _is_retryable(OSError('connection reset'))
@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta
+
+from gcal_batch import event_body
+from recurrence import occurrences
+
+START = datetime(2030, 3, 4, 9)
+
+
+def remote(fake, title, hours=0, **extra):
+    """Create an event straight in the fake calendar and return its id."""
+    begin = START + timedelta(hours=hours)
+    status, event = fake.insert('primary', dict(event_body(title, begin, begin + timedelta(hours=1)), **extra))
+    assert status == 200
+    return event['id']
+
+
+def mirrored(app, user_id):
+    rows = app.Event.query.filter(app.Event.user_id == user_id, app.Event.google_id.isnot(None))
+    return {row.google_id: row for row in rows}
+
+
+def test_first_sync_is_a_full_listing(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    ids = [remote(fake_calendar, f'Lecture {number}', number) for number in range(3)]
+
+    stats = app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    assert stats['full'] and stats['inserted'] == 3
+    rows = mirrored(app, user_id)
+    assert set(rows) == set(ids)
+    assert rows[ids[1]].start_time == START + timedelta(hours=1)
+    assert app.db.session.get(app.CalendarSyncState, user_id).sync_token is not None
+
+
+def test_later_syncs_only_apply_changes(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    kept, edited, removed = (remote(fake_calendar, title, number)
+                             for number, title in enumerate(('Kept', 'Edited', 'Removed')))
+    app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    fake_calendar.patch('primary', edited, {'summary': 'Edited again'})
+    fake_calendar.delete('primary', removed)
+    added = remote(fake_calendar, 'Added', 5)
+    requests = fake_calendar.http_requests
+    stats = app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    assert not stats['full']
+    assert (stats['inserted'], stats['updated'], stats['deleted']) == (1, 1, 1)
+    # One page of deltas, nothing else
+    assert fake_calendar.http_requests - requests == 1
+    rows = mirrored(app, user_id)
+    assert set(rows) == {kept, edited, added}
+    assert rows[edited].title == 'Edited again'
+
+
+def test_expired_sync_token_falls_back_to_a_full_sync(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    gone = remote(fake_calendar, 'Gone')
+    stays = remote(fake_calendar, 'Stays', 1)
+    app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    fake_calendar.delete('primary', gone)
+    fake_calendar.expire_sync_tokens()
+    stats = app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    assert stats['full']
+    # The full listing leaves out deleted events, so the row is dropped as missing
+    assert stats['deleted'] == 1
+    assert set(mirrored(app, user_id)) == {stays}
+
+    # The token from the full sync works again
+    assert not app.calendar_sync.sync(calendar_service, user_id, now=START)['full']
+
+
+def test_expiry_covers_the_newest_token(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    remote(fake_calendar, 'Quiet')
+    app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    # Nothing changed since that sync, so its token is the newest one handed out
+    fake_calendar.expire_sync_tokens()
+    stats = app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    assert stats['full'] and stats['inserted'] == 0
+
+
+def test_paged_listing(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    ids = {remote(fake_calendar, f'Session {number}', number) for number in range(7)}
+    page_size = app.calendar_sync.page_size
+    app.calendar_sync.page_size = 3
+    try:
+        stats = app.calendar_sync.sync(calendar_service, user_id, now=START)
+    finally:
+        app.calendar_sync.page_size = page_size
+    assert stats['inserted'] == 7
+    assert set(mirrored(app, user_id)) == ids
+
+
+def test_recurring_series_and_cancelled_instance(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    series = remote(fake_calendar, 'Standup', recurrence=['RRULE:FREQ=DAILY;COUNT=5'])
+    app.calendar_sync.sync(calendar_service, user_id, now=START)
+    assert mirrored(app, user_id)[series].rrule == 'FREQ=DAILY;COUNT=5'
+
+    instance = START + timedelta(days=2)
+    remote(fake_calendar, 'Standup', recurringEventId=series, status='cancelled',
+           originalStartTime={'dateTime': instance.isoformat(), 'timeZone': 'UTC'})
+    app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    row = mirrored(app, user_id)[series]
+    assert row.exdates == instance.strftime('%Y%m%dT%H%M%S')
+
+
+def test_series_with_a_utc_until(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    # Google writes UNTIL in UTC while the start carries a time zone
+    series = remote(fake_calendar, 'Course', recurrence=['RRULE:FREQ=WEEKLY;UNTIL=20300318T090000Z'])
+    app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    row = mirrored(app, user_id)[series]
+    assert row.rrule == 'FREQ=WEEKLY;UNTIL=20300318T090000'
+    assert [occurrence.start_time for occurrence in occurrences(row, START, limit=10)] == [
+        START + timedelta(days=days) for days in (0, 7, 14)]
+
+
+def test_local_events_are_pushed_once(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    event = app.Event(user_id=user_id, title='Local', start_time=START, end_time=START + timedelta(hours=1))
+    app.db.session.add(event)
+    app.db.session.commit()
+
+    stats = app.calendar_sync.sync(calendar_service, user_id, now=START)
+
+    assert stats['pushed'] == 1
+    assert event.google_id in fake_calendar.events['primary']
+    # Pulling it back finds the row it came from instead of making a copy
+    assert stats['inserted'] == 0
+    assert app.Event.query.filter_by(user_id=user_id).count() == 1
+    assert app.calendar_sync.sync(calendar_service, user_id, now=START)['pushed'] == 0
+
+
+def test_a_reused_row_id_is_pushed_as_a_new_event(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    first = app.Event(user_id=user_id, title='First', start_time=START, end_time=START + timedelta(hours=1))
+    app.db.session.add(first)
+    app.db.session.commit()
+    app.calendar_sync.sync(calendar_service, user_id, now=START)
+    row_id, gone = first.id, first.google_id
+    fake_calendar.delete('primary', gone)
+    app.db.session.delete(first)
+    app.db.session.commit()
+
+    # SQLite hands out the id of a deleted last row again
+    second = app.Event(id=row_id, user_id=user_id, title='Second', start_time=START,
+                       end_time=START + timedelta(hours=2))
+    app.db.session.add(second)
+    app.db.session.commit()
+    fake_calendar.expire_sync_tokens()
+    assert app.calendar_sync.sync(calendar_service, user_id, now=START)['full']
+
+    assert second.google_id not in (None, gone)
+    assert fake_calendar.events['primary'][second.google_id]['summary'] == 'Second'
+    assert app.db.session.get(app.Event, row_id).title == 'Second'
+
+
+def test_a_taken_push_id_is_replaced(app_context, user_id, fake_calendar, calendar_service):
+    app = app_context
+    taken = remote(fake_calendar, 'Deleted in Google')
+    fake_calendar.delete('primary', taken)
+    event = app.Event(user_id=user_id, title='Local', start_time=START, end_time=START + timedelta(hours=1),
+                      push_id=taken)
+    app.db.session.add(event)
+    app.db.session.commit()
+
+    assert app.calendar_sync.push_pending(calendar_service, user_id, START) == 0
+    assert (event.google_id, event.push_id) == (None, None)
+    assert app.calendar_sync.push_pending(calendar_service, user_id, START) == 1
+    assert event.google_id not in (None, taken)
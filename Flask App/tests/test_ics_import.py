@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from ics_import import import_events
+from recurrence import occurrences
+
+START = datetime(2030, 3, 4, 9)
+
+
+def calendar(*vevents):
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0']
+    for properties in vevents:
+        lines += ['BEGIN:VEVENT'] + properties + ['END:VEVENT']
+    return [line + '\r\n' for line in lines + ['END:VCALENDAR']]
+
+
+def rows(app, user_id):
+    return {row.ical_uid: row for row in app.Event.query.filter_by(user_id=user_id)}
+
+
+def test_events_and_duplicates(app_context, user_id):
+    app = app_context
+    lines = calendar(['UID:a', 'SUMMARY:Lecture', 'DTSTART:20300304T090000Z', 'DTEND:20300304T100000Z'],
+                     ['UID:b', 'SUMMARY:Lab', 'DTSTART:20300305T140000Z', 'DURATION:PT2H'],
+                     ['UID:a', 'SUMMARY:Lecture again', 'DTSTART:20300304T090000Z'])
+    stats = import_events(app.db, app.Event, user_id, lines)
+    assert (stats['parsed'], stats['inserted'], stats['duplicates']) == (3, 2, 1)
+    imported = rows(app, user_id)
+    assert imported['b'].end_time == datetime(2030, 3, 5, 16)
+
+    # Importing the file again adds nothing
+    assert import_events(app.db, app.Event, user_id, lines)['inserted'] == 0
+
+
+def test_series_with_a_utc_until(app_context, user_id):
+    app = app_context
+    lines = calendar(['UID:course', 'SUMMARY:Course', 'DTSTART;TZID=Europe/London:20300304T090000',
+                      'DTEND;TZID=Europe/London:20300304T100000', 'RRULE:FREQ=WEEKLY;UNTIL=20300318T090000Z'])
+    import_events(app.db, app.Event, user_id, lines)
+
+    row = rows(app, user_id)['course']
+    assert row.rrule == 'FREQ=WEEKLY;UNTIL=20300318T090000'
+    assert row.recurrence_end == START + timedelta(days=14, hours=1)
+    assert [occurrence.start_time for occurrence in occurrences(row, START, limit=10)] == [
+        START + timedelta(days=days) for days in (0, 7, 14)]
+
+
+def test_moved_instance_is_excluded_from_its_series(app_context, user_id):
+    app = app_context
+    lines = calendar(['UID:s', 'SUMMARY:Standup', 'DTSTART:20300304T090000Z', 'DTEND:20300304T091500Z',
+                      'RRULE:FREQ=DAILY;COUNT=3'],
+                     ['UID:s', 'SUMMARY:Standup', 'RECURRENCE-ID:20300305T090000Z',
+                      'DTSTART:20300305T110000Z', 'DTEND:20300305T111500Z'])
+    import_events(app.db, app.Event, user_id, lines)
+
+    imported = rows(app, user_id)
+    assert [occurrence.start_time for occurrence in occurrences(imported['s'], START, limit=5)] == [
+        START, START + timedelta(days=2)]
+    assert imported['s#20300305T090000'].start_time == datetime(2030, 3, 5, 11)
@@ -0,0 +1,116 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from ics_store import ArtifactStore, fingerprint
+
+START = datetime(2030, 3, 4, 9)
+
+
+def calendar(*titles):
+    return [(f'{title}@mayday', title, START, START + timedelta(hours=1), None, None) for title in titles]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path), max_age=3600, max_bytes=10 ** 6)
+
+
+def test_same_events_are_stored_once(store):
+    digest = store.put(1, calendar('Lecture'))
+    assert digest == fingerprint(calendar('Lecture'))
+    assert store.put(1, calendar('Lecture')) == digest
+    assert store.writes == 1
+    with open(store.get(1, digest), encoding='utf-8', newline='') as f:
+        assert 'SUMMARY:Lecture\r\n' in f.read()
+    # Each user has their own directory
+    assert store.get(2, digest) is None
+
+
+def test_only_digests_name_artifacts(store):
+    assert store.path(1, '../../etc/passwd') is None
+    assert store.get(1, 'f' * 64) is None
+
+
+def test_calendar_is_rewritten_only_after_a_change(store):
+    loads = []
+
+    def load():
+        loads.append(1)
+        yield from calendar('Lecture')
+
+    first = store.calendar(1, load, version=1)
+    assert store.calendar(1, load, version=1) == first
+    assert (len(loads), store.writes) == (2, 1)
+    # A newer version reads the events again, but the same content isn't written twice
+    assert store.calendar(1, load, version=2) == first
+    assert (len(loads), store.writes) == (3, 1)
+
+
+def age(path, seconds):
+    moment = time.time() - seconds
+    os.utime(path, (moment, moment))
+
+
+def test_evicts_expired_artifacts(store):
+    old = store.get(1, store.put(1, calendar('Old')))
+    new = store.get(1, store.put(1, calendar('New')))
+    age(old, 7200)
+    store.evict()
+    assert not os.path.exists(old) and os.path.exists(new)
+
+
+def test_evicts_the_oldest_over_the_size_limit(store):
+    paths = [store.get(1, store.put(1, calendar(f'Event {number}'))) for number in range(4)]
+    for number, path in enumerate(paths):
+        age(path, 100 - number)
+    store.max_bytes = sum(os.path.getsize(path) for path in paths[2:])
+    store.evict()
+    assert [os.path.exists(path) for path in paths] == [False, False, True, True]
+
+
+def test_writes_in_progress_are_left_alone(store, tmp_path):
+    store.put(1, calendar('Lecture'))
+    partial = tmp_path / '1' / 'x.tmp'
+    partial.write_text('BEGIN:VCALENDAR')
+    store.max_age = 60
+    age(partial, 1800)
+    store.evict()
+    # Recent enough to be a write still going on, even if older than max_age
+    assert partial.exists()
+    age(partial, 7200)
+    store.evict()
+    assert not partial.exists()
+
+
+@pytest.fixture
+def client(app_context, user_id):
+    client = app_context.app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+    return client
+
+
+def test_export_answers_304_until_the_events_change(app_context, user_id, client):
+    app = app_context
+    app.db.session.add(app.Event(user_id=user_id, title='Lecture', start_time=START,
+                                 end_time=START + timedelta(hours=1)))
+    app.db.session.commit()
+
+    first = client.get('/export.ics')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and 'SUMMARY:Lecture' in first.get_data(as_text=True)
+    assert first.headers['Cache-Control'] in ('private, no-cache', 'no-cache, private')
+    assert client.get('/export.ics', headers={'If-None-Match': etag}).status_code == 304
+
+    app.db.session.add(app.Event(user_id=user_id, title='Lab', start_time=START, end_time=START + timedelta(hours=2)))
+    app.db.session.commit()
+    changed = client.get('/export.ics', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+    digest = etag.strip('"')
+    assert client.get(f'/ics/{digest}.ics', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/ics/{"0" * 64}.ics').status_code == 404
+    assert client.get('/ics/not-a-digest.ics').status_code == 404
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ics_import import iter_vevents
+from ics_stream import CRLF, MAX_LINE_OCTETS, escape_text, fold, format_datetime, iter_calendar
+
+START = datetime(2030, 3, 4, 9)
+
+
+def physical_lines(text):
+    assert text.endswith(CRLF)
+    return text[:-len(CRLF)].split(CRLF)
+
+
+def test_escape_text():
+    assert escape_text('Lecture') == 'Lecture'
+    assert escape_text('Room 1, floor 2; bring C:\\notes') == 'Room 1\\, floor 2\\; bring C:\\\\notes'
+    assert escape_text('one\r\ntwo\nthree\rfour') == 'one\\ntwo\\nthree\\nfour'
+
+
+def test_short_lines_are_not_folded():
+    assert fold('SUMMARY:Lecture') == 'SUMMARY:Lecture' + CRLF
+    assert fold('X' * MAX_LINE_OCTETS) == 'X' * MAX_LINE_OCTETS + CRLF
+
+
+@pytest.mark.parametrize('line', ['SUMMARY:' + 'a' * 300, 'SUMMARY:' + 'é' * 100, 'SUMMARY:' + '日本語🙂' * 40,
+                                  'SUMMARY:' + 'ab' * 37 + '🙂' * 3])
+def test_folded_lines_fit_and_unfold(line):
+    lines = physical_lines(fold(line))
+    assert len(lines) > 1
+    assert all(len(part.encode('utf-8')) <= MAX_LINE_OCTETS for part in lines)
+    assert all(part.startswith(' ') for part in lines[1:])
+    # Each part encodes on its own, so no character was split between two lines
+    assert lines[0] + ''.join(part[1:] for part in lines[1:]) == line
+
+
+def test_format_datetime():
+    assert format_datetime(START) == '20300304T090000Z'
+    aware = START.replace(tzinfo=timezone(timedelta(hours=2)))
+    assert format_datetime(aware) == '20300304T070000Z'
+
+
+def test_calendar_reads_back():
+    title = 'Revision; chapters 1, 2 and 3 \\ ' + 'with a long tail ' * 8 + 'déjà vu'
+    text = ''.join(iter_calendar([('a@mayday', title, START, START + timedelta(hours=1)),
+                                  (None, 'Daily', START, START + timedelta(hours=2), 'FREQ=DAILY;COUNT=3', None)]))
+    assert text.startswith('BEGIN:VCALENDAR' + CRLF) and text.endswith('END:VCALENDAR' + CRLF)
+    assert all(len(line.encode('utf-8')) <= MAX_LINE_OCTETS for line in physical_lines(text))
+
+    first, daily = iter_vevents(text.splitlines(keepends=True))
+    assert (first['uid'], first['summary'], first['start'], first['end']) == ('a@mayday', title, START,
+                                                                            START + timedelta(hours=1))
+    assert daily['uid'].endswith('@mayday') and daily['rrule'] == 'FREQ=DAILY;COUNT=3'
@@ -0,0 +1,57 @@
+import pytest
+
+
+@pytest.fixture
+def client(app_context, user_id):
+    client = app_context.app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+    return client
+
+
+def stream(client, job_id, **headers):
+    response = client.get(f'/api/jobs/{job_id}/events', headers=headers)
+    assert response.mimetype == 'text/event-stream'
+    return response.get_data(as_text=True)
+
+
+def test_progress_then_done(app_context, user_id, client):
+    queue = app_context.job_queue()
+    job_id = queue.enqueue('ai_schedule', {}, user_id=user_id)
+    queue.publish(job_id, 'plan', {'sessions': 1})
+    queue.complete(job_id, {'event_added': True})
+
+    body = stream(client, job_id)
+    assert body.startswith(f'retry: {app_context.SSE_RECONNECT}\n\n')
+    assert 'event: plan\ndata: {"sessions": 1}' in body
+    assert body.endswith('event: done\ndata: {"result": {"event_added": true}, "error": null}\n\n')
+
+
+def test_streams_are_short_and_resume(app_context, user_id, client, monkeypatch):
+    queue = app_context.job_queue()
+    monkeypatch.setattr(app_context, 'SSE_WINDOW', 0.2)
+    monkeypatch.setattr(app_context, 'SSE_POLL_INTERVAL', 0.05)
+    job_id = queue.enqueue('ai_schedule', {}, user_id=user_id)
+    queue.publish(job_id, 'plan', {'sessions': 2})
+
+    # Still running: the stream ends on its own and the browser reconnects
+    body = stream(client, job_id)
+    assert 'event: plan' in body and 'event: done' not in body
+    seq = queue.events(job_id)[-1][0]
+
+    queue.publish(job_id, 'session', {'day': 1})
+    queue.complete(job_id, {})
+    body = stream(client, job_id, **{'Last-Event-ID': str(seq)})
+    assert 'event: plan' not in body
+    assert 'event: session' in body and 'event: done' in body
+
+
+def test_other_users_jobs_are_hidden(app_context, user_id, client):
+    job_id = app_context.job_queue().enqueue('ai_schedule', {}, user_id=user_id + 10 ** 6)
+    assert client.get(f'/api/jobs/{job_id}/events').status_code == 404
+
+
+def test_malformed_last_event_id(app_context, user_id, client):
+    job_id = app_context.job_queue().enqueue('ai_schedule', {}, user_id=user_id)
+    assert client.get(f'/api/jobs/{job_id}/events', headers={'Last-Event-ID': 'abc'}).status_code == 400
+    assert client.get(f'/api/jobs/{job_id}/events?after=x').status_code == 400
@@ -0,0 +1,115 @@
+import pytest
+
+from job_queue import JobQueue, QueueFull, WorkerPool
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.db'), max_running_per_user=1, max_queued_per_user=3, backoff=0)
+
+
+def test_jobs_run_in_order(queue):
+    first = queue.enqueue('echo', {'n': 1})
+    second = queue.enqueue('echo', {'n': 2})
+    assert queue.claim()['id'] == first
+    job = queue.claim()
+    assert (job['id'], job['status'], job['attempts'], job['payload']) == (second, 'running', 1, {'n': 2})
+    assert queue.claim() is None
+    queue.complete(second, {'ok': True})
+    assert queue.get(second)['result'] == {'ok': True}
+    assert queue.get(second)['status'] == 'done'
+
+
+def test_one_running_job_per_user(queue):
+    first = queue.enqueue('echo', {}, user_id=1)
+    queue.enqueue('echo', {}, user_id=1)
+    other = queue.enqueue('echo', {}, user_id=2)
+    assert queue.claim()['id'] == first
+    # User 1's second job waits for the first, user 2's doesn't
+    assert queue.claim()['id'] == other
+    assert queue.claim() is None
+    queue.complete(first, None)
+    assert queue.claim()['user_id'] == 1
+
+
+def test_queue_limit_per_user(queue):
+    for _ in range(3):
+        queue.enqueue('echo', {}, user_id=1)
+    with pytest.raises(QueueFull):
+        queue.enqueue('echo', {}, user_id=1)
+    queue.enqueue('echo', {}, user_id=2)
+
+
+def test_failed_jobs_are_retried_then_failed(queue):
+    job_id = queue.enqueue('echo', {}, max_attempts=2)
+    queue.claim()
+    queue.fail(job_id, 'boom')
+    assert queue.get(job_id)['status'] == 'queued'
+    assert [kind for _, kind, _ in queue.events(job_id)] == ['retry']
+    assert queue.claim()['attempts'] == 2
+    queue.fail(job_id, 'boom again')
+    job = queue.get(job_id)
+    assert (job['status'], job['error']) == ('failed', 'boom again')
+    assert queue.metrics()['retried'] == 1
+
+
+def test_events_after_a_sequence_number(queue):
+    job_id = queue.enqueue('echo', {})
+    queue.publish(job_id, 'plan', {'sessions': 2})
+    queue.publish(job_id, 'session', {'day': 1})
+    events = queue.events(job_id)
+    assert [(kind, data) for _, kind, data in events] == [('plan', {'sessions': 2}), ('session', {'day': 1})]
+    assert queue.events(job_id, after=events[0][0]) == events[1:]
+
+
+def test_stale_jobs_are_requeued_and_old_ones_pruned(queue):
+    job_id = queue.enqueue('echo', {})
+    queue.claim()
+    assert queue.requeue_stale(stale_after=-1) == 1
+    assert queue.get(job_id)['status'] == 'queued'
+    queue.claim()
+    queue.complete(job_id, None)
+    assert queue.prune(retention=-1) == 1
+    assert queue.get(job_id) is None
+
+
+def test_worker_pool_runs_handlers(queue):
+    def handler(payload, progress):
+        progress('step', {'n': payload['n']})
+        if payload['n'] < 0:
+            raise ValueError('negative')
+        return payload['n'] * 2
+
+    pool = WorkerPool(queue, {'double': handler}, workers=0)
+    good = queue.enqueue('double', {'n': 4})
+    bad = queue.enqueue('double', {'n': -1}, max_attempts=1)
+    unknown = queue.enqueue('missing', {}, max_attempts=1)
+    while pool.run_one():
+        pass
+    assert queue.get(good)['result'] == 8
+    assert queue.get(bad)['status'] == 'failed'
+    assert 'No handler' in queue.get(unknown)['error']
+    assert [kind for _, kind, _ in queue.events(good)] == ['step']
+
+
+def test_metrics(queue):
+    queue.enqueue('echo', {}, user_id=1)
+    queue.enqueue('echo', {}, user_id=2)
+    queue.claim()
+    metrics = queue.metrics()
+    assert (metrics['queued'], metrics['running'], metrics['depth'], metrics['active_users']) == (1, 1, 1, 2)
+
+
+def test_a_retry_replaces_the_failed_attempts_progress(queue):
+    job_id = queue.enqueue('plan', {})
+    queue.claim()
+    queue.publish(job_id, 'plan', {'sessions': 2})
+    queue.publish(job_id, 'session', {'day': 1})
+    queue.fail(job_id, 'timeout')
+    queue.claim()
+    queue.publish(job_id, 'plan', {'sessions': 2})
+    assert [kind for _, kind, _ in queue.events(job_id)] == ['retry', 'plan']
+
+    # A job taken back from a worker that died starts over too
+    queue.requeue_stale(stale_after=-1)
+    assert [kind for _, kind, _ in queue.events(job_id)] == ['retry', 'retry']
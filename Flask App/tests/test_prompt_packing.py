@@ -0,0 +1,107 @@
+import json
+import re
+
+from prompt_packing import estimate_tokens, pack, packed_prompt, request_packed, split_response
+
+NUMBERED = re.compile(r'^(\d+)\. (.*)$', re.MULTILINE)
+
+
+def schedule(name):
+    return {'multi_day': False, 'analysis': '', 'sessions': [{'name': name, 'day': 1, 'start': '09:00',
+                                                              'end': '10:00'}]}
+
+
+def test_pack_keeps_order_within_the_budget():
+    prompts = ['x' * 40] * 10
+    cost = estimate_tokens(prompts[0]) + 4 + 100
+    batches = pack(prompts, overhead_tokens=50, output_tokens=100, budget=50 + 3 * cost, max_completion=10000)
+    assert batches == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+    # The completion allowance caps a batch as well
+    assert pack(prompts, 50, 100, budget=100000, max_completion=250) == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9]]
+
+
+def test_a_task_over_budget_gets_a_request_of_its_own():
+    assert pack(['short', 'x' * 4000, 'short'], 10, 10, budget=200) == [[0], [1], [2]]
+
+
+def test_split_json_answers_by_task_number():
+    text = json.dumps({'schedules': [dict(schedule('B'), task=2), dict(schedule('A'), task=1),
+                                     dict(schedule('again'), task=1), dict(schedule('far'), task=9), 'junk']})
+    answers = split_response(f'```json\n{text}\n```', 3)
+    assert json.loads(answers[0]) == schedule('A')
+    assert json.loads(answers[1]) == schedule('B')
+    assert answers[2] is None
+
+
+def test_split_json_falls_back_to_position():
+    text = json.dumps({'schedules': [dict(schedule('A'), task='first'), schedule('B')]})
+    assert [json.loads(answer)['sessions'][0]['name'] for answer in split_response(text, 2)] == ['A', 'B']
+    assert split_response('{"schedules": "none"}', 2) == [None, None]
+    assert split_response('{"schedules": [', 1) == [None]
+
+
+def test_split_text_answers_by_header():
+    text = ('Sure!\n### Task 2\nTask Analysis:\nShort.\n\n**Task 1**\nTask Analysis:\nLong.\n'
+            '### Task 3\n')
+    assert split_response(text, 3) == ['Task Analysis:\nLong.', 'Task Analysis:\nShort.', None]
+
+
+class FakeModel:
+    """Answers JSON for every numbered task, cut off after fits tasks."""
+
+    def __init__(self, fits):
+        self.fits = fits
+        self.calls = []
+
+    def __call__(self, message, max_tokens):
+        tasks = NUMBERED.findall(message)
+        self.calls.append([prompt for _, prompt in tasks])
+        answered = [dict(schedule(prompt), task=int(number)) for number, prompt in tasks[:self.fits]]
+        text = json.dumps({'schedules': answered})
+        truncated = len(tasks) > self.fits
+        if truncated:
+            # Cut inside the last answer, as max_tokens does
+            text = text[:-5]
+        return text, {'prompt_tokens': 10, 'completion_tokens': 20, 'total_tokens': 30}, truncated
+
+
+def names(answers):
+    return [json.loads(answer)['sessions'][0]['name'] if answer else None for answer in answers]
+
+
+def test_one_request_when_everything_fits():
+    model = FakeModel(fits=10)
+    answers, report = request_packed(['a', 'b', 'c'], model, True, 100)
+    assert names(answers) == ['a', 'b', 'c']
+    assert (report['requests'], report['total_tokens']) == (1, 30)
+
+
+def test_truncated_answers_are_asked_again_in_halves():
+    model = FakeModel(fits=2)
+    prompts = [f'task {number}' for number in range(6)]
+    answers, report = request_packed(prompts, model, True, 100)
+    assert names(answers) == prompts
+    assert model.calls[0] == prompts
+    # Every later request is for missing tasks only, and no larger than half of what was missing
+    assert all(len(call) <= 3 for call in model.calls[1:])
+    assert report['requests'] == len(model.calls) > 1
+
+
+def test_rejected_answers_are_retried_alone():
+    model = FakeModel(fits=10)
+    seen = []
+
+    def accept(answer):
+        seen.append(answer)
+        # Refuse 'b' the first time only
+        return 'b' not in answer or seen.count(answer) > 1
+
+    answers, report = request_packed(['a', 'b'], model, True, 100, accept=accept)
+    assert names(answers) == ['a', 'b']
+    assert model.calls == [['a', 'b'], ['b']]
+
+
+def test_packed_prompt_numbers_the_tasks():
+    message = packed_prompt(['Essay', 'Lab report'], json_output=False)
+    assert message.endswith('\n1. Essay\n2. Lab report')
+    assert '### Task N' in message
@@ -0,0 +1,88 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from recurrence import (MAX_COUNT, add_exdate, compact, expand, parse_exdates, recurrence_lines, series_end,
+                        validate_rule)
+
+START = datetime(2030, 3, 4, 9)
+
+
+def test_validate_rule_strips_the_prefix():
+    assert validate_rule(' RRULE:FREQ=WEEKLY;BYDAY=MO,WE ', START) == 'FREQ=WEEKLY;BYDAY=MO,WE'
+    assert validate_rule('FREQ=DAILY;COUNT=3', START) == 'FREQ=DAILY;COUNT=3'
+
+
+def test_utc_until_with_a_naive_start():
+    rule = validate_rule('RRULE:FREQ=DAILY;UNTIL=20300306T090000Z', START)
+    assert rule == 'FREQ=DAILY;UNTIL=20300306T090000'
+    assert expand(rule, START, None, START, limit=10) == tuple(START + timedelta(days=day) for day in range(3))
+
+
+@pytest.mark.parametrize('rule', ['FREQ=SOMETIMES', 'FREQ=DAILY;COUNT=x', 'not a rule', '',
+                                  'FREQ=SECONDLY;UNTIL=20310304T090000', 'FREQ=MINUTELY;COUNT=200000',
+                                  f'FREQ=DAILY;COUNT={MAX_COUNT + 1}'])
+def test_invalid_rules_raise_value_error(rule):
+    with pytest.raises(ValueError):
+        validate_rule(rule, START)
+
+
+def test_expand_in_a_window():
+    starts = expand('FREQ=DAILY', START, None, START + timedelta(days=2), START + timedelta(days=5))
+    assert starts == tuple(START + timedelta(days=day) for day in (2, 3, 4))
+
+
+def test_expand_skips_exdates_and_stops_at_limit():
+    exdates = add_exdate(None, START + timedelta(days=1))
+    starts = expand('FREQ=DAILY', START, exdates, START, limit=3)
+    assert starts == (START, START + timedelta(days=2), START + timedelta(days=3))
+
+
+def test_expand_needs_a_bound():
+    with pytest.raises(ValueError):
+        expand('FREQ=DAILY', START, None, START)
+
+
+def test_exdates_round_trip():
+    moments = {START, START + timedelta(days=7)}
+    value = add_exdate(add_exdate(None, START + timedelta(days=7)), START)
+    assert parse_exdates(value) == moments
+    assert add_exdate(value, START) == value
+
+
+def test_series_end():
+    hour = timedelta(hours=1)
+    assert series_end('FREQ=DAILY;COUNT=3', START, hour) == START + timedelta(days=2) + hour
+    assert series_end('FREQ=WEEKLY;UNTIL=20300318T090000', START, hour) == START + timedelta(days=14) + hour
+    assert series_end('FREQ=DAILY', START, hour) is None
+
+
+def test_series_end_does_not_step_through_an_until():
+    rule = validate_rule('FREQ=HOURLY;UNTIL=22300304T090000Z', START)
+    started = time.perf_counter()
+    # Ends by UNTIL, even if the last occurrence is earlier
+    assert series_end(rule, START, timedelta(minutes=30)) == datetime(2230, 3, 4, 9, 30)
+    assert series_end('FREQ=WEEKLY;UNTIL=20300320T000000', START, timedelta(hours=1)) == datetime(2030, 3, 20, 1)
+    assert time.perf_counter() - started < 0.5
+
+
+def test_recurrence_lines():
+    assert recurrence_lines(None, None) == []
+    exdates = add_exdate(None, START + timedelta(days=1))
+    assert recurrence_lines('FREQ=DAILY;COUNT=3', exdates) == ['RRULE:FREQ=DAILY;COUNT=3',
+                                                              'EXDATE:20300305T090000Z']
+
+
+def test_compact_folds_daily_repeats():
+    hour = timedelta(hours=1)
+    events = [('Revision', START + timedelta(days=day), START + timedelta(days=day) + hour) for day in (0, 2, 4)]
+    events.append(('Exam', START + timedelta(days=5), START + timedelta(days=5) + 2 * hour))
+    assert compact(events) == [('Revision', START, START + hour, 'FREQ=DAILY;COUNT=3;INTERVAL=2'),
+                               ('Exam', START + timedelta(days=5), START + timedelta(days=5) + 2 * hour, None)]
+
+
+def test_compact_keeps_irregular_sessions_apart():
+    hour = timedelta(hours=1)
+    events = [('Gym', START + timedelta(days=day), START + timedelta(days=day) + hour) for day in (0, 1, 3)]
+    assert [rule for _, _, _, rule in compact(events)] == ['FREQ=DAILY;COUNT=2', None]
@@ -0,0 +1,86 @@
+import os
+import sys
+from datetime import time
+
+import pytest
+
+from schedule_parser import PlanParser, parse_plan, parse_schedule
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+from schedule_corpus import build_corpus
+
+MAX_SESSIONS = 14
+CORPUS = build_corpus(seed=0, size=500)
+
+
+def parsed(entry):
+    """The answer as parsed, in the corpus' form, or None."""
+    if entry['kind'] == 'plan':
+        plan = parse_plan(entry['text'], MAX_SESSIONS)
+        return tuple(plan) if plan is not None else None
+    schedule = parse_schedule(entry['text'])
+    if schedule is None:
+        return None
+    return [(session.day, session.start, session.end) for session in schedule.sessions]
+
+
+@pytest.mark.parametrize('category', sorted({entry['category'] for entry in CORPUS}))
+def test_corpus(category):
+    for entry in CORPUS:
+        if entry['category'] != category:
+            continue
+        # Fuzzed answers have no right answer, but must never raise
+        found = parsed(entry)
+        if entry['answer'] is not None:
+            assert found == entry['answer'], entry['text']
+
+
+def test_text_schedule():
+    schedule = parse_schedule('Multi-day task: Yes\n\nTask Analysis:\nLots to cover.\n\nScheduling Plan:\n'
+                              'Calculus: 2 hours\nDay: 1\nTime: 09:00 - 11:00\nTopic/Activity: Limits\n\n'
+                              'Calculus: 1 hours\nDay: 2\nTime: 14:00 - 15:00\nTopic/Activity: Derivatives\n')
+    assert schedule.multi_day
+    assert schedule.analysis == 'Lots to cover.'
+    assert [(session.day, session.start, session.end, session.topic) for session in schedule.sessions] == [
+        (1, time(9), time(11), 'Limits'), (2, time(14), time(15), 'Derivatives')]
+
+
+def test_json_schedule():
+    schedule = parse_schedule('```json\n{"multi_day": false, "analysis": "Short", "sessions": '
+                              '[{"name": "Essay", "day": 1, "start": "10:00", "end": "11:30"}]}\n```')
+    assert not schedule.multi_day
+    assert schedule.sessions[0].name == 'Essay' and schedule.sessions[0].end == time(11, 30)
+
+
+def test_plans():
+    assert tuple(parse_plan('Duration: 3 hours\nSessions: 2', MAX_SESSIONS)) == (3, 'hour', 2)
+    assert tuple(parse_plan('{"duration": 45, "unit": "minutes", "sessions": 40}', MAX_SESSIONS)) == (
+        45, 'minute', MAX_SESSIONS)
+    assert parse_plan('Sessions: 2', MAX_SESSIONS) is None
+    assert parse_plan('', MAX_SESSIONS) is None
+
+
+@pytest.mark.parametrize('text, plan', [
+    ('Duration: 1.5 hours\nSessions: 2', (90, 'minute', 2)),
+    ('Duration: 2.0 hours', (2, 'hour', 1)),
+    ('Duration: 45 min\nSessions: 3', (45, 'minute', 3)),
+    ('**Duration:** 2 hrs', (2, 'hour', 1)),
+    ('Duration: 2 hours, Sessions: 3', (2, 'hour', 3)),
+    ('Sessions: 4, Duration: 30 minutes', (30, 'minute', 4)),
+    ('{"duration": 1.5, "unit": "hours", "sessions": 2}', (90, 'minute', 2)),
+])
+def test_plan_variations(text, plan):
+    assert tuple(parse_plan(text, MAX_SESSIONS)) == plan
+
+
+@pytest.mark.parametrize('text', ['Duration: 3 months', 'Duration: 0 hours', '{"duration": "nan"}',
+                                  '{"duration": 1e400}'])
+def test_plans_without_a_duration(text):
+    assert parse_plan(text, MAX_SESSIONS) is None
+
+
+def test_plan_parser_stops_early():
+    parser = PlanParser(MAX_SESSIONS)
+    assert not parser.feed('Duration: 2 hours')
+    assert parser.feed('Sessions: 3')
+    assert parser.plan().sessions == 3
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from slot_planner import free_slots, place_sessions, round_up
+
+NOW = datetime(2030, 3, 4, 10, 7)
+HOUR = timedelta(hours=1)
+
+
+def day(offset, hour, minute=0):
+    return datetime(2030, 3, 4, hour, minute) + timedelta(days=offset)
+
+
+def test_round_up():
+    assert round_up(NOW) == day(0, 10, 15)
+    assert round_up(day(0, 10)) == day(0, 10)
+
+
+def test_free_slots_skip_busy_time_and_nights():
+    busy = [(day(0, 9), day(0, 12)), (day(0, 11), day(0, 13)), (day(0, 20), day(1, 10))]
+    assert list(free_slots(busy, day(0, 8), day(1, 12))) == [(day(0, 13), day(0, 20)), (day(1, 10), day(1, 12))]
+
+
+def test_earliest_takes_the_first_days_with_room():
+    # Day 1 is full, so the second session moves to day 2
+    busy = [(day(0, 10), day(0, 11)), (day(1, 9), day(1, 21))]
+    slots = place_sessions(busy, 2 * HOUR, sessions=2, now=NOW)
+    assert slots == [(day(0, 11), day(0, 13)), (day(2, 9), day(2, 11))]
+
+
+def test_earliest_rounds_now_up():
+    assert place_sessions([], HOUR, now=NOW) == [(day(0, 10, 15), day(0, 11, 15))]
+
+
+def test_balanced_spreads_sessions_over_the_horizon():
+    slots = place_sessions([], HOUR, sessions=3, now=NOW, strategy='balanced', horizon_days=30)
+    assert [start.date() for start, _ in slots] == [day(offset, 0).date() for offset in (0, 10, 20)]
+    assert slots[1] == (day(10, 9), day(10, 10))
+
+
+def test_balanced_keeps_days_for_the_remaining_sessions():
+    # Only days 0-3 have room, so the targets (days 0, 3 and 6) move back to leave a day for the last
+    busy = [(day(4, 0), day(12, 0))]
+    slots = place_sessions(busy, HOUR, sessions=3, now=NOW, strategy='balanced', horizon_days=9)
+    assert [start.date() for start, _ in slots] == [day(offset, 0).date() for offset in (0, 2, 3)]
+
+
+def test_a_full_calendar_gives_fewer_sessions():
+    busy = [(day(1, 0), day(40, 0))]
+    for strategy in ('earliest', 'balanced'):
+        assert place_sessions(busy, HOUR, sessions=3, now=NOW, strategy=strategy) == [(day(0, 10, 15),
+                                                                                         day(0, 11, 15))]
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        place_sessions([], HOUR, now=NOW, strategy='latest')
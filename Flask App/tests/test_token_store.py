@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+from google.auth.exceptions import RefreshError
+from google.oauth2.credentials import Credentials
+
+from token_store import TokenStore
+
+
+def credentials(token='old', expires_in=timedelta(hours=1), refresh_token='refresh'):
+    result = Credentials(token=token, refresh_token=refresh_token, token_uri='https://oauth2.example/token',
+                         client_id='client', client_secret='secret')
+    result.expiry = datetime.utcnow() + expires_in
+    return result
+
+
+class Google:
+    """Stands in for the token endpoint: hands out numbered tokens, or refuses revoked grants."""
+
+    def __init__(self):
+        self.calls = 0
+        self.revoked = set()
+
+    def __call__(self, creds):
+        self.calls += 1
+        if creds.refresh_token in self.revoked:
+            raise RefreshError('invalid_grant: Token has been expired or revoked.')
+        creds.token = f'new-{self.calls}'
+        creds.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+@pytest.fixture
+def google():
+    return Google()
+
+
+@pytest.fixture
+def store(tmp_path, google):
+    store = TokenStore(str(tmp_path / 'tokens.db'), refresh_ahead=timedelta(minutes=10), refresh=google)
+    yield store
+    store.stop()
+
+
+def test_fresh_tokens_are_served_from_the_cache(store, google):
+    saved = credentials()
+    store.save(1, saved)
+    assert store.get(1) is saved and store.get('1') is saved
+    assert google.calls == 0
+    assert store.get(2) is None
+
+
+def test_expired_tokens_are_refreshed_in_place(store, google):
+    saved = credentials(expires_in=timedelta(minutes=-1))
+    store.save(1, saved)
+    assert store.get(1) is saved
+    assert (saved.token, google.calls, store.stats()['refreshes']) == ('new-1', 1, 1)
+    # The new token is stored for other processes too
+    other = TokenStore(store.path, refresh=google)
+    assert other.get(1).token == 'new-1'
+
+
+def test_refresher_renews_tokens_before_they_expire(store, google):
+    soon, later = credentials(expires_in=timedelta(minutes=5)), credentials(expires_in=timedelta(hours=2))
+    store.save('soon', soon)
+    store.save('later', later)
+    assert store.refresh_due() == 1
+    assert (soon.token, later.token) == ('new-1', 'old')
+    # Nothing is left due
+    assert store.refresh_due() == 0
+    # A request doesn't refresh a token that is only due soon, the refresher does
+    store.save('soon', credentials(token='again', expires_in=timedelta(minutes=5)))
+    assert store.get('soon').token == 'again'
+
+
+def test_revoked_grants_are_dropped(store, google):
+    store.save(1, credentials(expires_in=timedelta(minutes=-1), refresh_token='revoked'))
+    google.revoked.add('revoked')
+    assert store.get(1) is None
+    assert store.stats() == {'tokens': 0, 'cached': 0, 'refreshes': 0, 'failures': 1}
+    assert store.get(1) is None
+    assert google.calls == 1
+
+
+def test_revoked_grants_found_by_the_refresher(store, google):
+    store.save(1, credentials(expires_in=timedelta(minutes=5), refresh_token='revoked'))
+    google.revoked.add('revoked')
+    assert store.refresh_due() == 1
+    assert store.get(1) is None
+
+
+def test_delete(store):
+    store.save(1, credentials())
+    store.delete(1)
+    assert store.get(1) is None and store.stats()['tokens'] == 0
+
+
+def test_background_refresher(store, google):
+    store.save(1, credentials(expires_in=timedelta(minutes=5)))
+    store.start_refresher(interval=0.01)
+    store.start_refresher(interval=0.01)
+    store.stop()
+    assert store.get(1).token == 'new-1'
@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+import upstream
+from upstream import CircuitBreaker, CircuitOpen, Upstream
+
+
+class Status(Exception):
+    def __init__(self, status):
+        super().__init__(f'HTTP {status}')
+        self.status_code = status
+
+
+def flaky(*errors, result='ok'):
+    """A function that raises errors in turn, then returns result."""
+    calls = []
+
+    def function(*args, **kwargs):
+        calls.append(kwargs)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    function.calls = calls
+    return function
+
+
+def test_retryable_errors_are_retried():
+    service = Upstream('test', retries=3, backoff=0.001)
+    function = flaky(Status(503), Status(429), ConnectionError())
+    assert service.call(function) == 'ok'
+    assert len(function.calls) == 4
+    assert service.stats()['retries'] == 3
+
+
+def test_other_errors_are_raised_at_once():
+    service = Upstream('test', retries=3, backoff=0.001)
+    function = flaky(Status(400))
+    with pytest.raises(Status):
+        service.call(function)
+    assert len(function.calls) == 1
+    # A bad request says nothing about the upstream's health
+    assert service.breaker.state == 'closed'
+
+
+def test_retries_run_out():
+    service = Upstream('test', retries=2, backoff=0.001)
+    function = flaky(*[Status(500)] * 5)
+    with pytest.raises(Status):
+        service.call(function)
+    assert len(function.calls) == 3
+    assert service.stats()['failures'] == 1
+
+
+def test_deadline_cuts_retries_short():
+    service = Upstream('test', deadline=0.05, retries=10, backoff=1.0, max_backoff=1.0)
+    function = flaky(*[Status(503)] * 10)
+    started = time.monotonic()
+    with pytest.raises(Status):
+        service.call(function)
+    assert time.monotonic() - started < 1.0
+    assert len(function.calls) < 11
+    assert service.stats()['deadline_exceeded'] == 1
+
+
+def test_timeout_argument_gets_the_time_left():
+    service = Upstream('test', deadline=5.0)
+    function = flaky()
+    service.call(function, timeout_arg='timeout')
+    assert 0 < function.calls[0]['timeout'] <= 5.0
+
+
+def test_breaker_opens_then_lets_a_trial_through(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(upstream.time, 'monotonic', lambda: clock[0])
+    breaker = CircuitBreaker(failures=2, reset_after=10)
+    service = Upstream('test', retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(Status):
+            service.call(flaky(Status(503)))
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpen):
+        service.call(flaky())
+    assert service.stats()['short_circuited'] == 1
+
+    clock[0] += 10
+    assert breaker.state == 'half_open'
+    assert breaker.allow()
+    # Only one trial at a time
+    assert not breaker.allow()
+    breaker.failed()
+    assert breaker.state == 'open'
+
+    clock[0] += 10
+    assert service.call(flaky()) == 'ok'
+    assert breaker.state == 'closed'
+
+
+def test_hedged_call_takes_the_faster_answer():
+    service = Upstream('test', hedge_after=0.02)
+    answers = iter((0.5, 0.0))
+    discarded = []
+
+    def slow_then_fast():
+        delay = next(answers)
+        time.sleep(delay)
+        return delay
+
+    assert service.call(slow_then_fast, hedge=True, discard=discarded.append) == 0.0
+    assert service.stats()['hedge_wins'] == 1
+    time.sleep(0.6)
+    assert discarded == [0.5]
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv('TESTSVC_RETRIES', '7')
+    monkeypatch.setenv('TESTSVC_HEDGE_AFTER', '0')
+    service = upstream.from_env('testsvc', deadline=3.0)
+    assert (service.retries, service.deadline, service.hedge_after) == (7, 3.0, None)
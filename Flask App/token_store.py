@@ -0,0 +1,197 @@
+"""Google OAuth tokens kept server-side, shared by the web app and the CLI.
+
+Tokens live in a SQLite table keyed by user, with the Credentials objects
+cached in process. A background thread refreshes access tokens a while
+before they expire, so a Google call never waits on a refresh unless that
+thread fell behind (or isn't running, as in the one-shot CLI).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from gcal_service import credentials_from_dict, credentials_to_dict
+
+TOKEN_STORE_PATH = os.getenv('TOKEN_STORE_PATH', 'tokens.db')
+# Refresh this long before expiry; more than google-auth's own margin, so it never refreshes first
+REFRESH_AHEAD = timedelta(seconds=int(os.getenv('TOKEN_REFRESH_AHEAD', '600')))
+REFRESH_INTERVAL = int(os.getenv('TOKEN_REFRESH_INTERVAL', '60'))
+
+
+def _utcnow():
+    # google-auth keeps expiry as a naive UTC datetime
+    return datetime.utcnow()
+
+
+def _refresh_with_google(credentials):
+    # google-auth's requests transport pulls in requests; only load it when a token is due
+    from google.auth.transport.requests import Request
+    credentials.refresh(Request())
+
+
+def _expiry_text(credentials):
+    return credentials.expiry.isoformat(timespec='seconds') if credentials.expiry else None
+
+
+class TokenStore:
+    """OAuth credentials per user, in SQLite and cached in memory.
+
+    Keys are strings; the web app uses the user id and the CLI a name of
+    its own (GOOGLE_TOKEN_USER). get() returns google-auth Credentials that
+    Calendar services can hold on to: refreshes update the same object in
+    place, so a cached service picks up the new token. refresh(), if
+    given, replaces the call to Google for tests and benchmarks.
+    """
+
+    def __init__(self, path=TOKEN_STORE_PATH, refresh_ahead=REFRESH_AHEAD, refresh=None):
+        self.path = path
+        self.refresh_ahead = refresh_ahead
+        self._refresh_with = refresh or _refresh_with_google
+        self.cache = {}
+        self.refreshes = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+        # One refresh at a time, so the refresher and a request don't both refresh a token
+        self.refreshing = threading.Lock()
+        self.stopping = threading.Event()
+        self.refresher = None
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS oauth_tokens ('
+            ' user_key TEXT PRIMARY KEY,'
+            ' info TEXT NOT NULL,'
+            ' refresh_token TEXT,'
+            ' expiry TEXT,'
+            ' updated_at REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS oauth_tokens_expiry ON oauth_tokens (expiry)')
+        self.conn.commit()
+
+    def save(self, user_key, credentials):
+        """Store (or replace) a user's credentials."""
+        key = str(user_key)
+        info = credentials_to_dict(credentials)
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO oauth_tokens (user_key, info, refresh_token, expiry, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, json.dumps(info), credentials.refresh_token, _expiry_text(credentials), time.time()))
+            self.conn.commit()
+            self.cache[key] = credentials
+
+    def _load(self, key):
+        """Read a user's credentials, keeping the cached object if the token is unchanged."""
+        with self.lock:
+            row = self.conn.execute('SELECT info FROM oauth_tokens WHERE user_key = ?', (key,)).fetchone()
+            if row is None:
+                self.cache.pop(key, None)
+                return None
+            info = json.loads(row[0])
+            cached = self.cache.get(key)
+            if (cached is not None and cached.token == info.get('token')
+                    and cached.refresh_token == info.get('refresh_token')):
+                return cached
+            credentials = credentials_from_dict(info)
+            self.cache[key] = credentials
+            return credentials
+
+    def _due(self, credentials, ahead):
+        if not credentials.refresh_token:
+            return False
+        if credentials.expiry is None:
+            return not credentials.token
+        return credentials.expiry - ahead <= _utcnow()
+
+    def get(self, user_key):
+        """Return a user's Credentials, or None if they haven't connected Google.
+
+        Only a token that is already expired is refreshed here; the
+        refresher keeps the rest ahead of expiry. Credentials whose grant
+        was revoked are dropped.
+        """
+        key = str(user_key)
+        with self.lock:
+            credentials = self.cache.get(key)
+        if credentials is None or self._due(credentials, self.refresh_ahead):
+            # Another process may have refreshed it already
+            credentials = self._load(key)
+        if credentials is None or not credentials.refresh_token:
+            return credentials
+        if (credentials.expired or not credentials.token) and not self.refresh(key, credentials):
+            return None
+        return credentials
+
+    def delete(self, user_key):
+        key = str(user_key)
+        with self.lock:
+            self.conn.execute('DELETE FROM oauth_tokens WHERE user_key = ?', (key,))
+            self.conn.commit()
+            self.cache.pop(key, None)
+
+    def refresh(self, user_key, credentials, ahead=timedelta(0)):
+        """Refresh and save credentials unless someone else just did; returns whether they are usable."""
+        from google.auth.exceptions import RefreshError
+        key = str(user_key)
+        with self.refreshing:
+            if credentials.token and not credentials.expired and not self._due(credentials, ahead):
+                return True
+            try:
+                self._refresh_with(credentials)
+            except RefreshError as e:
+                # Revoked or expired grant: the user has to connect Google again
+                print(f"Error: {str(e)}")
+                self.delete(key)
+                with self.lock:
+                    self.failures += 1
+                return False
+            self.save(key, credentials)
+            with self.lock:
+                self.refreshes += 1
+            return True
+
+    def refresh_due(self):
+        """Refresh every stored token that expires within refresh_ahead; returns how many were due."""
+        deadline = (_utcnow() + self.refresh_ahead).isoformat(timespec='seconds')
+        with self.lock:
+            keys = [key for key, in self.conn.execute(
+                'SELECT user_key FROM oauth_tokens WHERE refresh_token IS NOT NULL AND expiry < ?', (deadline,))]
+        for key in keys:
+            credentials = self._load(key)
+            if credentials is not None:
+                try:
+                    self.refresh(key, credentials, self.refresh_ahead)
+                except Exception as e:
+                    # A network error; the next round tries again
+                    print(f"Error: {str(e)}")
+        return len(keys)
+
+    def start_refresher(self, interval=REFRESH_INTERVAL):
+        """Start the background refresher, if it isn't running yet."""
+        with self.lock:
+            if self.refresher is not None:
+                return
+            self.stopping.clear()
+            self.refresher = threading.Thread(target=self._refresh_loop, args=(interval,), daemon=True,
+                                              name='token-refresher')
+            self.refresher.start()
+
+    def _refresh_loop(self, interval):
+        while True:
+            self.refresh_due()
+            if self.stopping.wait(interval):
+                return
+
+    def stop(self):
+        self.stopping.set()
+        with self.lock:
+            refresher, self.refresher = self.refresher, None
+        if refresher is not None:
+            refresher.join()
+
+    def stats(self):
+        with self.lock:
+            tokens = self.conn.execute('SELECT COUNT(*) FROM oauth_tokens').fetchone()[0]
+        return {'tokens': tokens, 'cached': len(self.cache), 'refreshes': self.refreshes,
+                'failures': self.failures}
@@ -0,0 +1,288 @@
+"""Deadlines, retries, hedging and circuit breaking for calls to OpenAI and Google.
+
+Every outbound call goes through an Upstream, one per service. A call has
+a deadline covering all of its attempts; retryable failures (429, 5xx,
+timeouts and connection errors) are tried again after a jittered
+exponential backoff, as long as the deadline leaves room. After enough
+consecutive failures the circuit opens and calls fail at once with
+CircuitOpen until a trial call gets through. Idempotent calls can be
+hedged: if the first attempt hasn't answered after hedge_after seconds a
+second one is sent, and whichever answers first wins.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import UPSTREAM_SECONDS
+
+DEADLINE = 60.0
+RETRIES = 3
+BACKOFF = 0.5
+MAX_BACKOFF = 8.0
+# Consecutive failures that open the circuit, and how long it stays open
+BREAKER_FAILURES = 5
+BREAKER_RESET = 30.0
+HEDGE_WORKERS = 16
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+# Errors without an HTTP status that mean the request timed out or never
+# got an answer, as (module, attribute path) so that neither library has
+# to be imported just to classify errors
+TRANSPORT_ERRORS = (('httplib2', 'HttpLib2Error'), ('openai', 'APIConnectionError'),
+                    ('openai', 'error.APIConnectionError'), ('openai', 'error.Timeout'))
+COUNTERS = ('calls', 'attempts', 'retries', 'hedges', 'hedge_wins', 'failures', 'deadline_exceeded',
+            'short_circuited')
+
+
+class CircuitOpen(Exception):
+    """The upstream failed too often lately; the call wasn't sent."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call had no answer within its deadline."""
+
+
+def status_of(error):
+    """The HTTP status of an OpenAI or Google API error, or None."""
+    response = getattr(error, 'resp', None)
+    if response is not None and hasattr(response, 'status'):
+        return int(response.status)
+    # openai >= 1 has status_code, the 0.x library http_status
+    status = getattr(error, 'status_code', None) or getattr(error, 'http_status', None)
+    return int(status) if status else None
+
+
+def is_retryable(error):
+    status = status_of(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    # DeadlineExceeded is a TimeoutError, and so an OSError
+    return isinstance(error, OSError) or any(isinstance(error, kind) for kind in _transport_errors())
+
+
+def _transport_errors():
+    for module_name, path in TRANSPORT_ERRORS:
+        # An error can only come from a library that was imported
+        kind = sys.modules.get(module_name)
+        for name in path.split('.'):
+            kind = getattr(kind, name, None)
+        if isinstance(kind, type):
+            yield kind
+
+
+def backoff_delay(attempt, backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+    """Full-jitter delay before retry number attempt (1 for the first retry)."""
+    return random.uniform(0, min(max_backoff, backoff * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Closed, then open after failures in a row, then half-open after reset_after.
+
+    While half-open one trial call is let through; it closes the circuit
+    if it succeeds and opens it again if not.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half_open' if time.monotonic() - self.opened_at >= self.reset_after else 'open'
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_after or self.trial:
+                return False
+            self.trial = True
+            return True
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or (self.threshold and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+
+class Upstream:
+    """Calls to one service, with its own breaker and counters.
+
+    call(function, *args, **kwargs) runs function(*args, **kwargs) under the
+    policy. With timeout_arg, each attempt also gets the time left before
+    the deadline as that keyword argument ('timeout' for the OpenAI client,
+    'request_timeout' for the 0.x library). Without hedging, attempts run
+    in the calling thread, so a call that ignores its timeout can still
+    overrun the deadline; Google calls rely on the httplib2 timeout for that.
+    """
+
+    def __init__(self, name, deadline=DEADLINE, retries=RETRIES, backoff=BACKOFF, max_backoff=MAX_BACKOFF,
+                 hedge_after=None, breaker=None, retryable=is_retryable):
+        self.name = name
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable = retryable
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.lock = threading.Lock()
+        self._executor = None
+
+    def _count(self, counter, amount=1):
+        with self.lock:
+            self.counts[counter] += amount
+
+    def call(self, function, *args, deadline=None, retries=None, hedge=False, discard=None, timeout_arg=None,
+             **kwargs):
+        """Call function with retries; returns its result or raises its last error.
+
+        hedge sends a second attempt when the first is slow; only use it for
+        calls that are safe to make twice. discard(result) is called on the
+        answer that lost the race, to close a stream, say.
+        """
+        deadline = self.deadline if deadline is None else deadline
+        retries = self.retries if retries is None else retries
+        deadline_at = time.monotonic() + deadline
+        last_error = None
+        self._count('calls')
+
+        def attempt():
+            attempt_kwargs = dict(kwargs)
+            if timeout_arg:
+                attempt_kwargs[timeout_arg] = max(0.001, deadline_at - time.monotonic())
+            return self._attempt(function, args, attempt_kwargs)
+
+        for number in range(retries + 1):
+            if not self.breaker.allow():
+                if number:
+                    # The circuit opened while retrying; report what the upstream said
+                    self._count('failures')
+                    raise last_error
+                self._count('short_circuited')
+                raise CircuitOpen(f'{self.name} is failing; not calling it for now')
+            if number:
+                self._count('retries')
+            try:
+                if hedge and self.hedge_after:
+                    result = self._hedged(attempt, deadline_at, discard)
+                else:
+                    result = attempt()
+            except Exception as error:
+                retryable = self.retryable(error)
+                if retryable:
+                    self.breaker.failed()
+                else:
+                    # The request was at fault, not the upstream
+                    self.breaker.succeeded()
+                delay = backoff_delay(number + 1, self.backoff, self.max_backoff)
+                if not retryable or number == retries or time.monotonic() + delay >= deadline_at:
+                    self._count('failures')
+                    if retryable and number < retries:
+                        self._count('deadline_exceeded')
+                    raise
+                last_error = error
+                time.sleep(delay)
+                continue
+            self.breaker.succeeded()
+            return result
+
+    def _attempt(self, function, args, kwargs):
+        self._count('attempts')
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = function(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.name, outcome)
+
+    def _hedged(self, attempt, deadline_at, discard):
+        """Run attempt, and a second copy if the first is slower than hedge_after."""
+        if self._executor is None:
+            with self.lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(HEDGE_WORKERS, thread_name_prefix=f'{self.name}-hedge')
+        first = self._executor.submit(attempt)
+        pending = [first]
+        hedged = False
+        error = None
+        while pending:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining if hedged else min(self.hedge_after, remaining),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    if hedged and future is not first:
+                        self._count('hedge_wins')
+                    self._abandon(pending, discard)
+                    return future.result()
+                error = future.exception()
+            if not hedged and not done:
+                pending.append(self._executor.submit(attempt))
+                hedged = True
+                self._count('hedges')
+            elif not hedged:
+                break
+        if pending:
+            self._abandon(pending, discard)
+            raise DeadlineExceeded(f'{self.name} did not answer within the deadline')
+        raise error
+
+    def _abandon(self, futures, discard):
+        """Let the losing attempts finish in the background and discard their answers."""
+        def drop(future):
+            if discard is not None and future.exception() is None:
+                try:
+                    discard(future.result())
+                except Exception as e:
+                    print(f"Error: {str(e)}")
+        for future in futures:
+            future.add_done_callback(drop)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        counts['state'] = self.breaker.state
+        return counts
+
+
+def from_env(name, **defaults):
+    """An Upstream for name, configured from the environment.
+
+    NAME_DEADLINE, NAME_RETRIES, NAME_HEDGE_AFTER (unset or 0: no hedging),
+    NAME_BREAKER_FAILURES and NAME_BREAKER_RESET override defaults, which
+    in turn override this module's.
+    """
+    prefix = name.upper()
+
+    def setting(key, cast, fallback):
+        value = os.getenv(f'{prefix}_{key.upper()}')
+        return cast(value) if value not in (None, '') else defaults.get(key, fallback)
+
+    breaker = CircuitBreaker(setting('breaker_failures', int, BREAKER_FAILURES),
+                             setting('breaker_reset', float, BREAKER_RESET))
+    return Upstream(name, deadline=setting('deadline', float, DEADLINE), retries=setting('retries', int, RETRIES),
+                    hedge_after=setting('hedge_after', float, None) or None, breaker=breaker)
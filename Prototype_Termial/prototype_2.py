@@ -8,12 +8,22 @@
 
 
 import os
+import sys
 import openai
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from ics import Calendar, Event
 from colorama import Fore, Style, init
 
+# Shared helpers live next to the Flask app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Flask App'))
+from ics_stream import write_calendar
+from llm_cache import LLMCache
+from recurrence import compact
+import schedule_parser
+from schedule_parser import SCHEDULE_JSON_FORMAT, json_mode, response_format_kwargs
+from schedule_stream import content_deltas, stream_sessions
+from upstream import from_env as upstream_from_env
+
 # Initialize colorama
 init()
 
@@ -21,6 +31,15 @@ init()
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Deadlines, retries and a circuit breaker for OpenAI calls (see upstream.py)
+openai_upstream = upstream_from_env("openai")
+
+# Cache of parsed plans, shared across runs
+llm_cache = LLMCache()
+
+MODEL = "gpt-3.5-turbo"
+TEMPERATURE = 0.7
+
 # Terminal styling
 class TerminalStyle:
     HEADER = Fore.MAGENTA + Style.BRIGHT
@@ -47,7 +66,7 @@ def get_start_date():
             print(f"{TerminalStyle.WARNING}Invalid date format! Please use dd/mm/yy (e.g., 15/03/24){TerminalStyle.RESET}")
 
 # Updated Instructions for OpenAI
-INSTRUCTIONS = """Analyze the given task and create an intelligent scheduling plan following these guidelines:
+GUIDELINES = """Analyze the given task and create an intelligent scheduling plan following these guidelines:
 
 1. For study topics:
    - Analyze the complexity and scope of the topic
@@ -59,8 +78,9 @@ INSTRUCTIONS = """Analyze the given task and create an intelligent scheduling pl
 2. For regular tasks:
    - Estimate appropriate duration based on task nature
    - Schedule during suitable hours (e.g., chores in morning/afternoon)
+"""
 
-3. Include in your response:
+TEXT_FORMAT = """3. Include in your response:
 First: Whether this is a multi-day task (Yes/No)
 Then format the rest as follows:
 
@@ -75,108 +95,85 @@ Topic/Activity: [Specific subtopic or activity focus for this session]
 
 [Repeat for additional days if needed]"""
 
-def get_task_schedule(task):
-    """Get intelligent time suggestions from OpenAI for the task."""
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
+# Structured output parses more reliably; LLM_RESPONSE_FORMAT=text keeps the original format
+INSTRUCTIONS = GUIDELINES + "\n" + ("3. " + SCHEDULE_JSON_FORMAT if json_mode() else TEXT_FORMAT)
+
+def show_streamed_session(session):
+    """Print a session the moment the model has finished writing it."""
+    print(f"{TerminalStyle.INFO}  ⏳ Day {session.day}: {session.name} "
+          f"{session.start.strftime('%H:%M')} - {session.end.strftime('%H:%M')}{TerminalStyle.RESET}")
+
+def request_task_schedule(task, on_session=show_streamed_session):
+    """Get intelligent time suggestions from OpenAI for the task.
+    
+    The completion is streamed, and on_session is called for each session
+    as soon as the model has finished writing it.
+    """
+    response = openai_upstream.call(
+        openai.ChatCompletion.create,
+        timeout_arg='request_timeout',
+        hedge=True,
+        discard=lambda response: response.close(),
+        model=MODEL,
         messages=[
             {"role": "system", "content": INSTRUCTIONS},
             {"role": "user", "content": f"Create a detailed schedule for: {task}"}
         ],
-        temperature=0.7,
+        temperature=TEMPERATURE,
         max_tokens=500,
+        stream=True,
+        **response_format_kwargs(),
     )
-    return response.choices[0].message.content
+    return stream_sessions(content_deltas(response), on_session)
+
+def get_task_schedule(task, bypass_cache=False):
+    """Get the schedule for a task, reusing a cached plan for repeated tasks."""
+    def compute():
+        schedule = request_task_schedule(task)
+        # An answer that doesn't parse isn't cached, or it would be replayed until it expired
+        return schedule if schedule_parser.parse_schedule(schedule) is not None else None
+
+    # Plans use relative day numbers, so a cached plan is valid for any start date
+    return llm_cache.cached(MODEL, TEMPERATURE, INSTRUCTIONS, task, compute, bypass=bypass_cache)
 
 def parse_schedule(schedule_text, start_date):
     """Parse the OpenAI response into structured event data."""
     events = []
     
-    # First, check if it's a multi-day task
-    lines = schedule_text.split('\n')
-    is_multi_day = False
-    analysis_start = 0
-    
-    for i, line in enumerate(lines):
-        if line.lower().startswith('yes'):
-            is_multi_day = True
-            analysis_start = i + 1
-            break
-        elif line.lower().startswith('no'):
-            analysis_start = i + 1
-            break
-    
-    # Get analysis and schedule sections
-    schedule_text = '\n'.join(lines[analysis_start:])
-    sections = schedule_text.split("\nScheduling Plan:\n")
-    if len(sections) != 2:
+    parsed = schedule_parser.parse_schedule(schedule_text)
+    if parsed is None:
         print(f"{TerminalStyle.WARNING}Warning: Unexpected response format{TerminalStyle.RESET}")
         return events
     
-    analysis = sections[0].replace("Task Analysis:\n", "").strip()
-    schedule = sections[1].strip()
-    
     # Print the analysis
     print(f"\n{TerminalStyle.SUBHEADER}Task Analysis:{TerminalStyle.RESET}")
-    print(f"{TerminalStyle.INFO}{analysis}{TerminalStyle.RESET}")
+    print(f"{TerminalStyle.INFO}{parsed.analysis}{TerminalStyle.RESET}")
     print(f"\n{TerminalStyle.SUBHEADER}Scheduled Sessions:{TerminalStyle.RESET}")
     
-    # Parse schedule entries
-    current_task = None
-    current_day = None
-    
-    for line in schedule.split('\n'):
-        line = line.strip()
-        if not line:
-            continue
-            
-        if ': ' in line and 'Day:' not in line and 'Time:' not in line and 'Topic:' not in line:
-            current_task = line.split(': ')[0]
-            continue
-            
-        if line.startswith('Day: '):
-            day_num = int(line.replace('Day: ', '').split()[0]) - 1  # Convert to 0-based index
-            current_day = start_date + timedelta(days=day_num)
-        elif line.startswith('Time: '):
-            time_str = line.replace('Time: ', '')
-            start_time_str, end_time_str = time_str.split(' - ')
-            
-            try:
-                start_time = datetime.combine(current_day, 
-                    datetime.strptime(start_time_str, "%H:%M").time())
-                end_time = datetime.combine(current_day, 
-                    datetime.strptime(end_time_str, "%H:%M").time())
-                
-                if current_task:
-                    events.append({
-                        'name': current_task,
-                        'start': start_time,
-                        'end': end_time
-                    })
-                    
-                    # Print friendly format
-                    duration = (end_time - start_time).total_seconds() / 3600
-                    print(f"{TerminalStyle.TASK}• {current_task}{TerminalStyle.RESET}")
-                    print(f"  📅 {current_day.strftime('%d/%m/%y')}")
-                    print(f"  🕒 {start_time_str} - {end_time_str} ({duration:.1f} hours)")
-                    
-            except ValueError as e:
-                print(f"{TerminalStyle.WARNING}Error parsing datetime: {e}{TerminalStyle.RESET}")
+    for session in parsed.sessions:
+        current_day = start_date + timedelta(days=session.day - 1)  # Days are numbered from 1
+        start_time = datetime.combine(current_day, session.start)
+        end_time = datetime.combine(current_day, session.end)
+        
+        events.append({
+            'name': session.name,
+            'start': start_time,
+            'end': end_time
+        })
+        
+        # Print friendly format
+        duration = (end_time - start_time).total_seconds() / 3600
+        print(f"{TerminalStyle.TASK}• {session.name}{TerminalStyle.RESET}")
+        print(f"  📅 {current_day.strftime('%d/%m/%y')}")
+        print(f"  🕒 {session.start.strftime('%H:%M')} - {session.end.strftime('%H:%M')} ({duration:.1f} hours)")
     
     return events
 
 def create_ics_file(events, filename="my_schedule.ics"):
     """Create an ICS file for the events."""
-    cal = Calendar()
-    for event_data in events:
-        event = Event()
-        event.name = event_data['name']
-        event.begin = event_data['start']
-        event.end = event_data['end']
-        cal.events.add(event)
-    
-    with open(filename, 'w') as f:
-        f.write(str(cal))
+    # Day-by-day repeats of a session are written as one recurring event
+    series = compact((event_data['name'], event_data['start'], event_data['end']) for event_data in events)
+    write_calendar(filename, ((None, name, start, end, rule, None) for name, start, end, rule in series))
     
     if os.path.exists(filename):
         print(f"\n{TerminalStyle.SUCCESS}✨ Schedule saved to '{filename}'{TerminalStyle.RESET}")
@@ -201,7 +198,8 @@ def main():
             schedule = get_task_schedule(task)
             
             # Check if it's a multi-day task
-            is_multi_day = schedule.lower().startswith('yes')
+            parsed = schedule_parser.parse_schedule(schedule)
+            is_multi_day = parsed is not None and parsed.multi_day
             
             # Get start date if it's a multi-day task
             start_date = get_start_date() if is_multi_day else datetime.now().date()
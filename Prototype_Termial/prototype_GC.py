@@ -1,16 +1,31 @@
 # Now it works with Google Calendar too !!!
 import os
-from urllib.request import Request
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 import openai
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from ics import Calendar, Event
 from colorama import Fore, Style, init
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+# Shared helpers live next to the Flask app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Flask App'))
+from gcal_batch import BATCH_SIZE, event_body, push_events, summarize
+from gcal_service import build_calendar_service
+from ics_stream import write_calendar
+from llm_cache import LLMCache, cache_disabled
+from prompt_packing import PACKED_JSON_FORMAT, PACKED_TEXT_FORMAT, estimate_tokens, pack, request_packed
+from recurrence import compact
+import schedule_parser
+from schedule_parser import SCHEDULE_JSON_FORMAT, json_mode, response_format_kwargs
+from schedule_stream import content_deltas, stream_sessions
+from token_store import TokenStore
+from upstream import from_env as upstream_from_env
+from ratelimit import TokenBucket
+
 # Initialize colorama
 init()
 
@@ -18,6 +33,23 @@ init()
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Deadlines, retries and circuit breakers for OpenAI and Google calls (see upstream.py)
+openai_upstream = upstream_from_env("openai")
+google_upstream = upstream_from_env("google")
+
+# Cache of parsed plans, shared across runs
+llm_cache = LLMCache()
+
+# Google tokens, in the same store the web app uses (set TOKEN_STORE_PATH to share its file)
+token_store = TokenStore()
+TOKEN_USER = os.getenv("GOOGLE_TOKEN_USER", "cli")
+
+# Concurrent planning settings
+MAX_CONCURRENT_REQUESTS = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+REQUESTS_PER_SECOND = float(os.getenv("OPENAI_REQUESTS_PER_SECOND", "3"))
+# Send several tasks per request instead of one request per task
+PACK_TASKS = os.getenv("OPENAI_PACK_TASKS", "1").lower() in ("1", "true", "yes")
+
 # Google Calendar API settings
 SCOPES = ['https://www.googleapis.com/auth /calendar']
 
@@ -45,20 +77,17 @@ def get_calendar_choice():
         print(f"{TerminalStyle.WARNING}Invalid choice! Please enter 1 or 2.{TerminalStyle.RESET}")
 
 def get_google_calendar_credentials():
-    """Get or refresh Google Calendar credentials."""
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+    """Get Google Calendar credentials from the token store, refreshed if they expired."""
+    creds = token_store.get(TOKEN_USER)
+    if creds is None and os.path.exists('token.json'):
+        # Tokens saved by earlier versions move into the store
+        token_store.save(TOKEN_USER, Credentials.from_authorized_user_file('token.json', SCOPES))
+        creds = token_store.get(TOKEN_USER)
     
     if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
+        flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
+        creds = flow.run_local_server(port=0)
+        token_store.save(TOKEN_USER, creds)
     
     return creds
 
@@ -76,12 +105,14 @@ def get_start_date():
         except ValueError:
             print(f"{TerminalStyle.WARNING}Invalid date format! Please use dd/mm/yy (e.g., 15/03/24){TerminalStyle.RESET}")
 
-def get_task_schedule(task):
-    """Get intelligent time suggestions from OpenAI for the task."""
-    try:
-        system_prompt = """You are a scheduling assistant. For any given task, provide a schedule in the following format:
+MODEL = "gpt-3.5-turbo"
+TEMPERATURE = 0.7
+# Completion tokens allowed for one task's schedule
+TASK_MAX_TOKENS = 500
+
+SCHEDULE_PROMPT = "You are a scheduling assistant. For any given task, provide a schedule in the following format:"
 
-Is this a multi-day task? (Answer with just 'Yes' or 'No' on the first line)
+TEXT_FORMAT = """Is this a multi-day task? (Answer with just 'Yes' or 'No' on the first line)
 
 Task Analysis:
 [Provide a brief analysis of the task's complexity and requirements]
@@ -104,20 +135,41 @@ Day: 1
 Time: 09:00 - 11:00
 Topic/Activity: Introduction and basic concepts"""
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+# Structured output parses more reliably; LLM_RESPONSE_FORMAT=text keeps the original format
+SYSTEM_PROMPT = SCHEDULE_PROMPT + "\n\n" + (SCHEDULE_JSON_FORMAT if json_mode() else TEXT_FORMAT)
+
+def show_streamed_session(task, session):
+    """Print a session the moment the model has finished writing it."""
+    print(f"{TerminalStyle.INFO}  ⏳ {task} · Day {session.day}: {session.name} "
+          f"{session.start.strftime('%H:%M')} - {session.end.strftime('%H:%M')}{TerminalStyle.RESET}")
+
+def request_task_schedule(task, on_session=show_streamed_session):
+    """Get intelligent time suggestions from OpenAI for the task.
+    
+    The completion is streamed, and on_session(task, session) is called for
+    each session as soon as the model has finished writing it.
+    """
+    try:
+        response = openai_upstream.call(
+            openai.ChatCompletion.create,
+            timeout_arg='request_timeout',
+            hedge=True,
+            discard=lambda response: response.close(),
+            model=MODEL,
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": f"Create a detailed schedule for: {task}"}
             ],
-            temperature=0.7,
-            max_tokens=500,
+            temperature=TEMPERATURE,
+            max_tokens=TASK_MAX_TOKENS,
+            stream=True,
+            **response_format_kwargs(),
         )
         
-        schedule = response.choices[0].message.content
+        schedule = stream_sessions(content_deltas(response), lambda session: on_session(task, session))
         
         # Validate response format
-        if not schedule or not any(x in schedule for x in ['Task Analysis:', 'Scheduling Plan:']):
+        if schedule_parser.parse_schedule(schedule) is None:
             print(f"{TerminalStyle.ERROR}Error: Invalid response format from AI. Please try again.{TerminalStyle.RESET}")
             return None
             
@@ -130,133 +182,164 @@ Topic/Activity: Introduction and basic concepts"""
         print(f"{TerminalStyle.ERROR}Unexpected error: {str(e)}{TerminalStyle.RESET}")
         return None
 
+def get_task_schedule(task, bypass_cache=False):
+    """Get the schedule for a task, reusing a cached plan for repeated tasks."""
+    # Plans use relative day numbers, so a cached plan is valid for any start date
+    return llm_cache.cached(MODEL, TEMPERATURE, SYSTEM_PROMPT, task,
+                            lambda: request_task_schedule(task), bypass=bypass_cache)
+
+def get_task_schedules(tasks, max_workers=MAX_CONCURRENT_REQUESTS, rate=REQUESTS_PER_SECOND):
+    """Get schedules for several tasks concurrently, in the same order as tasks."""
+    if not tasks:
+        return []
+    
+    bucket = TokenBucket(rate, capacity=max(1, min(max_workers, rate)))
+    
+    def fetch(task):
+        bucket.acquire()
+        return get_task_schedule(task)
+    
+    # map() keeps results in submission order, whatever order they finish in
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as executor:
+        return list(executor.map(fetch, tasks))
+
+def complete_packed(prompt, max_tokens):
+    """Send one packed request; returns (text, usage, truncated)."""
+    response = openai_upstream.call(
+        openai.ChatCompletion.create,
+        timeout_arg='request_timeout',
+        hedge=True,
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=TEMPERATURE,
+        max_tokens=max_tokens,
+        **response_format_kwargs(),
+    )
+    choice = response['choices'][0]
+    return choice['message']['content'], response.get('usage'), choice.get('finish_reason') == 'length'
+
+def get_task_schedules_packed(tasks, max_workers=MAX_CONCURRENT_REQUESTS, rate=REQUESTS_PER_SECOND):
+    """Get schedules for several tasks with as few requests as the token budget allows.
+    
+    Cached tasks are skipped and the rest packed into batches, which run
+    concurrently. Each answer is cached per task, like a single-task
+    request's. Tokens and latency are printed per batch.
+    """
+    if not tasks:
+        return []
+    
+    use_cache = not cache_disabled()
+    schedules = [llm_cache.get(MODEL, TEMPERATURE, SYSTEM_PROMPT, task) if use_cache else None for task in tasks]
+    pending = [index for index, schedule in enumerate(schedules) if schedule is None]
+    overhead = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(PACKED_JSON_FORMAT if json_mode() else PACKED_TEXT_FORMAT)
+    batches = [[pending[position] for position in batch]
+               for batch in pack([tasks[index] for index in pending], overhead, TASK_MAX_TOKENS)]
+    if not batches:
+        return schedules
+    
+    bucket = TokenBucket(rate, capacity=max(1, min(max_workers, rate)))
+    
+    def fetch(batch):
+        bucket.acquire()
+        try:
+            return request_packed([tasks[index] for index in batch], complete_packed, json_mode(), TASK_MAX_TOKENS,
+                                  accept=lambda answer: schedule_parser.parse_schedule(answer) is not None)
+        except Exception as e:
+            print(f"{TerminalStyle.ERROR}OpenAI API Error: {str(e)}{TerminalStyle.RESET}")
+            return [None] * len(batch), None
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        results = list(executor.map(fetch, batches))
+    
+    total_tokens = 0
+    for number, (batch, (answers, report)) in enumerate(zip(batches, results), 1):
+        for index, answer in zip(batch, answers):
+            schedules[index] = answer
+            if answer is not None and use_cache:
+                llm_cache.set(MODEL, TEMPERATURE, SYSTEM_PROMPT, tasks[index], answer)
+        if report is not None:
+            total_tokens += report['total_tokens']
+            print(f"{TerminalStyle.INFO}Batch {number}: {report['tasks']} task(s) in {report['requests']} request(s), "
+                  f"{report['total_tokens']} tokens, {report['seconds']:.1f}s{TerminalStyle.RESET}")
+    print(f"{TerminalStyle.INFO}{len(pending)} task(s) in {len(batches)} batch(es), {total_tokens} tokens in total"
+          f"{TerminalStyle.RESET}")
+    
+    missing = sum(1 for index in pending if schedules[index] is None)
+    if missing:
+        print(f"{TerminalStyle.WARNING}No usable schedule for {missing} task(s){TerminalStyle.RESET}")
+    return schedules
+
 def parse_schedule(schedule_text, start_date):
     """Parse the OpenAI response into structured event data."""
     if not schedule_text:
         return []
         
-    events = []
-    lines = schedule_text.split('\n')
-    
-    try:
-        # Find the main sections
-        is_multi_day = lines[0].lower().startswith('yes')
-        
-        analysis_start = -1
-        schedule_start = -1
-        
-        for i, line in enumerate(lines):
-            if 'Task Analysis:' in line:
-                analysis_start = i
-            elif 'Scheduling Plan:' in line:
-                schedule_start = i
-                break
+    parsed = schedule_parser.parse_schedule(schedule_text)
+    if parsed is None:
+        print(f"{TerminalStyle.ERROR}Error: Could not find any sessions in the response{TerminalStyle.RESET}")
+        return []
         
-        if analysis_start == -1 or schedule_start == -1:
-            print(f"{TerminalStyle.ERROR}Error: Could not find required sections in the response{TerminalStyle.RESET}")
-            return []
-            
-        # Print analysis
-        analysis = '\n'.join(lines[analysis_start+1:schedule_start]).strip()
-        print(f"\n{TerminalStyle.SUBHEADER}Task Analysis:{TerminalStyle.RESET}")
-        print(f"{TerminalStyle.INFO}{analysis}{TerminalStyle.RESET}")
-        print(f"\n{TerminalStyle.SUBHEADER}Scheduled Sessions:{TerminalStyle.RESET}")
+    # Print analysis
+    print(f"\n{TerminalStyle.SUBHEADER}Task Analysis:{TerminalStyle.RESET}")
+    print(f"{TerminalStyle.INFO}{parsed.analysis}{TerminalStyle.RESET}")
+    print(f"\n{TerminalStyle.SUBHEADER}Scheduled Sessions:{TerminalStyle.RESET}")
+    
+    events = []
+    for session in parsed.sessions:
+        # Sessions use relative day numbers, starting at 1
+        current_day = start_date + timedelta(days=session.day - 1)
+        start_datetime = datetime.combine(current_day, session.start)
+        end_datetime = datetime.combine(current_day, session.end)
         
-        # Parse schedule
-        current_task = None
-        current_day = None
-        schedule_lines = lines[schedule_start+1:]
+        events.append({
+            'name': session.name,
+            'start': start_datetime,
+            'end': end_datetime
+        })
         
-        for line in schedule_lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            if ': ' in line and not any(x in line.lower() for x in ['day:', 'time:', 'topic:']):
-                current_task = line.split(':')[0].strip()
-                continue
-                
-            if line.startswith('Day: '):
-                try:
-                    day_num = int(line.replace('Day: ', '').split()[0]) - 1
-                    current_day = start_date + timedelta(days=day_num)
-                except ValueError:
-                    print(f"{TerminalStyle.WARNING}Warning: Invalid day format in line: {line}{TerminalStyle.RESET}")
-                    continue
-                    
-            elif line.startswith('Time: '):
-                try:
-                    time_str = line.replace('Time: ', '')
-                    start_time_str, end_time_str = time_str.split(' - ')
-                    
-                    start_time = datetime.strptime(start_time_str, "%H:%M").time()
-                    end_time = datetime.strptime(end_time_str, "%H:%M").time()
-                    
-                    if current_task and current_day:
-                        start_datetime = datetime.combine(current_day, start_time)
-                        end_datetime = datetime.combine(current_day, end_time)
-                        
-                        events.append({
-                            'name': current_task,
-                            'start': start_datetime,
-                            'end': end_datetime
-                        })
-                        
-                        duration = (end_datetime - start_datetime).total_seconds() / 3600
-                        print(f"{TerminalStyle.TASK}• {current_task}{TerminalStyle.RESET}")
-                        print(f"  📅 {current_day.strftime('%d/%m/%y')}")
-                        print(f"  🕒 {start_time_str} - {end_time_str} ({duration:.1f} hours)")
-                        
-                except ValueError as e:
-                    print(f"{TerminalStyle.WARNING}Warning: Invalid time format in line: {line}{TerminalStyle.RESET}")
-                    continue
-                    
-        return events
+        duration = (end_datetime - start_datetime).total_seconds() / 3600
+        print(f"{TerminalStyle.TASK}• {session.name}{TerminalStyle.RESET}")
+        print(f"  📅 {current_day.strftime('%d/%m/%y')}")
+        print(f"  🕒 {session.start.strftime('%H:%M')} - {session.end.strftime('%H:%M')} ({duration:.1f} hours)")
         
-    except Exception as e:
-        print(f"{TerminalStyle.ERROR}Error parsing schedule: {str(e)}{TerminalStyle.RESET}")
-        return []
+    return events
 
-def add_to_google_calendar(events):
-    """Add events to Google Calendar."""
+def add_to_google_calendar(events, batch_size=BATCH_SIZE):
+    """Add events to Google Calendar using batched inserts."""
     try:
         creds = get_google_calendar_credentials()
-        service = build('calendar', 'v3', credentials=creds)
+        service = build_calendar_service(creds)
         
-        for event_data in events:
-            event = {
-                'summary': event_data['name'],
-                'start': {
-                    'dateTime': event_data['start'].isoformat(),
-                    'timeZone': 'UTC',
-                },
-                'end': {
-                    'dateTime': event_data['end'].isoformat(),
-                    'timeZone': 'UTC',
-                },
-            }
-            
-            service.events().insert(calendarId='primary', body=event).execute()
+        # Day-by-day repeats of a session are sent as one recurring event
+        series = compact((event_data['name'], event_data['start'], event_data['end']) for event_data in events)
+        bodies = [event_body(name, start, end, recurrence=['RRULE:' + rule] if rule else None)
+                  for name, start, end, rule in series]
+        results = push_events(service, bodies, batch_size=batch_size, upstream=google_upstream)
+        succeeded, failed = summarize(results)
+        
+        for (name, start, _, _), result in zip(series, results):
+            if not result['ok']:
+                print(f"{TerminalStyle.WARNING}Could not add '{name}' "
+                      f"({start.strftime('%d/%m/%y %H:%M')}): {result['error']}{TerminalStyle.RESET}")
         
-        print(f"\n{TerminalStyle.SUCCESS}✨ Events successfully added to Google Calendar{TerminalStyle.RESET}")
-        print(f"{TerminalStyle.INFO}Total events scheduled: {len(events)}{TerminalStyle.RESET}\n")
+        if succeeded:
+            print(f"\n{TerminalStyle.SUCCESS}✨ Events successfully added to Google Calendar{TerminalStyle.RESET}")
+        if failed:
+            print(f"{TerminalStyle.WARNING}{failed} event(s) could not be added{TerminalStyle.RESET}")
+        print(f"{TerminalStyle.INFO}Total events scheduled: {succeeded}/{len(series)} "
+              f"({len(events)} sessions){TerminalStyle.RESET}\n")
         
     except HttpError as error:
         print(f"{TerminalStyle.WARNING}Error accessing Google Calendar: {error}{TerminalStyle.RESET}")
 
 def create_ics_file(events, filename="my_schedule.ics"):
     """Create an ICS file for the events."""
-    calendar = Calendar()
-    
-    for event_data in events:
-        event = Event()
-        event.name = event_data['name']
-        event.begin = event_data['start']
-        event.end = event_data['end']
-        calendar.events.add(event)
-
-    with open(filename, 'w') as f:
-        f.writelines(calendar.serialize_iter())
+    # Day-by-day repeats of a session are written as one recurring event
+    series = compact((event_data['name'], event_data['start'], event_data['end']) for event_data in events)
+    write_calendar(filename, ((None, name, start, end, rule, None) for name, start, end, rule in series))
     
     print(f"{TerminalStyle.SUCCESS}✨ ICS file '{filename}' created successfully!{TerminalStyle.RESET}")
 
@@ -277,8 +360,12 @@ def main():
     start_date = get_start_date()
     events = []
 
-    for task in tasks:
-        schedule = get_task_schedule(task)
+    print(f"\n{TerminalStyle.INFO}Planning {len(tasks)} task(s)...{TerminalStyle.RESET}")
+    started = time.perf_counter()
+    schedules = get_task_schedules_packed(tasks) if PACK_TASKS and len(tasks) > 1 else get_task_schedules(tasks)
+    print(f"{TerminalStyle.INFO}Planned in {time.perf_counter() - started:.1f}s{TerminalStyle.RESET}")
+
+    for schedule in schedules:
         events.extend(parse_schedule(schedule, start_date))
 
     calendar_choice = get_calendar_choice()